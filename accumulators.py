@@ -0,0 +1,254 @@
+"""
+Acumuladores online y combinables de las métricas de backtesting
+
+Cada acumulador se actualiza vela a vela (o trade a trade, o por lotes de arrays)
+sin guardar el histórico, y dos acumuladores de particiones temporales contiguas
+se combinan con merge() dando exactamente el mismo resultado que uno solo sobre
+todas las velas. Así el backtest por streaming, los bloques del backtest por días
+y el trading en vivo obtienen las métricas de metrics_from_stats sin la curva completa.
+"""
+import numpy as np
+import pandas as pd
+
+from backtesting import metrics_from_stats, trade_return_stats
+
+
+class ReturnMoments:
+    """
+    Número, media y suma de cuadrados centrada (M2) de los retornos (Welford / Chan)
+    """
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, value: float):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def update_batch(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values):
+            mean = values.mean()
+            self.merge(ReturnMoments(len(values), mean, ((values - mean) ** 2).sum()))
+
+    def merge(self, other: 'ReturnMoments') -> 'ReturnMoments':
+        n = self.n + other.n
+        if other.n:
+            delta = other.mean - self.mean
+            self.mean += delta * other.n / n
+            self.m2 += other.m2 + delta ** 2 * self.n * other.n / n
+            self.n = n
+        return self
+
+    @property
+    def std(self) -> float:
+        """
+        Desviación estándar muestral (ddof=1, como pandas)
+        """
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else np.nan
+
+
+class DrawdownAccumulator:
+    """
+    Pico de equity y drawdown máximo combinables entre particiones
+
+    Además del drawdown propio se guarda un perfil de pares (pico, mínimo de equity
+    mientras ese pico estaba vigente) con los mínimos estrictamente decrecientes:
+    es lo que necesita una partición posterior para calcular su drawdown frente al
+    pico de las anteriores. Los pares dominados se descartan, así que el perfil
+    tiene pocas entradas.
+    """
+
+    def __init__(self):
+        self.max_drawdown = 0.0
+        self.peaks = np.empty(0)
+        self.troughs = np.empty(0)
+
+    @property
+    def peak(self) -> float:
+        return float(self.peaks[-1]) if len(self.peaks) else -np.inf
+
+    def update(self, equity: float):
+        if len(self.peaks) and equity <= self.peaks[-1]:
+            self.max_drawdown = min(self.max_drawdown, (equity - self.peaks[-1]) / self.peaks[-1])
+            self.troughs[-1] = min(self.troughs[-1], equity)
+            return
+        # Nuevo pico: abre un tramo
+        self.peaks = np.append(self.peaks, equity)
+        self.troughs = np.append(self.troughs, equity)
+        self._prune()
+
+    def update_batch(self, equity):
+        equity = np.asarray(equity, dtype=np.float64)
+        if len(equity) == 0:
+            return
+        other = DrawdownAccumulator()
+        running_peak = np.maximum.accumulate(equity)
+        other.max_drawdown = min(0.0, float(((equity - running_peak) / running_peak).min()))
+        # Un tramo por cada nuevo pico: (pico, mínimo de la equity hasta el siguiente pico)
+        starts = np.flatnonzero(np.concatenate(([True], running_peak[1:] > running_peak[:-1])))
+        other.peaks = running_peak[starts]
+        other.troughs = np.minimum.reduceat(equity, starts)
+        self.merge(other)
+
+    def merge(self, other: 'DrawdownAccumulator') -> 'DrawdownAccumulator':
+        if len(other.peaks) == 0:
+            return self
+        if len(self.peaks) == 0:
+            self.max_drawdown = other.max_drawdown
+            self.peaks, self.troughs = other.peaks.copy(), other.troughs.copy()
+            return self._prune()
+        peak = self.peak
+        below = other.peaks <= peak
+        # Tramos posteriores que no superan el pico previo: su drawdown se mide contra ese pico
+        drawdown = other.max_drawdown
+        if below.any():
+            lowest = other.troughs[below].min()
+            drawdown = min(drawdown, (lowest - peak) / peak)
+            self.troughs[-1] = min(self.troughs[-1], lowest)
+        self.max_drawdown = min(self.max_drawdown, drawdown)
+        self.peaks = np.concatenate((self.peaks, other.peaks[~below]))
+        self.troughs = np.concatenate((self.troughs, other.troughs[~below]))
+        return self._prune()
+
+    def _prune(self) -> 'DrawdownAccumulator':
+        # Un tramo anterior con mínimo igual o menor domina a los posteriores (salvo el último, aún abierto)
+        if len(self.peaks) > 2:
+            closed = self.troughs[:-1]
+            previous_min = np.concatenate(([np.inf], np.minimum.accumulate(closed)[:-1]))
+            keep = np.append(closed < previous_min, True)
+            self.peaks, self.troughs = self.peaks[keep], self.troughs[keep]
+        return self
+
+
+class TradeAccumulator:
+    """
+    Conteos y sumas de trades ganadores y perdedores (agregados de trade_return_stats)
+    """
+
+    def __init__(self):
+        self.stats = trade_return_stats([], [])
+
+    def update(self, net_return: float, gross_return: float):
+        self.update_batch([net_return], [gross_return])
+
+    def update_batch(self, net_returns, gross_returns):
+        self.merge_stats(trade_return_stats(net_returns, gross_returns))
+
+    def merge_stats(self, stats: dict):
+        self.stats = {k: self.stats[k] + stats[k] for k in self.stats}
+
+    def merge(self, other: 'TradeAccumulator') -> 'TradeAccumulator':
+        self.merge_stats(other.stats)
+        return self
+
+
+class CostAccumulator:
+    """
+    Comisiones y slippage totales
+    """
+
+    def __init__(self):
+        self.commissions = 0.0
+        self.slippage = 0.0
+
+    def update(self, commission: float = 0.0, slippage: float = 0.0):
+        self.commissions += commission
+        self.slippage += slippage
+
+    def merge(self, other: 'CostAccumulator') -> 'CostAccumulator':
+        self.update(other.commissions, other.slippage)
+        return self
+
+
+class MetricsAccumulator:
+    """
+    Todas las métricas de un backtest a partir de la equity vela a vela y de los trades cerrados
+
+    Los retornos se calculan entre velas consecutivas de la partición; al combinar dos
+    particiones contiguas se añade el retorno de la frontera. La primera vela de toda
+    la serie aporta un retorno 0, igual que pct_change().fillna(0) en
+    calculate_performance_metrics.
+
+    Args:
+        initial_equity: Capital inicial del backtest (para los retornos totales)
+    """
+
+    def __init__(self, initial_equity: float = None):
+        self.initial_equity = initial_equity
+        self.first_equity = None
+        self.final_equity = None
+        self.start_date = None
+        self.end_date = None
+        self.moments = ReturnMoments()
+        self.drawdown = DrawdownAccumulator()
+        self.trades = TradeAccumulator()
+        self.costs = CostAccumulator()
+
+    def update_bar(self, timestamp, equity: float):
+        timestamp = pd.Timestamp(timestamp)
+        if self.final_equity is not None:
+            self.moments.update((equity - self.final_equity) / self.final_equity)
+        else:
+            self.first_equity, self.start_date = equity, timestamp
+        self.drawdown.update(equity)
+        self.final_equity, self.end_date = equity, timestamp
+
+    def update_bars(self, timestamps, equity):
+        """
+        Versión por lotes de update_bar (arrays de timestamps y equity)
+        """
+        equity = np.asarray(equity, dtype=np.float64)
+        if len(equity) == 0:
+            return
+        other = MetricsAccumulator(self.initial_equity)
+        other.first_equity, other.final_equity = float(equity[0]), float(equity[-1])
+        other.start_date, other.end_date = pd.Timestamp(timestamps[0]), pd.Timestamp(timestamps[-1])
+        other.moments.update_batch(np.diff(equity) / equity[:-1])
+        other.drawdown.update_batch(equity)
+        self.merge(other)
+
+    def update_trade(self, net_return: float, gross_return: float, commission: float = 0.0,
+                     slippage: float = 0.0):
+        self.trades.update(net_return, gross_return)
+        self.costs.update(commission, slippage)
+
+    def merge(self, other: 'MetricsAccumulator') -> 'MetricsAccumulator':
+        """
+        Añade una partición posterior y contigua en el tiempo
+        """
+        if other.first_equity is not None:
+            if self.final_equity is None:
+                self.first_equity, self.start_date = other.first_equity, other.start_date
+            else:
+                self.moments.update((other.first_equity - self.final_equity) / self.final_equity)
+            self.final_equity, self.end_date = other.final_equity, other.end_date
+        self.moments.merge(other.moments)
+        self.drawdown.merge(other.drawdown)
+        self.trades.merge(other.trades)
+        self.costs.merge(other.costs)
+        return self
+
+    def metrics(self) -> dict:
+        """
+        Métricas de metrics_from_stats
+        """
+        initial_equity = self.initial_equity if self.initial_equity is not None else self.first_equity
+        # Retorno 0 de la primera vela de la serie
+        moments = ReturnMoments(self.moments.n, self.moments.mean, self.moments.m2).merge(ReturnMoments(1, 0.0, 0.0))
+        stats = {
+            'initial_equity': initial_equity,
+            'final_equity': self.final_equity if self.final_equity is not None else initial_equity,
+            'total_commissions': self.costs.commissions,
+            'total_slippage': self.costs.slippage,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'returns_std': moments.std,
+            'max_drawdown': self.drawdown.max_drawdown
+        }
+        stats.update(self.trades.stats)
+        return metrics_from_stats(stats)
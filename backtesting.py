@@ -4,6 +4,8 @@ Sistema de backtesting para estrategias de trading
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from cost_model import CostModel
+from session_calendar import timestamps_to_ns
 
 
 def calculate_commission(trade_value, commission_rate=0.0005, min_commission=1.0, max_commission=100.0):
@@ -23,141 +25,237 @@ def calculate_commission(trade_value, commission_rate=0.0005, min_commission=1.0
     return max(min_commission, min(commission, max_commission))
 
 
+def extract_trades(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tabla de trades a partir de las señales de la estrategia, en una sola pasada vectorizada
+    
+    Cada compra se empareja con la primera venta posterior. Una compra sin venta
+    (posición abierta al final de los datos) tiene exit_pos = -1.
+    
+    Returns:
+        DataFrame con entry_pos, exit_pos, entry_time, exit_time, entry_price,
+        exit_price, gross_return y exit_reason
+    """
+    buy_pos = np.flatnonzero(df['buy_signal'].to_numpy(dtype=bool))
+    sell_pos = np.flatnonzero(df['sell_signal'].to_numpy(dtype=bool))
+    match = np.searchsorted(sell_pos, buy_pos, side='right')
+    closed = match < len(sell_pos)
+    exit_pos = np.full(len(buy_pos), -1, dtype=np.int64)
+    exit_pos[closed] = sell_pos[match[closed]]
+    
+    close = df['close'].to_numpy(dtype=np.float64)
+    timestamps = timestamps_to_ns(df['timestamp']).view('datetime64[ns]')
+    exit_time = np.full(len(buy_pos), np.datetime64('NaT'), dtype=timestamps.dtype)
+    exit_time[closed] = timestamps[exit_pos[closed]]
+    exit_price = np.full(len(buy_pos), np.nan)
+    # Las salidas resueltas dentro de la vela (stops con máximos/mínimos) traen su propio precio
+    exit_prices = df['exit_price'].to_numpy(dtype=np.float64) if 'exit_price' in df.columns else close
+    exit_price[closed] = exit_prices[exit_pos[closed]]
+    exit_reason = np.full(len(buy_pos), '', dtype=object)
+    if 'exit_reason' in df.columns:
+        exit_reason[closed] = df['exit_reason'].to_numpy()[exit_pos[closed]]
+    entry_price = close[buy_pos]
+    
+    return pd.DataFrame({
+        'entry_pos': buy_pos,
+        'exit_pos': exit_pos,
+        'entry_time': timestamps[buy_pos],
+        'exit_time': exit_time,
+        'entry_price': entry_price,
+        'exit_price': exit_price,
+        'gross_return': (exit_price - entry_price) / entry_price,
+        'exit_reason': exit_reason
+    })
+
+
+def _build_cost_model(cost_model, commission_rate, min_commission, max_commission):
+    if cost_model is not None:
+        return cost_model
+    return CostModel(schedule='percentage', commission_rate=commission_rate,
+                     min_commission=min_commission, max_commission=max_commission)
+
+
+def default_cost_model() -> CostModel:
+    """
+    Modelo de costes con las comisiones por defecto de comprehensive_backtest
+    
+    Lo usan los motores alternativos (por bloques, streaming, comparación, barridos)
+    cuando no se les pasa modelo, para que sus resultados coincidan con los del motor base.
+    """
+    return _build_cost_model(None, 0.0005, 1.0, 100.0)
+
+
+def calculate_trade_costs(trades: pd.DataFrame, initial_capital, cost_model: CostModel,
+                          prior_volume=None) -> pd.DataFrame:
+    """
+    Costes exactos de los trades cerrados de una tabla de extract_trades
+    
+    prior_volume permite continuar el volumen mensual del plan escalonado entre bloques.
+    """
+    closed = trades[trades['exit_pos'] >= 0]
+    costs = cost_model.trade_costs(closed['entry_price'].to_numpy(), closed['exit_price'].to_numpy(),
+                                   initial_capital, closed['entry_time'].to_numpy(), prior_volume)
+    costs.index = closed.index
+    return costs
+
+
 def calculate_equity_curve(df, initial_capital=10000, commission_rate=0.0005, 
-                          min_commission=1.25, max_commission=100.0):
+                          min_commission=1.25, max_commission=100.0, cost_model=None, trade_costs=None,
+                          prior_volume=None):
     """
-    Calcula la curva de equity (capital acumulado) incluyendo comisiones
+    Calcula la curva de equity (capital acumulado) incluyendo comisiones y slippage
+    
+    Los costes de todos los trades se calculan en bloque con el modelo de costes y la
+    curva se construye sin recorrer las velas: en posición vale acciones * cierre y
+    fuera de posición, el capital tras el último trade cerrado.
+    
+    Args:
+        df: Resultado de la estrategia (con buy_signal / sell_signal)
+        initial_capital: Capital inicial
+        commission_rate, min_commission, max_commission: Plan porcentual (si no se pasa cost_model)
+        cost_model: Modelo de costes a usar
+        trade_costs: Costes ya calculados con calculate_trade_costs (opcional)
+        prior_volume: Volumen mensual previo para el plan escalonado (ver CostModel.monthly_volume)
     """
-    df = df.copy()
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Inicializar variables
-    equity = [initial_capital]
-    capital = initial_capital
-    position_size = 0
-    shares = 0
-    total_commissions = 0
-    
-    for i, row in df.iterrows():
-        if row['buy_signal'] and position_size == 0:
-            # Comprar: usar capital disponible menos comisión
-            trade_value = capital
-            commission = calculate_commission(trade_value, commission_rate, min_commission, max_commission)
-            
-            # Restar comisión del capital disponible para compra
-            available_capital = capital - commission
-            shares = available_capital / row['close']
-            total_commissions += commission
-            position_size = 1
-            
-        elif row['sell_signal'] and position_size == 1:
-            # Vender: convertir shares a capital menos comisión
-            trade_value = shares * row['close']
-            commission = calculate_commission(trade_value, commission_rate, min_commission, max_commission)
-            
-            capital = trade_value - commission
-            total_commissions += commission
-            shares = 0
-            position_size = 0
-            
-        # Calcular equity actual
-        if position_size == 1:
-            current_equity = shares * row['close']
-        else:
-            current_equity = capital
-            
-        equity.append(current_equity)
-    
-    # Crear DataFrame con equity curve
+    cost_model = _build_cost_model(cost_model, commission_rate, min_commission, max_commission)
+    timestamps = timestamps_to_ns(df['timestamp']).view('datetime64[ns]')
+    close = df['close'].to_numpy(dtype=np.float64)
+    n = len(close)
+    
+    trades = extract_trades(df)
+    if trade_costs is None:
+        trade_costs = calculate_trade_costs(trades, initial_capital, cost_model, prior_volume)
+    is_closed = trades['exit_pos'].to_numpy() >= 0
+    entry_pos = trades['entry_pos'].to_numpy()
+    exit_pos = trades['exit_pos'].to_numpy()[is_closed]
+    entry_price = trades['entry_price'].to_numpy()
+    
+    # Acciones, comisión y slippage de entrada de cada trade (incluida una posible posición abierta)
+    shares = np.zeros(len(trades))
+    entry_commission = np.zeros(len(trades))
+    shares[is_closed] = trade_costs['shares'].to_numpy()
+    entry_commission[is_closed] = trade_costs['entry_commission'].to_numpy()
+    capital_after = trade_costs['capital_after'].to_numpy()
+    if len(trades) and not is_closed[-1]:
+        month = trades['entry_time'].to_numpy(dtype='datetime64[M]')
+        monthly_volume = 2 * shares[is_closed][month[is_closed] == month[-1]].sum()
+        if prior_volume is not None and prior_volume[0] == month[-1].astype(np.int64):
+            monthly_volume += prior_volume[1]
+        final_capital = capital_after[-1] if len(capital_after) else initial_capital
+        entry_commission[-1], shares[-1] = cost_model.entry_costs(final_capital, entry_price[-1], monthly_volume)
+    entry_slippage = shares * entry_price * cost_model.slippage
+    
+    bars = np.arange(n)
+    # Efectivo tras el último trade cerrado en cada vela
+    last_exit = np.searchsorted(exit_pos, bars, side='right') - 1
+    cash = np.concatenate(([initial_capital], capital_after))[last_exit + 1]
+    # Trade en curso en cada vela: entre su entrada (incluida) y su salida (excluida)
+    current = np.searchsorted(entry_pos, bars, side='right') - 1
+    trade_end = np.append(np.where(trades['exit_pos'].to_numpy() >= 0, trades['exit_pos'].to_numpy(), n), 0)
+    in_position = (current >= 0) & (bars < trade_end[current])
+    equity = np.where(in_position, np.append(shares, 0.0)[current] * close, cash)
+    
+    # Comisiones y slippage acumulados (entrada en la vela de compra, salida en la de venta)
+    commissions = np.zeros(n)
+    slippage = np.zeros(n)
+    np.add.at(commissions, entry_pos, entry_commission)
+    np.add.at(commissions, exit_pos, trade_costs['exit_commission'].to_numpy())
+    np.add.at(slippage, entry_pos, entry_slippage)
+    np.add.at(slippage, exit_pos, trade_costs['slippage_cost'].to_numpy() - entry_slippage[is_closed])
+    
+    # Primera fila: capital inicial antes de procesar ninguna vela
     equity_df = pd.DataFrame({
-        'timestamp': df['timestamp'].tolist() + [df['timestamp'].iloc[-1]],
-        'equity': equity,
-        'total_commissions': [0] + [total_commissions] * len(df)
+        'timestamp': np.concatenate((timestamps[:1], timestamps)),
+        'equity': np.concatenate(([initial_capital], equity)),
+        'total_commissions': np.concatenate(([0.0], np.cumsum(commissions))),
+        'total_slippage': np.concatenate(([0.0], np.cumsum(slippage)))
     })
     
     return equity_df
 
 
-def calculate_performance_metrics(equity_df, trades_df):
+def trade_return_stats(trade_returns, gross_trade_returns) -> dict:
     """
-    Calcula métricas estándar de backtesting incluyendo análisis de comisiones
+    Agregados de los retornos por trade necesarios para las métricas de trading
     """
-    # Datos básicos
-    initial_equity = equity_df['equity'].iloc[0]
-    final_equity = equity_df['equity'].iloc[-1]
-    
-    # Comisiones totales pagadas
-    total_commissions = equity_df['total_commissions'].iloc[-1] if 'total_commissions' in equity_df.columns else 0
+    trade_returns = np.asarray(trade_returns, dtype=np.float64)
+    gross_trade_returns = np.asarray(gross_trade_returns, dtype=np.float64)
+    wins = trade_returns[trade_returns > 0]
+    losses = trade_returns[trade_returns < 0]
+    gross_wins = gross_trade_returns[gross_trade_returns > 0]
+    return {
+        'n_trades': len(trade_returns),
+        'n_wins': len(wins),
+        'sum_wins': wins.sum(),
+        'n_losses': len(losses),
+        'sum_losses': losses.sum(),
+        'n_gross_wins': len(gross_wins),
+        'sum_gross_wins': gross_wins.sum()
+    }
+
+
+def _annualized_return(final_equity, initial_equity, years):
+    # Con la equity final en cero o negativa la potencia fraccionaria no tiene sentido (sería compleja)
+    if years <= 0:
+        return 0
+    if final_equity <= 0:
+        return float('nan')
+    return (final_equity / initial_equity) ** (1/years) - 1
+
+
+def metrics_from_stats(stats: dict) -> dict:
+    """
+    Construye el diccionario de métricas a partir de agregados
     
-    # Calcular returns diarios
-    equity_df['returns'] = equity_df['equity'].pct_change().fillna(0)
+    Permite obtener las mismas métricas tanto de un backtest en memoria como de
+    uno por streaming que solo guarda agregados.
     
-    # Trades completados
-    buy_signals = trades_df[trades_df['buy_signal'] == True]
-    sell_signals = trades_df[trades_df['sell_signal'] == True]
-    
-    trade_returns = []
-    gross_trade_returns = []  # Retornos sin considerar comisiones
-    
-    for i, buy_row in buy_signals.iterrows():
-        matching_sell = sell_signals[sell_signals.index > i].head(1)
-        if not matching_sell.empty:
-            sell_row = matching_sell.iloc[0]
-            # Retorno bruto (sin comisiones)
-            gross_return = (sell_row['close'] - buy_row['close']) / buy_row['close']
-            gross_trade_returns.append(gross_return)
-            
-            # Retorno neto estimado (considerando comisiones aproximadas)
-            # Comisión total por trade: 0.1% (0.05% compra + 0.05% venta)
-            net_return = gross_return - 0.001  # Aproximación de comisiones
-            trade_returns.append(net_return)
-    
-    trade_returns = np.array(trade_returns)
-    gross_trade_returns = np.array(gross_trade_returns)
+    Args:
+        stats: initial_equity, final_equity, total_commissions, total_slippage,
+            start_date, end_date, returns_std, max_drawdown y los agregados de
+            trade_return_stats
+    """
+    initial_equity = stats['initial_equity']
+    final_equity = stats['final_equity']
+    total_commissions = stats['total_commissions']
+    total_slippage = stats['total_slippage']
+    total_costs = total_commissions + total_slippage
     
     # Métricas de rendimiento
     total_return = (final_equity - initial_equity) / initial_equity
-    gross_total_return = total_return + (total_commissions / initial_equity)  # Retorno sin comisiones
+    gross_total_return = total_return + (total_costs / initial_equity)  # Retorno sin costes
     
     # Período de análisis
-    start_date = equity_df['timestamp'].iloc[0]
-    end_date = equity_df['timestamp'].iloc[-1]
-    days = (end_date - start_date).days
+    days = (stats['end_date'] - stats['start_date']).days
     years = days / 365.25
     
     # Rendimiento anualizado
-    annualized_return = (final_equity / initial_equity) ** (1/years) - 1 if years > 0 else 0
-    gross_annualized_return = ((initial_equity + total_commissions + (final_equity - initial_equity)) / initial_equity) ** (1/years) - 1 if years > 0 else 0
+    annualized_return = _annualized_return(final_equity, initial_equity, years)
+    gross_annualized_return = _annualized_return(final_equity + total_costs, initial_equity, years)
     
     # Volatilidad (desviación estándar de returns diarios anualizada)
-    daily_returns = equity_df['returns'].dropna()
-    volatility = daily_returns.std() * np.sqrt(252)  # 252 días de trading al año
+    volatility = stats['returns_std'] * np.sqrt(252)  # 252 días de trading al año
     
     # Sharpe Ratio (asumiendo risk-free rate = 0)
     sharpe_ratio = annualized_return / volatility if volatility > 0 else 0
     
     # Maximum Drawdown
-    equity_series = equity_df['equity']
-    rolling_max = equity_series.expanding().max()
-    drawdown = (equity_series - rolling_max) / rolling_max
-    max_drawdown = drawdown.min()
+    max_drawdown = stats['max_drawdown']
     
     # Calmar Ratio
     calmar_ratio = annualized_return / abs(max_drawdown) if max_drawdown != 0 else 0
     
     # Win Rate y Profit Factor
-    if len(trade_returns) > 0:
-        win_rate = len(trade_returns[trade_returns > 0]) / len(trade_returns)
-        winning_trades = trade_returns[trade_returns > 0]
-        losing_trades = trade_returns[trade_returns < 0]
-        
-        avg_win = winning_trades.mean() if len(winning_trades) > 0 else 0
-        avg_loss = abs(losing_trades.mean()) if len(losing_trades) > 0 else 0
-        profit_factor = (avg_win * len(winning_trades)) / (avg_loss * len(losing_trades)) if avg_loss > 0 else float('inf')
+    n_trades = stats['n_trades']
+    if n_trades > 0:
+        win_rate = stats['n_wins'] / n_trades
+        avg_win = stats['sum_wins'] / stats['n_wins'] if stats['n_wins'] > 0 else 0
+        avg_loss = abs(stats['sum_losses'] / stats['n_losses']) if stats['n_losses'] > 0 else 0
+        profit_factor = (avg_win * stats['n_wins']) / (avg_loss * stats['n_losses']) if avg_loss > 0 else float('inf')
         
         # Métricas brutas (sin comisiones)
-        gross_win_rate = len(gross_trade_returns[gross_trade_returns > 0]) / len(gross_trade_returns)
-        gross_avg_win = gross_trade_returns[gross_trade_returns > 0].mean() if len(gross_trade_returns[gross_trade_returns > 0]) > 0 else 0
+        gross_win_rate = stats['n_gross_wins'] / n_trades
+        gross_avg_win = stats['sum_gross_wins'] / stats['n_gross_wins'] if stats['n_gross_wins'] > 0 else 0
     else:
         win_rate = 0
         avg_win = 0
@@ -177,7 +275,7 @@ def calculate_performance_metrics(equity_df, trades_df):
         'sharpe_ratio': sharpe_ratio,
         'max_drawdown': max_drawdown,
         'calmar_ratio': calmar_ratio,
-        'total_trades': len(trade_returns),
+        'total_trades': n_trades,
         'win_rate': win_rate,
         'gross_win_rate': gross_win_rate,
         'avg_win': avg_win,
@@ -185,25 +283,69 @@ def calculate_performance_metrics(equity_df, trades_df):
         'avg_loss': avg_loss,
         'profit_factor': profit_factor,
         'total_commissions': total_commissions,
+        'total_slippage': total_slippage,
         'commission_impact': (total_commissions / initial_equity),
         'period_days': days,
         'period_years': years
     }
 
 
+def calculate_performance_metrics(equity_df, trades_df, trade_costs=None, cost_model: CostModel = None):
+    """
+    Calcula métricas estándar de backtesting incluyendo análisis de comisiones
+    
+    Args:
+        equity_df: Curva de equity de calculate_equity_curve
+        trades_df: Resultado de la estrategia (con buy_signal / sell_signal)
+        trade_costs: Costes por trade de calculate_trade_costs; si no se pasan se
+            calculan con cost_model
+        cost_model: Modelo de costes con el que se construyó equity_df (por defecto,
+            el de comprehensive_backtest); solo se usa si no se pasan trade_costs
+    """
+    initial_equity = equity_df['equity'].iloc[0]
+    
+    # Calcular returns diarios
+    equity_df['returns'] = equity_df['equity'].pct_change().fillna(0)
+    
+    # Maximum Drawdown
+    equity_series = equity_df['equity']
+    rolling_max = equity_series.expanding().max()
+    drawdown = (equity_series - rolling_max) / rolling_max
+    
+    # Trades completados con sus costes exactos
+    if trade_costs is None:
+        trade_costs = calculate_trade_costs(extract_trades(trades_df), initial_equity,
+                                            cost_model or default_cost_model())
+    
+    stats = {
+        'initial_equity': initial_equity,
+        'final_equity': equity_df['equity'].iloc[-1],
+        'total_commissions': equity_df['total_commissions'].iloc[-1] if 'total_commissions' in equity_df.columns else 0,
+        'total_slippage': equity_df['total_slippage'].iloc[-1] if 'total_slippage' in equity_df.columns else 0,
+        'start_date': equity_df['timestamp'].iloc[0],
+        'end_date': equity_df['timestamp'].iloc[-1],
+        'returns_std': equity_df['returns'].dropna().std(),
+        'max_drawdown': drawdown.min()
+    }
+    stats.update(trade_return_stats(trade_costs['net_return'], trade_costs['gross_return']))
+    return metrics_from_stats(stats)
+
+
 def comprehensive_backtest(df, strategy_func, strategy_params=None, initial_capital=10000, 
-                          commission_rate=0.0005, min_commission=1.0, max_commission=100.0):
+                          commission_rate=0.0005, min_commission=1.0, max_commission=100.0,
+                          cost_model=None):
     """
     Backtesting completo con métricas estándar de la industria incluyendo comisiones
     
     Args:
-        df: DataFrame con datos de trading
+        df: DataFrame o Bars con datos de trading (con Bars no se vuelven a parsear timestamps)
         strategy_func: Función de estrategia a testear
         strategy_params: Parámetros de la estrategia
         initial_capital: Capital inicial para el backtesting
         commission_rate: Tasa de comisión por operación (Interactive Brokers: 0.05%)
         min_commission: Comisión mínima por operación
         max_commission: Comisión máxima por operación
+        cost_model: Modelo de costes (por defecto, plan porcentual con los parámetros anteriores)
     
     Returns:
         tuple: (results_df, equity_curve, metrics)
@@ -214,12 +356,16 @@ def comprehensive_backtest(df, strategy_func, strategy_params=None, initial_capi
     # Ejecutar estrategia
     results = strategy_func(df, **strategy_params)
     
+    # Costes exactos de todos los trades, calculados una sola vez
+    cost_model = _build_cost_model(cost_model, commission_rate, min_commission, max_commission)
+    trade_costs = calculate_trade_costs(extract_trades(results), initial_capital, cost_model)
+    
     # Crear serie temporal de equity con comisiones
-    equity_curve = calculate_equity_curve(results, initial_capital, 
-                                        commission_rate, min_commission, max_commission)
+    equity_curve = calculate_equity_curve(results, initial_capital, cost_model=cost_model,
+                                          trade_costs=trade_costs)
     
     # Calcular métricas de rendimiento
-    metrics = calculate_performance_metrics(equity_curve, results)
+    metrics = calculate_performance_metrics(equity_curve, results, trade_costs)
     
     return results, equity_curve, metrics
 
@@ -227,49 +373,14 @@ def comprehensive_backtest(df, strategy_func, strategy_params=None, initial_capi
 def analyze_trade_details(df):
     """
     Analiza los detalles de los trades ejecutados
+
+    Returns:
+        tuple: (tabla de trades de trade_analytics.trade_table, dict de desgloses de trade_breakdowns)
     """
-    buy_signals = df[df['buy_signal'] == True]
-    sell_signals = df[df['sell_signal'] == True]
-    
-    if len(sell_signals) == 0:
-        print(f"Se generaron {len(buy_signals)} señales de compra, pero ninguna se cerró aún.")
-        return [], {}
-    
-    # Calcular retornos por trade y razones de salida
-    returns = []
-    exit_reasons = []
-    trade_details = []
-    
-    for i, buy_row in buy_signals.iterrows():
-        # Buscar la señal de venta correspondiente
-        matching_sell = sell_signals[sell_signals.index > i].head(1)
-        if not matching_sell.empty:
-            sell_row = matching_sell.iloc[0]
-            entry_price = buy_row['close']
-            exit_price = sell_row['close']
-            trade_return = (exit_price - entry_price) / entry_price
-            exit_reason = sell_row['exit_reason']
-            
-            returns.append(trade_return)
-            exit_reasons.append(exit_reason)
-            trade_details.append({
-                'entry_time': buy_row['timestamp'],
-                'exit_time': sell_row['timestamp'],
-                'entry_price': entry_price,
-                'exit_price': exit_price,
-                'return': trade_return,
-                'exit_reason': exit_reason
-            })
-    
-    # Análisis por razón de salida
-    exit_stats = {}
-    for reason in ['stop_loss', 'take_profit', 'time_exit', 'end_of_day']:
-        reason_returns = [r for r, er in zip(returns, exit_reasons) if er == reason]
-        if reason_returns:
-            exit_stats[reason] = {
-                'count': len(reason_returns),
-                'avg_return': np.mean(reason_returns),
-                'win_rate': len([r for r in reason_returns if r > 0]) / len(reason_returns)
-            }
-    
-    return trade_details, exit_stats
+    from trade_analytics import trade_table, trade_breakdowns
+
+    trades = trade_table(df)
+    if len(trades) == 0:
+        print(f"Se generaron {int(df['buy_signal'].sum())} señales de compra, pero ninguna se cerró aún.")
+        return trades, {}
+    return trades, trade_breakdowns(trades)
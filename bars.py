@@ -0,0 +1,218 @@
+"""
+Contenedor tipado de velas respaldado por arrays contiguos
+
+Los timestamps se convierten a int64 (ns) y se validan una sola vez; a partir de
+ahí las estrategias, el backtesting y el etiquetado trabajan sobre los arrays sin
+volver a parsear ni copiar los datos.
+"""
+import numpy as np
+import pandas as pd
+from config import DATA_CONFIG
+from session_calendar import NS_PER_MINUTE, SessionCalendar, timestamps_to_ns
+from resampling import ResamplingCache
+
+
+def _as_float_array(values) -> np.ndarray:
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.to_numpy()
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+class Bars:
+    """
+    Velas ordenadas y sin timestamps duplicados
+
+    Los cortes por posición, fecha o día devuelven vistas sobre los mismos arrays.
+    El calendario de sesiones y la caché de remuestreos se construyen bajo demanda
+    y se reutilizan en todas las llamadas que reciben el mismo contenedor.
+
+    Atributos:
+        timestamps: int64 en ns de cada vela (estrictamente creciente)
+        close: Precios de cierre
+        volume: Volumen de cada vela (NaN si la fuente no lo tiene)
+        high, low: Máximos y mínimos de cada vela (None si no hay)
+        session_config: Configuración de sesiones del calendario (None = SESSION_CONFIG)
+    """
+
+    def __init__(self, timestamps, close, volume=None, high=None, low=None,
+                 session_config: dict = None, validate: bool = True):
+        self.timestamps = np.ascontiguousarray(timestamps_to_ns(timestamps), dtype=np.int64)
+        self.close = _as_float_array(close)
+        n = len(self.timestamps)
+        self.volume = np.full(n, np.nan) if volume is None else _as_float_array(volume)
+        self.high = None if high is None else _as_float_array(high)
+        self.low = None if low is None else _as_float_array(low)
+        self.session_config = session_config
+        self._calendar = None
+        self._resampling = None
+        self._cache = {}
+
+        if validate:
+            for name in ('close', 'volume', 'high', 'low'):
+                values = getattr(self, name)
+                if values is not None and len(values) != n:
+                    raise ValueError(f"'{name}' tiene {len(values)} valores y hay {n} timestamps")
+            if n > 1 and np.any(np.diff(self.timestamps) <= 0):
+                raise ValueError("Los timestamps deben ser estrictamente crecientes "
+                                 "(usa Bars.from_frame(df, clean=True) para ordenar y eliminar duplicados)")
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, clean: bool = False, session_config: dict = None):
+        """
+        Construye el contenedor a partir de un DataFrame con columnas timestamp, close
+        y opcionalmente volume, high y low
+
+        Args:
+            df: DataFrame de velas
+            clean: Si True, ordena por timestamp y elimina duplicados (se queda con el último)
+            session_config: Configuración de sesiones para el calendario
+        """
+        timestamps = timestamps_to_ns(df['timestamp'])
+        columns = {name: df[name] for name in ('close', 'volume', 'high', 'low') if name in df.columns}
+        if clean:
+            order = np.argsort(timestamps, kind='stable')
+            sorted_ts = timestamps[order]
+            keep = np.append(sorted_ts[1:] != sorted_ts[:-1], True) if len(sorted_ts) else np.empty(0, bool)
+            order = order[keep]
+            timestamps = sorted_ts[keep]
+            columns = {name: _as_float_array(values)[order] for name, values in columns.items()}
+        return cls(timestamps, session_config=session_config, **columns)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, key):
+        """
+        Corte posicional; los slices devuelven vistas y las máscaras/índices, copias
+        """
+        if isinstance(key, (int, np.integer)):
+            raise TypeError("Bars solo admite cortes (slice, máscara o array de posiciones)")
+        if isinstance(key, slice) and key.step not in (None, 1):
+            raise ValueError("Los cortes de Bars no admiten paso")
+        take = lambda values: None if values is None else values[key]
+        return Bars(self.timestamps[key], self.close[key], self.volume[key], take(self.high),
+                    take(self.low), session_config=self.session_config, validate=False)
+
+    @property
+    def datetimes(self) -> np.ndarray:
+        """
+        Timestamps como datetime64[ns] (vista, sin copia)
+        """
+        return self.timestamps.view('datetime64[ns]')
+
+    @property
+    def calendar(self) -> SessionCalendar:
+        if self._calendar is None:
+            self._calendar = SessionCalendar(self.timestamps, self.session_config)
+        return self._calendar
+
+    @property
+    def resampling(self) -> ResamplingCache:
+        if self._resampling is None:
+            self._resampling = ResamplingCache(self.timestamps, self.close, self.volume,
+                                               self.high, self.low)
+        return self._resampling
+
+    def cached(self, key, compute):
+        """
+        Resultado intermedio memoizado en el contenedor (compartido entre estrategias)
+
+        Los arrays devueltos son de solo lectura para que nadie modifique la copia compartida.
+        """
+        if key not in self._cache:
+            value = compute()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            self._cache[key] = value
+        return self._cache[key]
+
+    @property
+    def bar_minutes(self) -> int:
+        """
+        Tamaño de vela en minutos (mediana de las diferencias dentro de cada día)
+
+        Sin suficientes velas se usa DATA_CONFIG['bar_minutes'].
+        """
+        def infer():
+            steps = np.diff(self.timestamps)
+            same_day = np.diff(self.calendar.day_id) == 0 if len(steps) else np.zeros(0, bool)
+            steps = steps[same_day]
+            if len(steps) == 0:
+                return DATA_CONFIG['bar_minutes']
+            return max(int(np.median(steps) // NS_PER_MINUTE), 1)
+        return self.cached(('bar_minutes',), infer)
+
+    def periods(self, minutes: float) -> int:
+        """
+        Número de velas que cubren `minutes` minutos (al menos una)
+        """
+        return max(int(round(minutes / self.bar_minutes)), 1)
+
+    def series(self, column: str, timeframe=None) -> np.ndarray:
+        """
+        Columna de las velas o de su remuestreo a timeframe (p. ej. '15min')
+        """
+        source = self if timeframe is None else self.resampling.get(timeframe)
+        return getattr(source, column)
+
+    def rolling_mean(self, column: str, window: int, min_periods: int = None, timeframe=None) -> np.ndarray:
+        """
+        Media móvil de una columna (opcionalmente remuestreada), calculada una sola vez
+        """
+        return self.cached(('rolling_mean', column, window, min_periods, timeframe),
+                           lambda: pd.Series(self.series(column, timeframe))
+                           .rolling(window=window, min_periods=min_periods).mean().to_numpy())
+
+    def between(self, start=None, end=None) -> 'Bars':
+        """
+        Vista de las velas con timestamp en [start, end)
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.timestamps, pd.Timestamp(start).value, 'left'))
+        hi = len(self) if end is None else int(np.searchsorted(self.timestamps, pd.Timestamp(end).value, 'left'))
+        return self[lo:max(lo, hi)]
+
+    def days(self, first: int, last: int = None) -> 'Bars':
+        """
+        Vista de los días de sesión [first, last) según el calendario
+        """
+        calendar = self.calendar
+        last = calendar.n_days if last is None else min(last, calendar.n_days)
+        if first >= last:
+            return self[0:0]
+        return self[int(calendar.day_start[first]):int(calendar.day_end[last - 1])]
+
+    def session(self, name: str = 'trading') -> 'Bars':
+        """
+        Velas dentro de una sesión del calendario ('trading' o 'market')
+        """
+        masks = {'trading': self.calendar.trading_mask, 'market': self.calendar.market_mask}
+        if name not in masks:
+            raise ValueError(f"Sesión desconocida: {name}. Opciones: {list(masks)}")
+        return self[masks[name]]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        DataFrame con columnas timestamp, close, volume (y high/low si existen)
+        """
+        columns = {'timestamp': self.datetimes, 'close': self.close, 'volume': self.volume}
+        if self.high is not None:
+            columns['high'] = self.high
+        if self.low is not None:
+            columns['low'] = self.low
+        return pd.DataFrame(columns, copy=False)
+
+
+def as_bars(data, session_config: dict = None) -> Bars:
+    """
+    Devuelve data como Bars; los DataFrames se convierten una sola vez
+    """
+    if isinstance(data, Bars):
+        return data
+    return Bars.from_frame(data, session_config=session_config)
+
+
+def frame_of(data) -> pd.DataFrame:
+    """
+    DataFrame de velas de data (el propio DataFrame o la vista de un Bars)
+    """
+    return data.to_frame() if isinstance(data, Bars) else data
@@ -0,0 +1,401 @@
+"""
+Punto de entrada de línea de comandos del sistema de trading
+
+Subcomandos: fetch, label, train, backtest, compare, sweep, worker, optimize y report. Cada subcomando importa
+solo los módulos que necesita (pandas, matplotlib, sklearn, talib, requests...),
+así que un backtest sin gráficos o la consulta de resultados guardados arrancan rápido.
+
+Ejemplos:
+    python cli.py backtest --years 2023 2024 --strategy 15min --save
+    python cli.py sweep --years 2024 --grid volume_multiplier=1.2,1.5,2 trend_window=2,3
+    python cli.py report --list --min-sharpe 1 --start 2023-01-01
+"""
+import argparse
+import logging
+import sys
+
+from config import DATA_CONFIG, OUTPUT_CONFIG, VOLUME_STRATEGY_CONFIG, BACKTEST_CONFIG
+
+STRATEGIES = {
+    '15min': 'volume_breakout_15min_strategy',
+    '5min': 'volume_breakout_5min_strategy'
+}
+
+# Parámetros de VOLUME_STRATEGY_CONFIG que aceptan las estrategias
+STRATEGY_PARAMS = ('volume_multiplier', 'trend_window', 'exit_periods', 'stop_loss', 'take_profit')
+
+
+def _parse_value(text: str):
+    """
+    Convierte 'k=v' a int, float o texto según corresponda
+    """
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _parse_assignments(items, multi: bool = False) -> dict:
+    params = {}
+    for item in items or []:
+        if '=' not in item:
+            raise SystemExit(f"Parámetro inválido '{item}' (formato: nombre=valor)")
+        name, value = item.split('=', 1)
+        params[name] = [_parse_value(v) for v in value.split(',')] if multi else _parse_value(value)
+    return params
+
+
+def _strategy(name: str):
+    import trading_strategies
+    return getattr(trading_strategies, STRATEGIES[name])
+
+
+def _strategy_params(args) -> dict:
+    params = {name: VOLUME_STRATEGY_CONFIG[name] for name in STRATEGY_PARAMS}
+    params.update(_parse_assignments(args.param))
+    return params
+
+
+def _cost_model(args):
+    """
+    Modelo de costes elegido con --costs (default: el de comprehensive_backtest)
+    """
+    if args.costs == 'broker':
+        from cost_model import CostModel
+        return CostModel()
+    from backtesting import default_cost_model
+    return default_cost_model()
+
+
+def _load_bars(args):
+    """
+    Carga, limpia y convierte a Bars las particiones pedidas
+    """
+    from partition_store import load_bars
+
+    try:
+        bars, partitions = load_bars(args.dataset, args.symbol, args.years)
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+    print(f"📊 {len(bars)} velas de {', '.join(str(year) for year, _ in partitions)}")
+    return bars
+
+
+def _save_run(name, strategy, params, metrics, data_version, results=None, equity_curve=None, trades=None):
+    from results_store import ResultsStore
+
+    store = ResultsStore()
+    run_id = store.append(name, params, metrics, equity_curve=equity_curve, trades=trades, results=results,
+                          strategy=strategy, data_version=data_version)
+    print(f"💾 Run {run_id} guardado en {store.path}")
+
+
+def cmd_fetch(args):
+    import obtain_data
+    if args.source == 'polygon':
+        obtain_data.polygon_trial()
+    else:
+        obtain_data.alphavantage_trial(args.bar_minutes)
+
+
+def cmd_label(args):
+    from labelling import build_features
+    from partition_store import list_partitions
+
+    if args.grid:
+        from label_grid import label_partition
+        for year, _ in list_partitions('raw', args.symbol, args.years):
+            labels = label_partition(year, symbol=args.symbol)
+            print(f"🏷️  {year}: {len(labels.grid)} objetivos etiquetados")
+        return
+    if args.matrix:
+        from feature_matrix import build_feature_matrices
+        for year, matrix in build_feature_matrices(args.years, args.symbol).items():
+            print(f"🧮 {year}: {len(matrix)} velas, {len(matrix.names)} features en "
+                  f"{matrix.codes.dtype.itemsize} bytes/vela")
+        return
+    for year, rows in build_features(args.years, args.symbol, args.workers).items():
+        print(f"🏷️  {year} etiquetado ({rows} filas)")
+
+
+def cmd_train(args):
+    if args.incremental:
+        from incremental_training import train_incremental, evaluate_incremental
+        state = train_incremental(args.incremental, years=args.years, resume=not args.restart)
+        print(f"🧠 {args.incremental}: {state['rows']} velas entrenadas")
+        print(evaluate_incremental(state, years=args.years))
+        return
+    from sklearn.model_selection import train_test_split
+    import ml_training
+
+    data = ml_training.get_all_data(args.files)
+    df_train, df_test = train_test_split(data, test_size=0.2, random_state=42)
+    ml_training.model_training(model_type=args.model, df=df_train)
+    ml_training.model_testing(model_path=f'trained_models/{args.model}_trained_2.pkl',
+                              scaler_path=f'trained_models/{args.model}_scaler_2.pkl', df=df_test)
+
+
+def cmd_backtest(args):
+    from visualization import display_backtest_results
+
+    params = _strategy_params(args)
+    strategy_func = _strategy(args.strategy)
+    # Mismo modelo de costes (--costs) en todos los modos
+    cost_model = _cost_model(args)
+    name = args.name or f"{args.strategy}_{'_'.join(map(str, args.years or ['all']))}"
+    save = args.save or OUTPUT_CONFIG['save_results']
+    if args.mode == 'streaming':
+        from streaming import streaming_backtest
+        from partition_store import list_partitions
+        paths = [path for _, path in list_partitions(args.dataset, args.symbol, args.years)]
+        metrics, outputs = streaming_backtest(strategy_func, params, args.capital, cost_model, paths=paths)
+        display_backtest_results(metrics, params, args.capital)
+        print(f"💾 Trades y equity en {outputs['trades']} y {outputs['equity']}")
+        if save:
+            # Solo métricas: las tablas ya están en disco y no caben necesariamente en memoria
+            from results_store import data_version
+            _save_run(name, args.strategy, params, metrics, data_version(paths))
+        return
+
+    bars = _load_bars(args)
+    if args.mode == 'partitioned':
+        from partitioned_backtest import partitioned_backtest
+        results, equity_curve, metrics = partitioned_backtest(bars, strategy_func, params, args.capital,
+                                                              cost_model, max_workers=args.workers)
+    else:
+        from backtesting import comprehensive_backtest
+        results, equity_curve, metrics = comprehensive_backtest(bars, strategy_func, params, args.capital,
+                                                                cost_model=cost_model)
+    display_backtest_results(metrics, params, args.capital)
+
+    if save:
+        from results_store import data_version, trade_ledger
+        _save_run(name, args.strategy, params, metrics, data_version(bars), results, equity_curve,
+                  trade_ledger(results, args.capital, cost_model))
+    if args.plots:
+        from main import run_visualization_suite
+        run_visualization_suite(results, equity_curve, metrics)
+
+
+def cmd_sweep(args):
+    grid = _parse_assignments(args.grid, multi=True)
+    if not grid:
+        raise SystemExit("Indica al menos un parámetro a barrer con --grid nombre=v1,v2")
+    base_params = {k: v for k, v in _strategy_params(args).items() if k not in grid}
+    if args.queue:
+        # Cola persistente: se reanuda si ya existe y admite workers en otras máquinas (subcomando worker)
+        from sweep_coordinator import create_sweep, run_sweep
+        path = create_sweep(args.queue, STRATEGIES[args.strategy], grid, args.years, args.dataset, args.symbol,
+                            args.capital, base_params, cost_model=_cost_model(args))
+        table = run_sweep(path, args.workers)
+        print(f"🗂️  Cola en {path}")
+    else:
+        from sweep import grid_sweep, factorized_sweep
+        sweep_func = factorized_sweep if args.factorized else grid_sweep
+        table = sweep_func(_load_bars(args), _strategy(args.strategy), grid, args.capital, _cost_model(args),
+                           base_params=base_params)
+    table = table.sort_values(args.sort_by, ascending=False)
+    columns = list(grid) + ['total_return', 'sharpe_ratio', 'max_drawdown', 'total_trades', 'win_rate']
+    print(table[columns].head(args.top).to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"💾 Barrido guardado en {args.output}")
+
+
+def cmd_worker(args):
+    from sweep_coordinator import run_worker, progress
+
+    completed = run_worker(args.queue)
+    print(f"🛠️  {completed} trabajos completados; estado de la cola: {progress(args.queue)}")
+
+
+def cmd_compare(args):
+    from comparison import compare_strategies, default_runs
+
+    runs = default_runs()
+    for name in list(runs):
+        strategy_func, params = runs[name]
+        runs[name] = (strategy_func, {**params, **_parse_assignments(args.param)})
+    results_dict, table = compare_strategies(_load_bars(args), runs, args.capital, _cost_model(args),
+                                             max_workers=args.workers)
+    print(table.to_string(float_format=lambda v: f'{v:.4f}'))
+    if args.plots or args.save_path:
+        from visualization import plot_strategy_performance_comparison
+        plot_strategy_performance_comparison(results_dict, save_path=args.save_path)
+
+
+def cmd_optimize(args):
+    from optimizer import Study, optimize
+
+    study = Study.load_or_create(args.study, objective=args.objective, seed=args.seed)
+    fixed = {k: v for k, v in _strategy_params(args).items() if k not in study.space.names}
+    print(f"🔎 Estudio '{study.name}': {len(study.trials)} trials previos, objetivo {study.objective}")
+    study = optimize(_load_bars(args), _strategy(args.strategy), args.trials, study, args.capital,
+                     _cost_model(args), base_params=fixed, n_jobs=args.jobs)
+    best = study.best_trial
+    if best is None:
+        print("⚠️  Ningún trial ha completado todos los escalones")
+        return
+    print(f"\n🏆 Mejor trial {best['number']}: {study.objective} = {best['value']:.3f}")
+    for name, value in best['params'].items():
+        print(f"   • {name}: {value}")
+    print(f"   • Coste: {study.backtest_cost:.1f} backtests completos equivalentes "
+          f"({sum(t['state'] == 'pruned' for t in study.trials)} trials podados)")
+
+
+def cmd_report(args):
+    from results_store import ResultsStore
+
+    store = ResultsStore()
+    min_metrics = {'sharpe_ratio': args.min_sharpe} if args.min_sharpe is not None else None
+    runs = store.list_runs(strategy=args.strategy, start=args.start, end=args.end, min_metrics=min_metrics,
+                           limit=args.limit)
+    if args.runs:
+        runs = runs[runs['run_id'].isin(args.runs) | runs['name'].isin(args.runs)]
+    if args.list:
+        # Solo consulta el índice: no lee las tablas de los runs ni importa matplotlib
+        for run in runs.itertuples():
+            metrics = run.metrics
+            print(f"{run.run_id}  {run.name:30s} retorno {metrics['total_return']:+.2%}  "
+                  f"sharpe {metrics['sharpe_ratio']:6.2f}  drawdown {metrics['max_drawdown']:.2%}  "
+                  f"trades {metrics['total_trades']}")
+        return
+
+    from reporting import render_batch_reports
+    # Último run de cada nombre con las tablas necesarias para los gráficos
+    runs = runs[runs['tables'].map(lambda tables: {'results', 'equity'} <= set(tables))]
+    runs = runs.sort_values('created_at').drop_duplicates('name', keep='last')
+    reports = {run.name: store.load_run(run.run_id) for run in runs.itertuples()}
+    if not reports:
+        raise SystemExit("No hay resultados guardados (usa backtest --save)")
+    print(f"📄 Reporte en {render_batch_reports(reports, args.output, args.format)}")
+
+
+def _add_data_arguments(parser):
+    parser.add_argument('--years', type=int, nargs='+', help='Años a cargar (por defecto, todos)')
+    parser.add_argument('--dataset', choices=['raw', 'labelled'], default='raw')
+    parser.add_argument('--symbol', default=None, help=f"Símbolo (por defecto {DATA_CONFIG['symbol']})")
+
+
+def _add_cost_arguments(parser):
+    parser.add_argument('--costs', choices=['default', 'broker'], default='default',
+                        help='Modelo de costes: default (comisión 0.05%%, mínimo 1, máximo 100; el de las '
+                             'librerías) o broker (INTERACTIVE_BROKERS_CONFIG). Por defecto, default')
+
+
+def _add_strategy_arguments(parser):
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='15min')
+    parser.add_argument('--param', nargs='*', metavar='NOMBRE=VALOR',
+                        help='Sobrescribe parámetros de VOLUME_STRATEGY_CONFIG')
+    parser.add_argument('--capital', type=float, default=BACKTEST_CONFIG['initial_capital'])
+    _add_cost_arguments(parser)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Sistema de trading - estrategia de volumen y tendencia')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fetch = subparsers.add_parser('fetch', help='Descarga datos de mercado')
+    fetch.add_argument('--source', choices=['alphavantage', 'polygon'], default='alphavantage')
+    fetch.add_argument('--bar-minutes', type=int, choices=[1, 5], default=None,
+                       help="Tamaño de vela (por defecto DATA_CONFIG['bar_minutes'])")
+    fetch.set_defaults(func=cmd_fetch)
+
+    label = subparsers.add_parser('label', help='Calcula indicadores y etiqueta particiones')
+    label.add_argument('--years', type=int, nargs='+')
+    label.add_argument('--symbol', default=None)
+    label.add_argument('--workers', type=int, default=None, help='Procesos (un año por proceso)')
+    label.add_argument('--grid', action='store_true',
+                       help='Etiqueta la rejilla de objetivos de LABEL_GRID_CONFIG (label_grid.py)')
+    label.add_argument('--matrix', action='store_true',
+                       help='Matriz de features discretizadas y empaquetadas en bits (feature_matrix.py)')
+    label.set_defaults(func=cmd_label)
+
+    train = subparsers.add_parser('train', help='Entrena y evalúa un modelo')
+    train.add_argument('--model', choices=['DecisionTree', 'RandomForest', 'GradientBoosting'],
+                       default='RandomForest')
+    train.add_argument('--files', type=int, default=5, help='Particiones etiquetadas 2021..2020+files-1')
+    train.add_argument('--incremental', choices=['SGD', 'NaiveBayes', 'HistGradientBoosting'], default=None,
+                       help='Entrenamiento por bloques con checkpoint (incremental_training.py)')
+    train.add_argument('--years', type=int, nargs='+', help='Años a usar en modo incremental')
+    train.add_argument('--restart', action='store_true', help='Ignora el checkpoint y entrena desde cero')
+    train.set_defaults(func=cmd_train)
+
+    backtest = subparsers.add_parser('backtest', help='Ejecuta un backtest')
+    _add_data_arguments(backtest)
+    _add_strategy_arguments(backtest)
+    backtest.add_argument('--mode', choices=['memory', 'partitioned', 'streaming'], default='memory')
+    backtest.add_argument('--workers', type=int, default=None, help='Procesos en modo partitioned')
+    backtest.add_argument('--save', action='store_true', help='Guarda el run en el almacén de resultados')
+    backtest.add_argument('--name', default=None, help='Nombre del run guardado')
+    backtest.add_argument('--plots', action='store_true', help='Muestra las visualizaciones')
+    backtest.set_defaults(func=cmd_backtest)
+
+    sweep = subparsers.add_parser('sweep', help='Barrido de parámetros')
+    _add_data_arguments(sweep)
+    _add_strategy_arguments(sweep)
+    sweep.add_argument('--grid', nargs='+', metavar='NOMBRE=V1,V2', help='Valores a barrer por parámetro')
+    sweep.add_argument('--factorized', action='store_true',
+                       help='Calcula cada conjunto de señales de entrada una vez para todas las salidas')
+    sweep.add_argument('--queue', default=None, metavar='NOMBRE',
+                       help='Ejecuta el barrido desde una cola persistente reanudable (results/sweeps/NOMBRE.sqlite)')
+    sweep.add_argument('--workers', type=int, default=None, help='Procesos locales con --queue')
+    sweep.add_argument('--sort-by', default='total_return')
+    sweep.add_argument('--top', type=int, default=10)
+    sweep.add_argument('--output', default=None, help='CSV donde guardar el barrido completo')
+    sweep.set_defaults(func=cmd_sweep)
+
+    worker = subparsers.add_parser('worker', help='Worker de una cola de barrido (también desde otra máquina)')
+    worker.add_argument('queue', help='Ruta de la cola SQLite (results/sweeps/NOMBRE.sqlite)')
+    worker.set_defaults(func=cmd_worker)
+
+    compare = subparsers.add_parser('compare', help='Compara las estrategias sobre los mismos datos')
+    _add_data_arguments(compare)
+    compare.add_argument('--param', nargs='*', metavar='NOMBRE=VALOR',
+                         help='Sobrescribe parámetros comunes a todas las estrategias')
+    compare.add_argument('--capital', type=float, default=BACKTEST_CONFIG['initial_capital'])
+    _add_cost_arguments(compare)
+    compare.add_argument('--workers', type=int, default=None, help='Hilos para los runs')
+    compare.add_argument('--plots', action='store_true', help='Muestra el gráfico comparativo')
+    compare.add_argument('--save-path', default=None, help='Guarda el gráfico comparativo en esta ruta')
+    compare.set_defaults(func=cmd_compare)
+
+    optimize = subparsers.add_parser('optimize', help='Búsqueda adaptativa (TPE) con poda por meses')
+    _add_data_arguments(optimize)
+    _add_strategy_arguments(optimize)
+    optimize.add_argument('--study', default='volume_breakout', help='Nombre del estudio (se reanuda si existe)')
+    optimize.add_argument('--trials', type=int, default=None, help='Trials totales del estudio')
+    optimize.add_argument('--objective', choices=['sharpe', 'calmar'], default=None)
+    optimize.add_argument('--jobs', type=int, default=None, help='Trials en paralelo')
+    optimize.add_argument('--seed', type=int, default=0)
+    optimize.set_defaults(func=cmd_optimize)
+
+    report = subparsers.add_parser('report', help='Reportes de resultados guardados')
+    report.add_argument('runs', nargs='*', help='Nombres o run_id a incluir (por defecto, todos)')
+    report.add_argument('--list', action='store_true', help='Solo lista las métricas guardadas')
+    report.add_argument('--strategy', choices=sorted(STRATEGIES), default=None)
+    report.add_argument('--min-sharpe', type=float, default=None, help='Solo runs con Sharpe >= este valor')
+    report.add_argument('--start', default=None, help='Solo runs cuyo período empieza en o tras esta fecha')
+    report.add_argument('--end', default=None, help='Solo runs cuyo período acaba en o antes de esta fecha')
+    report.add_argument('--limit', type=int, default=None, help='Máximo de runs (los más recientes)')
+    report.add_argument('--format', choices=['html', 'png'], default=None)
+    report.add_argument('--output', default=None, help='Carpeta de salida de los reportes')
+    report.set_defaults(func=cmd_report)
+
+    return parser
+
+
+def main(argv=None):
+    # Los módulos no configuran logging al importarse: los progresos (workers, etiquetado...) se ven aquí
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,111 @@
+"""
+Comparación de varias estrategias o parametrizaciones sobre los mismos datos
+
+Los datos se cargan y limpian una sola vez y los intermedios comunes (índice de
+sesiones, agregados de 15 minutos, medias móviles de volumen y tendencias) se
+calculan antes de lanzar los runs, memoizados en el Bars compartido. Los runs se
+ejecutan en hilos para que todos lean los mismos arrays sin copiarlos.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from config import BACKTEST_CONFIG, VOLUME_STRATEGY_CONFIG
+from bars import as_bars
+from backtesting import comprehensive_backtest, default_cost_model
+from trading_strategies import (volume_breakout_15min_strategy, volume_breakout_5min_strategy,
+                                uptrend_mask)
+
+# Métricas de la tabla comparativa
+COMPARISON_METRICS = ['total_return', 'annualized_return', 'sharpe_ratio', 'max_drawdown', 'calmar_ratio',
+                      'win_rate', 'profit_factor', 'total_trades', 'total_commissions']
+
+
+def default_runs() -> dict:
+    """
+    Las dos estrategias de volumen con los parámetros de VOLUME_STRATEGY_CONFIG
+    """
+    params = {name: VOLUME_STRATEGY_CONFIG[name]
+              for name in ('volume_multiplier', 'trend_window', 'exit_periods', 'stop_loss', 'take_profit')}
+    return {
+        'Volume Breakout 15min': (volume_breakout_15min_strategy, params),
+        'Volume Breakout 5min': (volume_breakout_5min_strategy,
+                                 {**params, 'volume_window': VOLUME_STRATEGY_CONFIG['volume_window']})
+    }
+
+
+def prepare_shared_intermediates(bars, runs: dict):
+    """
+    Calcula una vez los intermedios que comparten los runs (memoizados en bars)
+    """
+    bars.calendar
+    for strategy_func, params in runs.values():
+        trend_window = params.get('trend_window', 3)
+        if strategy_func is volume_breakout_15min_strategy:
+            bars_15min = bars.resampling.get('15min')
+            bars.rolling_mean('volume', 20, min_periods=10, timeframe='15min')
+            bars.cached(('uptrend', '15min', trend_window), lambda: uptrend_mask(bars_15min.close, trend_window))
+        elif strategy_func is volume_breakout_5min_strategy:
+            bars.rolling_mean('volume', params.get('volume_window', 20), min_periods=10)
+            bars.cached(('uptrend', None, trend_window), lambda: uptrend_mask(bars.close, trend_window))
+
+
+def metrics_table(results_dict: dict) -> pd.DataFrame:
+    """
+    Tabla de métricas {estrategia: fila} a partir de un results_dict de la comparación
+    """
+    table = pd.DataFrame.from_dict({name: metrics for name, (_, _, metrics) in results_dict.items()},
+                                   orient='index')
+    return table[[c for c in COMPARISON_METRICS if c in table.columns]].rename_axis('strategy')
+
+
+def compare_strategies(data, runs: dict = None, initial_capital=10000, cost_model=None,
+                       max_workers: int = None):
+    """
+    Ejecuta N estrategias o parametrizaciones en paralelo sobre los mismos datos
+
+    Args:
+        data: DataFrame o Bars ya limpios (se convierten a Bars una sola vez)
+        runs: Dict {nombre: (strategy_func, strategy_params)} (por defecto, default_runs())
+        initial_capital: Capital inicial de cada run
+        cost_model: Modelo de costes común (por defecto, el de comprehensive_backtest)
+        max_workers: Hilos a usar (por defecto BACKTEST_CONFIG['parallel_workers'])
+
+    Returns:
+        tuple: (results_dict {nombre: (equity_df, results_df, metrics)} en el formato de
+                plot_strategy_performance_comparison, tabla de métricas)
+    """
+    bars = as_bars(data)
+    runs = runs or default_runs()
+    cost_model = cost_model or default_cost_model()
+    max_workers = max_workers or BACKTEST_CONFIG['parallel_workers'] or os.cpu_count() or 1
+    prepare_shared_intermediates(bars, runs)
+
+    def run(item):
+        name, (strategy_func, params) = item
+        results, equity_curve, metrics = comprehensive_backtest(bars, strategy_func, params, initial_capital,
+                                                                cost_model=cost_model)
+        return name, (equity_curve, results, metrics)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(runs))) as executor:
+        results_dict = dict(executor.map(run, runs.items()))
+    return results_dict, metrics_table(results_dict)
+
+
+def run_comparison(years=None, runs: dict = None, initial_capital=10000, plot: bool = True,
+                   save_path: str = None, max_workers: int = None):
+    """
+    Carga los datos una vez, compara los runs y muestra el gráfico y la tabla de métricas
+    """
+    from partition_store import load_bars
+
+    bars, partitions = load_bars(years=years)
+    print(f"📊 {len(bars)} velas de {', '.join(str(year) for year, _ in partitions)}")
+    results_dict, table = compare_strategies(bars, runs, initial_capital, max_workers=max_workers)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(table)
+    if plot:
+        from visualization import plot_strategy_performance_comparison
+        plot_strategy_performance_comparison(results_dict, save_path=save_path)
+    return results_dict, table
@@ -9,27 +9,124 @@ DATA_CONFIG = {
     'default_file': '2024_data.csv',
     'timestamp_column': 'timestamp',
     'price_column': 'close',
-    'volume_column': 'volume'
+    'volume_column': 'volume',
+    'symbol': 'KO',                        # Símbolo por defecto (subcarpeta opcional en raw_data/)
+    'bar_minutes': 5,                      # Tamaño de vela de los datos descargados (1 o 5 minutos)
+    'chunk_size': 20000                    # Filas por bloque en la lectura por streaming
 }
 
 # Configuración de la estrategia de volumen
 VOLUME_STRATEGY_CONFIG = {
     'volume_multiplier': 1.5,      # Multiplicador para volumen alto
     'trend_window': 2,             # Ventana para detectar tendencia
-    'exit_periods': 12,            # Períodos para salida por tiempo (60 min)
+    'exit_periods': 12,            # Períodos para salida por tiempo (60 min con velas de 5 min)
     'stop_loss': -0.0025,          # Stop loss (-0.25%)
     'take_profit': 0.015,          # Take profit (+1.5%)
     'volume_window': 20,           # Ventana para calcular media de volumen
     'min_periods': 10              # Períodos mínimos para calcular media
 }
 
+# Configuración de la pasarela de órdenes (order_gateway.py)
+GATEWAY_CONFIG = {
+    'host': '127.0.0.1',                   # TWS / IB Gateway
+    'port': 7497,                          # 7497 = paper trading, 7496 = real
+    'client_id': 1,
+    'reconnect_delay': 0.5,                # Espera inicial antes de reconectar (s)
+    'max_reconnect_delay': 30.0,           # Espera máxima entre reintentos (backoff exponencial)
+    'queue_size': 1000                     # Órdenes pendientes de envío como máximo
+}
+
+# Screener multi-símbolo de volume breakout en tiempo real (screener.py)
+SCREENER_CONFIG = {
+    'timeframe': '15min',                  # Bloque de agregación de la señal ('5min' = cada vela)
+    'volume_window': 20,                   # Bloques de la media de volumen
+    'min_periods': 10,                     # Bloques mínimos para calcular la media
+    'replay_symbols': 500                  # Símbolos de la réplica del benchmark
+}
+
+# Configuración del optimizador adaptativo de parámetros (optimizer.py)
+OPTIMIZER_CONFIG = {
+    'objective': 'sharpe',                 # Métrica a maximizar: 'sharpe' o 'calmar'
+    'n_trials': 60,                        # Candidatos a evaluar (incluidos los podados)
+    'n_startup_trials': 10,                # Candidatos aleatorios antes de usar TPE
+    'n_ei_candidates': 24,                 # Muestras de l(x) entre las que se elige la mejor l/g
+    'gamma': 0.25,                         # Fracción de trials considerados "buenos"
+    'rungs': (0.25, 0.5, 1.0),             # Fracción de meses evaluada en cada escalón
+    'prune_quantile': 0.5,                 # Se poda si Sharpe y Calmar quedan bajo este cuantil
+    'min_trials_to_prune': 5,              # Trials mínimos en un escalón para poder podar
+    'n_jobs': None,                        # Trials concurrentes (None = todos los núcleos)
+    'studies_path': 'results/studies/',    # Estado de los estudios (JSON) para reanudar
+    'search_space': {                      # (mínimo, máximo, tipo)
+        'volume_multiplier': (1.0, 3.0, 'float'),
+        'trend_window': (2, 6, 'int'),
+        'exit_periods': (3, 36, 'int'),
+        'stop_loss': (-0.02, -0.001, 'float'),
+        'take_profit': (0.002, 0.03, 'log')
+    }
+}
+
+# Configuración de barridos distribuidos (cola de trabajos en SQLite)
+SWEEP_CONFIG = {
+    'queue_path': 'results/sweeps/',       # Una base de datos SQLite por barrido (sistema de ficheros compartido)
+    'heartbeat_interval': 5.0,             # Segundos entre latidos de un worker con un trabajo en curso
+    'lease_timeout': 60.0,                 # Sin latido durante este tiempo, el trabajo vuelve a la cola
+    'max_attempts': 3,                     # Intentos de un trabajo antes de marcarlo como fallido
+    'workers': None                        # Procesos locales (None = todos los núcleos)
+}
+
+# Cálculo de indicadores por partición (labelling.build_features)
+FEATURE_CONFIG = {
+    'warmup_bars': 1000,                   # Velas de la partición anterior para arrancar EMA/MACD/RSI
+    'parallel_workers': None               # Procesos (None = todos los núcleos)
+}
+
+# Matriz de features discretizadas y empaquetadas en bits (feature_matrix.py)
+DISCRETIZATION_CONFIG = {
+    'rsi_bounds': (30, 70),                # RSI < 30 -> +1, RSI > 70 -> -1, entre ambos según su pendiente
+    'volume_window': VOLUME_STRATEGY_CONFIG['volume_window'],  # Velas de la media de volumen
+    'volume_ratio_buckets': (1.5, 2.0, 3.0, 5.0),  # Tramos de volumen / media
+    'time_bucket_minutes': 30              # Tramos de la hora del día
+}
+
+# Entrenamiento incremental por bloques (incremental_training.py)
+INCREMENTAL_TRAINING_CONFIG = {
+    'models_path': 'trained_models/',      # Carpeta de los checkpoints
+    'boosting_iterations': 100             # Árboles de HistGradientBoosting (se reajusta en cada actualización)
+}
+
+# Rejilla de objetivos de etiquetado (label_grid.py): se etiquetan todas las combinaciones
+LABEL_GRID_CONFIG = {
+    'profits': (0.003, 0.005, 0.01),       # Take profit de slprofit_strategy
+    'stop_losses': (-0.002, -0.005),       # Stop loss
+    'horizons': (48, 136)                  # Velas hacia delante (parámetro range)
+}
+
+# Configuración de sesiones de mercado (horas locales del exchange, fin exclusivo)
+SESSION_CONFIG = {
+    'trading_hours': ('10:00', '17:00'),   # Ventana de datos útiles (limpieza de ruido)
+    'market_hours': ('10:00', '16:00'),    # Horario de mercado nominal (volatilidad, entrenamiento)
+    'end_of_day': '16:55'                  # Cierre obligatorio de posiciones intradía
+}
+
+# Configuración del índice de calidad de datos
+DATA_QUALITY_CONFIG = {
+    'index_path': 'quality_index/',        # Carpeta del índice (un .npz por partición)
+    'bar_minutes': DATA_CONFIG['bar_minutes'],  # Tamaño nominal de vela; diferencias mayores son huecos
+    'outlier_threshold': 12.0,             # Retornos con |z robusto| superior se marcan como atípicos
+    'max_outlier_fraction': 0.01,          # Fracción de atípicos a partir de la cual se rechaza un mes descargado
+    'min_coverage': 0.9                    # Cobertura mínima del horario de mercado para un día completo
+}
+
 # Configuración de backtesting
 BACKTEST_CONFIG = {
     'initial_capital': 1000,      # Capital inicial
     'commission': 0.0005,          # Comisión Interactive Brokers: 0.05% por operación
     'slippage': 0.0001,           # Slippage estimado (0.01%)
     'risk_free_rate': 0.02,       # Tasa libre de riesgo (2% anual)
-    'trading_days_per_year': 252   # Días de trading por año
+    'trading_days_per_year': 252,  # Días de trading por año
+    'parallel_workers': None,      # Procesos para el backtest por días (None = todos los núcleos)
+    'days_per_chunk': 20,          # Días de sesión por tarea en el backtest por días
+    'intrabar_exits': True         # Stop loss / take profit contra máximos y mínimos si las velas los tienen
 }
 
 # Configuración específica de Interactive Brokers
@@ -37,6 +134,18 @@ INTERACTIVE_BROKERS_CONFIG = {
     'commission_rate': 0.0005,     # 0.05% por operación (compra + venta = 0.1% total por trade)
     'minimum_commission': 1.25,     # Comisión mínima por operación (USD)
     'maximum_commission': 100.0,   # Comisión máxima por operación (USD)
+    'commission_schedule': 'percentage',  # 'percentage', 'fixed' (IB fijo por acción) o 'tiered' (IB escalonado)
+    'fixed_per_share': 0.005,      # Plan fijo: USD por acción
+    'fixed_minimum': 1.0,          # Plan fijo: mínimo por orden (USD)
+    'tiered_per_share': [          # Plan escalonado: (acciones/mes hasta, USD por acción)
+        (300_000, 0.0035),
+        (3_000_000, 0.0020),
+        (20_000_000, 0.0015),
+        (100_000_000, 0.0010),
+        (float('inf'), 0.0005)
+    ],
+    'tiered_minimum': 0.35,        # Plan escalonado: mínimo por orden (USD)
+    'max_pct_trade_value': 0.01,   # Planes por acción: máximo 1% del valor de la operación
     'currency': 'USD',
     'market': 'SMART',             # Enrutamiento inteligente de órdenes
     'exchange': 'NYSE'             # Bolsa principal
@@ -47,6 +156,8 @@ VISUALIZATION_CONFIG = {
     'figure_size': (16, 12),       # Tamaño de figuras
     'dpi': 100,                    # Resolución
     'style': 'seaborn-v0_8',      # Estilo de matplotlib
+    'max_plot_points': 4000,       # Presupuesto de puntos por serie dibujada
+    'downsample_method': 'lttb',   # 'lttb' o 'minmax' para reducir series largas
     'color_palette': {
         'buy_signal': 'green',
         'sell_signal': 'red', 
@@ -66,12 +177,23 @@ METRICS_CONFIG = {
     'win_rate_good': 0.5          # Umbral para win rate bueno
 }
 
+# Desgloses de trades (trade_analytics.py)
+TRADE_ANALYTICS_CONFIG = {
+    'holding_buckets': (15, 30, 60, 120, 240),    # Límites de los tramos de tenencia (minutos)
+    # Mismos tramos de volumen / media móvil (en la entrada) y ventana que la matriz de features
+    'volume_ratio_buckets': DISCRETIZATION_CONFIG['volume_ratio_buckets'],
+    'volume_window': DISCRETIZATION_CONFIG['volume_window']  # Si el resultado no trae la media
+}
+
 # Configuración de archivos de salida
 OUTPUT_CONFIG = {
     'results_path': 'results/',
+    'store_path': 'results/store/',  # Almacén de runs (índice SQLite + un .npz por run)
     'plots_path': 'plots/',
     'reports_path': 'reports/',
     'save_plots': False,           # Guardar gráficos automáticamente
-    'save_results': False,         # Guardar resultados automáticamente
-    'export_format': 'csv'         # Formato de exportación
+    'save_results': False,         # Guardar automáticamente cada backtest en el almacén de runs
+    'export_format': 'csv',        # Formato de exportación
+    'report_format': 'html',       # Formato de los reportes headless: 'png' o 'html'
+    'report_workers': None         # Procesos para generar reportes en lote (None = todos los núcleos)
 }
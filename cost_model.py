@@ -0,0 +1,290 @@
+"""
+Modelo de costes vectorizado: comisiones de Interactive Brokers y slippage
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+from config import INTERACTIVE_BROKERS_CONFIG, BACKTEST_CONFIG
+
+# Regímenes de cada comisión: tarifa, mínimo o máximo
+_RAW, _MIN, _MAX = 0, 1, 2
+
+
+def _select(candidates, capital):
+    """
+    Elige por trade el tramo activo de min(max(tarifa, mínimo), máximo)
+    
+    Args:
+        candidates: [(alpha, beta)] de tarifa, mínimo y máximo, afines en el capital
+        capital: Estimación del capital antes de cada trade
+    
+    Returns:
+        np.ndarray: Régimen activo de cada trade
+    """
+    raw, low, high = [alpha * capital + beta for alpha, beta in candidates]
+    regime = np.where(raw >= low, _RAW, _MIN)
+    value = np.where(regime == _RAW, raw, low)
+    return np.where(value > high, _MAX, regime)
+
+
+def _pick(candidates, regime):
+    """
+    Coeficientes (alpha, beta) del régimen activo de cada trade
+    """
+    alpha = np.choose(regime, [np.broadcast_to(c[0], regime.shape) for c in candidates])
+    beta = np.choose(regime, [np.broadcast_to(c[1], regime.shape) for c in candidates])
+    return alpha, beta
+
+
+def _months(timestamps) -> np.ndarray:
+    """
+    Mes (int64 de datetime64[M]) de cada timestamp
+    """
+    values = np.asarray(timestamps)
+    if values.dtype.kind != 'M':
+        # Solo se parsea con pandas si no son ya datetime64 (to_datetime recorre los valores uno a uno)
+        values = pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[ns]')
+    return values.astype('datetime64[M]').astype(np.int64)
+
+
+def _solve_affine_recurrence(a, b, initial):
+    """
+    Resuelve C[k+1] = a[k] * C[k] + b[k] sin bucles: devuelve C[0..K]
+    """
+    prefix = np.concatenate(([1.0], np.cumprod(a)))
+    return prefix * (initial + np.concatenate(([0.0], np.cumsum(b / prefix[1:]))))
+
+
+class CostModel:
+    """
+    Costes de ejecución aplicados en bloque a todos los trades de un backtest
+    
+    Planes soportados (INTERACTIVE_BROKERS_CONFIG['commission_schedule']):
+        - 'percentage': porcentaje del valor de la operación con mínimo y máximo por orden
+        - 'fixed': plan fijo de IB por acción, con mínimo por orden y máximo del 1% del valor
+        - 'tiered': plan escalonado de IB según el volumen mensual acumulado de acciones
+    
+    El slippage se aplica como un porcentaje desfavorable sobre el precio de
+    entrada y de salida.
+    """
+    
+    def __init__(self, schedule=None, commission_rate=None, min_commission=None, max_commission=None,
+                 slippage=None):
+        ib = INTERACTIVE_BROKERS_CONFIG
+        self.schedule = schedule or ib['commission_schedule']
+        if self.schedule not in ('percentage', 'fixed', 'tiered'):
+            raise ValueError(f"Plan de comisiones desconocido: {self.schedule}")
+        self.commission_rate = ib['commission_rate'] if commission_rate is None else commission_rate
+        self.slippage = BACKTEST_CONFIG['slippage'] if slippage is None else slippage
+        self.max_pct_trade_value = ib['max_pct_trade_value']
+        
+        if self.schedule == 'percentage':
+            self.min_commission = ib['minimum_commission'] if min_commission is None else min_commission
+            self.max_commission = ib['maximum_commission'] if max_commission is None else max_commission
+        elif self.schedule == 'fixed':
+            self.min_commission = ib['fixed_minimum'] if min_commission is None else min_commission
+            self.max_commission = max_commission
+        else:
+            self.min_commission = ib['tiered_minimum'] if min_commission is None else min_commission
+            self.max_commission = max_commission
+        
+        tiers = ib['tiered_per_share'] if self.schedule == 'tiered' else [(np.inf, ib['fixed_per_share'])]
+        self.tier_limits = np.array([limit for limit, _ in tiers], dtype=np.float64)
+        self.tier_rates = np.array([rate for _, rate in tiers], dtype=np.float64)
+    
+    @property
+    def settings(self) -> dict:
+        """
+        Parámetros con los que CostModel(**settings) reconstruye este modelo (serializables a JSON)
+        """
+        as_float = lambda value: None if value is None else float(value)
+        return {'schedule': self.schedule, 'commission_rate': as_float(self.commission_rate),
+                'min_commission': as_float(self.min_commission), 'max_commission': as_float(self.max_commission),
+                'slippage': as_float(self.slippage)}
+    
+    @property
+    def per_share(self) -> bool:
+        return self.schedule != 'percentage'
+    
+    def commissions(self, trade_value, shares, monthly_volume=None) -> np.ndarray:
+        """
+        Comisión de un conjunto de órdenes independientes, calculada en bloque
+        
+        Args:
+            trade_value: Valor de cada orden (USD)
+            shares: Acciones de cada orden
+            monthly_volume: Acciones ya negociadas en el mes antes de cada orden (plan escalonado)
+        
+        Returns:
+            np.ndarray: Comisión de cada orden
+        """
+        trade_value = np.asarray(trade_value, dtype=np.float64)
+        shares = np.asarray(shares, dtype=np.float64)
+        if self.per_share:
+            rate = self._share_rate(np.zeros_like(shares) if monthly_volume is None else monthly_volume)
+            raw = rate * shares
+            high = self.max_pct_trade_value * trade_value
+        else:
+            raw = self.commission_rate * trade_value
+            high = np.inf if self.max_commission is None else self.max_commission
+        return np.minimum(np.maximum(raw, self.min_commission), high)
+    
+    def _share_rate(self, monthly_volume) -> np.ndarray:
+        tier = np.searchsorted(self.tier_limits, monthly_volume, side='left')
+        return self.tier_rates[np.minimum(tier, len(self.tier_rates) - 1)]
+    
+    def _entry_candidates(self, price_in, rate):
+        """
+        Comisión de entrada como función afín del capital (comprando con todo el capital)
+        """
+        zeros = np.zeros_like(price_in)
+        low = (zeros, zeros + self.min_commission)
+        if self.per_share:
+            # c = q * (C - c) / P  y  c = m * (C - c)  despejados en c
+            m = self.max_pct_trade_value
+            return [(rate / (price_in + rate), zeros), low, (zeros + m / (1 + m), zeros)]
+        high_value = np.inf if self.max_commission is None else self.max_commission
+        return [(zeros + self.commission_rate, zeros), low, (zeros, zeros + high_value)]
+    
+    def _exit_candidates(self, shares, value, rate):
+        """
+        Comisión de salida como función afín del capital, dadas acciones y valor afines
+        """
+        (a_s, b_s), (a_v, b_v) = shares, value
+        zeros = np.zeros_like(a_s)
+        low = (zeros, zeros + self.min_commission)
+        if self.per_share:
+            m = self.max_pct_trade_value
+            return [(rate * a_s, rate * b_s), low, (m * a_v, m * b_v)]
+        high_value = np.inf if self.max_commission is None else self.max_commission
+        return [(self.commission_rate * a_v, self.commission_rate * b_v), low, (zeros, zeros + high_value)]
+    
+    def _trade_maps(self, price_in, price_out, capital, month, prior_volume=None):
+        """
+        Regímenes y coeficientes afines de cada trade para una estimación del capital
+        """
+        if self.schedule == 'tiered':
+            # Volumen mensual previo a cada pierna con las acciones estimadas
+            estimate = capital / price_in
+            volume = 2 * estimate
+            month_start = np.concatenate(([True], month[1:] != month[:-1]))
+            cumulative = np.cumsum(volume)
+            before_month = np.maximum.accumulate(np.where(month_start, cumulative - volume, 0))
+            volume_before = cumulative - volume - before_month
+            if prior_volume is not None:
+                volume_before = volume_before + np.where(month == prior_volume[0], prior_volume[1], 0.0)
+            rate_in = self._share_rate(volume_before)
+            rate_out = self._share_rate(volume_before + estimate)
+        else:
+            rate_in = rate_out = np.full_like(price_in, self.tier_rates[0])
+        
+        entry = self._entry_candidates(price_in, rate_in)
+        entry_regime = _select(entry, capital)
+        a_in, b_in = _pick(entry, entry_regime)
+        shares = ((1 - a_in) / price_in, -b_in / price_in)
+        value = (shares[0] * price_out, shares[1] * price_out)
+        exit_ = self._exit_candidates(shares, value, rate_out)
+        exit_regime = _select(exit_, capital)
+        a_out, b_out = _pick(exit_, exit_regime)
+        
+        regimes = np.stack([entry_regime, exit_regime, rate_in, rate_out])
+        return regimes, (a_in, b_in), shares, value, (a_out, b_out)
+    
+    def trade_costs(self, entry_price, exit_price, initial_capital, entry_time=None,
+                    prior_volume=None, max_iterations: int = 50) -> pd.DataFrame:
+        """
+        Costes exactos de cada trade cerrado reinvirtiendo todo el capital en cada operación
+        
+        El capital de cada trade depende de los costes de los anteriores. Para cada
+        asignación de regímenes (tarifa/mínimo/máximo y tramo mensual) la evolución del
+        capital es una recurrencia afín que se resuelve en bloque; se itera hasta que
+        los regímenes son coherentes con el capital resultante.
+        
+        Args:
+            entry_price: Precio de entrada de cada trade (sin slippage)
+            exit_price: Precio de salida de cada trade (sin slippage)
+            initial_capital: Capital antes del primer trade
+            entry_time: Timestamps de entrada (necesarios para el plan escalonado)
+            prior_volume: (mes, acciones) ya negociadas antes del primer trade, para
+                continuar un cálculo previo (ver monthly_volume)
+            max_iterations: Máximo de iteraciones del punto fijo
+        
+        Returns:
+            DataFrame con capital antes/después, acciones, comisiones, slippage y retornos
+        """
+        entry_price = np.asarray(entry_price, dtype=np.float64)
+        exit_price = np.asarray(exit_price, dtype=np.float64)
+        price_in = entry_price * (1 + self.slippage)
+        price_out = exit_price * (1 - self.slippage)
+        month = (np.zeros(len(entry_price), dtype=np.int64) if entry_time is None
+                 else _months(entry_time))
+        
+        if len(entry_price) == 0:
+            capital = np.array([float(initial_capital)])
+            shares = entry_commission = exit_commission = np.empty(0)
+        else:
+            capital = initial_capital * np.concatenate(([1.0], np.cumprod(price_out / price_in)))
+            previous = None
+            for _ in range(max_iterations):
+                regimes, entry_map, shares_map, value_map, exit_map = self._trade_maps(
+                    price_in, price_out, capital[:-1], month, prior_volume)
+                if previous is not None and np.array_equal(regimes, previous):
+                    break
+                previous = regimes
+                capital = _solve_affine_recurrence(value_map[0] - exit_map[0],
+                                                   value_map[1] - exit_map[1], float(initial_capital))
+            else:
+                logging.warning(f"CostModel.trade_costs: los regímenes de comisión no convergen tras "
+                                f"{max_iterations} iteraciones; se usa la última iteración")
+            
+            before = capital[:-1]
+            entry_commission = entry_map[0] * before + entry_map[1]
+            shares = shares_map[0] * before + shares_map[1]
+            exit_commission = exit_map[0] * before + exit_map[1]
+        
+        slippage_cost = shares * (price_in - entry_price) + shares * (exit_price - price_out)
+        return pd.DataFrame({
+            'capital_before': capital[:-1],
+            'shares': shares,
+            'entry_commission': entry_commission,
+            'exit_commission': exit_commission,
+            'commission': entry_commission + exit_commission,
+            'slippage_cost': slippage_cost,
+            'total_cost': entry_commission + exit_commission + slippage_cost,
+            'capital_after': capital[1:],
+            'gross_return': (exit_price - entry_price) / entry_price,
+            'net_return': capital[1:] / capital[:-1] - 1
+        })
+    
+    @staticmethod
+    def monthly_volume(entry_time, shares, prior_volume=None):
+        """
+        Acciones negociadas (compra + venta) en el mes del último trade
+        
+        Returns:
+            tuple: (mes como int64 de datetime64[M], acciones) o prior_volume si no hay trades
+        """
+        if len(shares) == 0:
+            return prior_volume
+        month = _months(entry_time)
+        last_month = month[-1]
+        volume = 2 * np.asarray(shares, dtype=np.float64)[month == last_month].sum()
+        if prior_volume is not None and prior_volume[0] == last_month:
+            volume += prior_volume[1]
+        return last_month, volume
+    
+    def entry_costs(self, capital: float, entry_price: float, monthly_volume: float = 0.0):
+        """
+        Comisión de entrada y acciones compradas para una posición que sigue abierta
+        
+        Returns:
+            tuple: (comisión, acciones)
+        """
+        price_in = np.array([entry_price * (1 + self.slippage)])
+        rate = self._share_rate(np.array([monthly_volume]))
+        candidates = self._entry_candidates(price_in, rate)
+        alpha, beta = _pick(candidates, _select(candidates, np.array([capital])))
+        commission = float(alpha[0] * capital + beta[0])
+        return commission, (capital - commission) / float(price_in[0])
@@ -0,0 +1,313 @@
+"""
+Índice de calidad de datos por partición: huecos, duplicados, cobertura de sesión y retornos atípicos
+
+Cada partición se analiza en una única pasada vectorizada y el resultado se guarda
+como un .npz en DATA_QUALITY_CONFIG['index_path'], que el etiquetado y las
+estrategias leen en lugar de recalcular. El índice se reconstruye solo si la
+partición de origen ha cambiado.
+"""
+import os
+import logging
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_CONFIG, DATA_QUALITY_CONFIG, SESSION_CONFIG
+from session_calendar import NS_PER_MINUTE, MINUTES_PER_DAY, to_minutes, timestamps_to_ns
+from partition_store import list_partitions
+
+# Bits de la máscara de calidad por vela
+FLAG_DUPLICATE = 1        # Mismo timestamp que la vela anterior
+FLAG_GAP = 2              # Separación con la vela anterior mayor que el tamaño de vela
+FLAG_INTRADAY_GAP = 4     # Hueco dentro del mismo día
+FLAG_ZERO_VOLUME = 8      # Volumen igual a cero
+FLAG_MISSING_VOLUME = 16  # Volumen ausente (NaN)
+FLAG_OUTLIER = 32         # Retorno intradía atípico respecto al resto de la partición
+
+_INDEX_VERSION = 1
+
+
+class QualityIndex:
+    """
+    Resultado del análisis de calidad de una partición
+
+    Las máscaras por vela están alineadas con las velas de la partición ordenadas
+    por timestamp; para otro subconjunto de velas se usa mask_for().
+
+    Atributos:
+        timestamps: int64 en ns de cada vela (ordenados)
+        gap_minutes: Minutos desde la vela anterior (0 en la primera)
+        flags: Máscara de bits FLAG_* por vela
+        days: Número de día (días desde epoch) de cada día con datos
+        day_bars: Velas por día
+        session_bars: Velas por día dentro de SESSION_CONFIG['market_hours']
+        expected_bars: Velas esperadas en el horario de mercado
+        n_unsorted: Pasos decrecientes en el orden original de la partición
+        source: Ruta y marca de modificación de la partición analizada
+    """
+
+    def __init__(self, timestamps, gap_minutes, flags, days, day_bars, session_bars,
+                 expected_bars: int, bar_minutes: int, n_unsorted: int = 0, source: dict = None):
+        self.timestamps = timestamps
+        self.gap_minutes = gap_minutes
+        self.flags = flags
+        self.days = days
+        self.day_bars = day_bars
+        self.session_bars = session_bars
+        self.expected_bars = int(expected_bars)
+        self.bar_minutes = int(bar_minutes)
+        self.n_unsorted = int(n_unsorted)
+        self.source = source or {}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _flag(self, bit: int) -> np.ndarray:
+        return (self.flags & bit) != 0
+
+    @property
+    def duplicate(self) -> np.ndarray:
+        return self._flag(FLAG_DUPLICATE)
+
+    @property
+    def gap_before(self) -> np.ndarray:
+        return self._flag(FLAG_GAP)
+
+    @property
+    def intraday_gap(self) -> np.ndarray:
+        return self._flag(FLAG_INTRADAY_GAP)
+
+    @property
+    def zero_volume(self) -> np.ndarray:
+        return self._flag(FLAG_ZERO_VOLUME)
+
+    @property
+    def outlier(self) -> np.ndarray:
+        return self._flag(FLAG_OUTLIER)
+
+    @property
+    def coverage(self) -> np.ndarray:
+        """
+        Fracción del horario de mercado cubierta por cada día
+        """
+        return self.session_bars / max(self.expected_bars, 1)
+
+    @property
+    def entry_blocked(self) -> np.ndarray:
+        """
+        Velas en las que no conviene abrir posición: tras un hueco intradía o con retorno atípico
+        """
+        return self._flag(FLAG_INTRADAY_GAP | FLAG_OUTLIER)
+
+    def mask_for(self, timestamps, mask: np.ndarray) -> np.ndarray:
+        """
+        Alinea una máscara del índice con otras velas de la partición (p. ej. ya filtradas)
+
+        Las velas que no están en el índice quedan a False.
+        """
+        timestamps = timestamps_to_ns(timestamps)
+        if len(self.timestamps) == 0:
+            return np.zeros(len(timestamps), dtype=bool)
+        pos = np.minimum(np.searchsorted(self.timestamps, timestamps), len(self.timestamps) - 1)
+        return (self.timestamps[pos] == timestamps) & np.asarray(mask, dtype=bool)[pos]
+
+    def summary(self) -> dict:
+        """
+        Resumen de la partición
+        """
+        n_days = len(self.days)
+        coverage = self.coverage
+        return {
+            'bars': len(self),
+            'days': n_days,
+            'unsorted': self.n_unsorted,
+            'duplicates': int(self.duplicate.sum()),
+            'intraday_gaps': int(self.intraday_gap.sum()),
+            'missing_minutes': int(self.gap_minutes[self.intraday_gap].sum()
+                                   - self.bar_minutes * self.intraday_gap.sum()),
+            'max_gap_minutes': int(self.gap_minutes[self.intraday_gap].max()) if self.intraday_gap.any() else 0,
+            'zero_volume': int(self.zero_volume.sum()),
+            'missing_volume': int(self._flag(FLAG_MISSING_VOLUME).sum()),
+            'outliers': int(self.outlier.sum()),
+            'mean_coverage': float(coverage.mean()) if n_days else 0.0,
+            'incomplete_days': int((coverage < DATA_QUALITY_CONFIG['min_coverage']).sum())
+        }
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(
+            path, version=_INDEX_VERSION, timestamps=self.timestamps, gap_minutes=self.gap_minutes,
+            flags=self.flags, days=self.days, day_bars=self.day_bars, session_bars=self.session_bars,
+            expected_bars=self.expected_bars, bar_minutes=self.bar_minutes, n_unsorted=self.n_unsorted,
+            source_path=str(self.source.get('path', '')),
+            source_mtime=float(self.source.get('mtime', 0.0)),
+            source_size=int(self.source.get('size', 0)))
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            if int(data['version']) != _INDEX_VERSION:
+                raise ValueError(f"Versión de índice no soportada en {path}")
+            return cls(data['timestamps'], data['gap_minutes'], data['flags'], data['days'],
+                       data['day_bars'], data['session_bars'], int(data['expected_bars']),
+                       int(data['bar_minutes']), int(data['n_unsorted']),
+                       {'path': str(data['source_path']), 'mtime': float(data['source_mtime']),
+                        'size': int(data['source_size'])})
+
+
+def gap_mask(timestamps, bar_minutes: int = None) -> np.ndarray:
+    """
+    Velas separadas de la anterior por más de bar_minutes (incluye el salto entre días)
+    """
+    timestamps = timestamps_to_ns(timestamps)
+    threshold = (bar_minutes or DATA_QUALITY_CONFIG['bar_minutes']) * NS_PER_MINUTE
+    return np.concatenate(([False], np.diff(timestamps) > threshold)) if len(timestamps) else np.zeros(0, bool)
+
+
+def scan_bars(timestamps, close, volume=None, bar_minutes: int = None,
+              outlier_threshold: float = None, session_config: dict = None) -> QualityIndex:
+    """
+    Analiza un conjunto de velas en una sola pasada vectorizada
+
+    Args:
+        timestamps: Timestamps de las velas (se ordenan si hace falta)
+        close: Precios de cierre
+        volume: Volumen (opcional)
+        bar_minutes: Tamaño nominal de vela en minutos
+        outlier_threshold: Umbral de |z robusto| (mediana/MAD) para retornos atípicos
+        session_config: Configuración de sesiones (horario de mercado para la cobertura)
+
+    Returns:
+        QualityIndex
+    """
+    bar_minutes = bar_minutes or DATA_QUALITY_CONFIG['bar_minutes']
+    outlier_threshold = outlier_threshold or DATA_QUALITY_CONFIG['outlier_threshold']
+    config = session_config or SESSION_CONFIG
+
+    timestamps = timestamps_to_ns(timestamps)
+    close = np.asarray(close, dtype=np.float64)
+    volume = np.full(len(close), np.nan) if volume is None else np.asarray(volume, dtype=np.float64)
+    n_unsorted = int(np.count_nonzero(np.diff(timestamps) < 0))
+    if n_unsorted:
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, close, volume = timestamps[order], close[order], volume[order]
+
+    n = len(timestamps)
+    minutes = timestamps // NS_PER_MINUTE
+    day_number = minutes // MINUTES_PER_DAY
+    gap_minutes = np.zeros(n, dtype=np.int32)
+    gap_minutes[1:] = np.diff(minutes)
+    same_day = np.zeros(n, dtype=bool)
+    same_day[1:] = day_number[1:] == day_number[:-1]
+
+    # Retornos intradía y z robusto (mediana / MAD) sobre toda la partición
+    previous = np.concatenate(([np.nan], close[:-1])) if n else close
+    valid = same_day & (gap_minutes > 0) & (close > 0) & (previous > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.where(valid, np.log(close / previous), 0.0)
+    outlier = np.zeros(n, dtype=bool)
+    if valid.any():
+        sample = returns[valid]
+        center = np.median(sample)
+        scale = 1.4826 * np.median(np.abs(sample - center)) or sample.std()
+        if scale > 0:
+            outlier = valid & (np.abs(returns - center) > outlier_threshold * scale)
+
+    duplicate = np.zeros(n, dtype=bool)
+    duplicate[1:] = gap_minutes[1:] == 0
+    gap = np.zeros(n, dtype=bool)
+    gap[1:] = gap_minutes[1:] > bar_minutes
+    flags = (duplicate * FLAG_DUPLICATE | gap * FLAG_GAP | (gap & same_day) * FLAG_INTRADAY_GAP
+             | (volume == 0) * FLAG_ZERO_VOLUME | np.isnan(volume) * FLAG_MISSING_VOLUME
+             | outlier * FLAG_OUTLIER).astype(np.uint8)
+
+    # Cobertura por día del horario de mercado (velas únicas dentro de la sesión)
+    market_start, market_end = (to_minutes(t) for t in config['market_hours'])
+    minute_of_day = minutes % MINUTES_PER_DAY
+    in_market = (minute_of_day >= market_start) & (minute_of_day < market_end) & ~duplicate
+    days, day_start = np.unique(day_number, return_index=True)
+    day_bars = np.diff(np.append(day_start, n))
+    session_bars = np.add.reduceat(in_market.astype(np.int64), day_start) if n else np.empty(0, np.int64)
+    expected_bars = (market_end - market_start) // bar_minutes
+
+    return QualityIndex(timestamps, gap_minutes, flags, days.astype(np.int64), day_bars.astype(np.int64),
+                        session_bars.astype(np.int64), expected_bars, bar_minutes, n_unsorted)
+
+
+def scan_frame(df: pd.DataFrame, **kwargs) -> QualityIndex:
+    """
+    Analiza un DataFrame de velas (timestamp, close y opcionalmente volume)
+    """
+    volume = df[DATA_CONFIG['volume_column']] if DATA_CONFIG['volume_column'] in df.columns else None
+    return scan_bars(df[DATA_CONFIG['timestamp_column']], df[DATA_CONFIG['price_column']], volume, **kwargs)
+
+
+def index_path(year: int, dataset: str = 'raw', symbol: str = None) -> str:
+    symbol = symbol or DATA_CONFIG['symbol']
+    return os.path.join(DATA_QUALITY_CONFIG['index_path'], symbol, f'{year}_{dataset}_quality.npz')
+
+
+def _source_stamp(path: str) -> dict:
+    stat = os.stat(path)
+    return {'path': path, 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+
+def scan_partition(path: str) -> QualityIndex:
+    """
+    Analiza una partición CSV leyendo solo timestamp, close y volume
+    """
+    columns = (DATA_CONFIG['timestamp_column'], DATA_CONFIG['price_column'], DATA_CONFIG['volume_column'])
+    df = pd.read_csv(path, usecols=lambda c: c in columns)
+    index = scan_frame(df)
+    index.source = _source_stamp(path)
+    return index
+
+
+def load_quality_index(year: int, dataset: str = 'raw', symbol: str = None,
+                       rebuild: bool = False) -> QualityIndex:
+    """
+    Índice de calidad de una partición; se construye y guarda si no existe o la partición cambió
+    """
+    partitions = dict(list_partitions(dataset, symbol, years=[year]))
+    if year not in partitions:
+        raise FileNotFoundError(f"No hay partición {dataset} para {year}")
+    source = _source_stamp(partitions[year])
+    path = index_path(year, dataset, symbol)
+
+    if not rebuild and os.path.exists(path):
+        try:
+            index = QualityIndex.load(path)
+            if (index.source.get('mtime') == source['mtime'] and index.source.get('size') == source['size']):
+                return index
+        except (ValueError, KeyError, OSError):
+            logging.warning(f'Índice de calidad ilegible en {path}, se reconstruye')
+
+    index = scan_partition(partitions[year])
+    index.save(path)
+    return index
+
+
+def build_quality_index(dataset: str = 'raw', symbol: str = None, years=None,
+                        rebuild: bool = False) -> dict:
+    """
+    Construye (o carga) el índice de calidad de todas las particiones
+
+    Returns:
+        dict: {año: QualityIndex}
+    """
+    return {year: load_quality_index(year, dataset, symbol, rebuild)
+            for year, _ in list_partitions(dataset, symbol, years)}
+
+
+def quality_report(indexes: dict) -> pd.DataFrame:
+    """
+    Tabla resumen por año a partir de los índices de calidad
+    """
+    rows = {year: index.summary() for year, index in sorted(indexes.items())}
+    return pd.DataFrame.from_dict(rows, orient='index').rename_axis('year')
+
+
+if __name__ == '__main__':
+    report = quality_report(build_quality_index())
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(report)
@@ -0,0 +1,316 @@
+"""
+Matriz de features discretizadas y empaquetadas en bits
+
+Las señales ±1 de utils.discretize_features (MACD, SMA, EMA, MOM y RSI) y otras
+features discretas (hueco antes de la vela, tramo de volumen relativo y tramo de
+la hora del día) se calculan con operaciones vectorizadas y se guardan juntas en
+una palabra entera por vela: cada feature ocupa un campo de pocos bits
+(1 bit para una señal ±1, 3 bits para el tramo de volumen...), así que una vela
+ocupa 2 bytes en lugar de un int64 por columna.
+
+Las matrices se guardan junto a las features (labelled_data/<año>_features.npz)
+con la etiqueta de cada vela, y load_training_set devuelve directamente el float32
+contiguo que los árboles de sklearn usan sin copiarlo, de modo que el entrenamiento
+con todos los años cabe holgadamente en memoria.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import DISCRETIZATION_CONFIG, SESSION_CONFIG
+from data_quality import gap_mask
+from partition_store import list_partitions, partition_dir
+from session_calendar import MINUTES_PER_DAY, NS_PER_MINUTE, session_mask, timestamps_to_ns
+
+_MATRIX_VERSION = 1
+
+# Etiquetas de 'buy-sl' usadas en el entrenamiento (el resto se descarta, como en model_training)
+LABEL_CODES = {'Buy': 1, 'Sell': 0}
+
+
+def _sign(condition) -> np.ndarray:
+    return np.where(condition, 1, -1).astype(np.int8)
+
+
+def rsi_signal(rsi, bounds=None) -> np.ndarray:
+    """
+    Versión vectorizada de utils.transform_rsi_optimized
+
+    +1 por debajo del límite inferior, -1 por encima del superior y, entre ambos, el
+    signo de la variación respecto a la vela anterior. Las velas sin RSI quedan a 0.
+    """
+    lower, upper = bounds or DISCRETIZATION_CONFIG['rsi_bounds']
+    rsi = np.asarray(rsi, dtype=np.float64)
+    rising = np.concatenate(([False], np.diff(rsi) > 0))
+    signal = np.where(rsi > upper, -1, np.where(rsi < lower, 1, np.where(rising, 1, -1)))
+    return np.where(np.isnan(rsi), 0, signal).astype(np.int8)
+
+
+def sign_signals(df: pd.DataFrame) -> dict:
+    """
+    Señales ±1 de utils.discretize_features para las columnas disponibles
+
+    Returns:
+        dict: {columna: array int8}
+    """
+    signals = {}
+    if 'MACD' in df.columns:
+        signals['MACD'] = _sign(np.diff(df['MACD'].to_numpy(dtype=np.float64), prepend=np.nan) > 0)
+    close = df['close'].to_numpy(dtype=np.float64)
+    for column in ('SMA', 'EMA'):
+        if column in df.columns:
+            signals[column] = _sign(close > df[column].to_numpy(dtype=np.float64))
+    if 'MOM' in df.columns:
+        signals['MOM'] = _sign(df['MOM'].to_numpy(dtype=np.float64) > 0)
+    if 'RSI' in df.columns:
+        signals['RSI'] = rsi_signal(df['RSI'])
+    return signals
+
+
+def volume_ratio_code(volume, window: int = None, edges=None) -> np.ndarray:
+    """
+    Tramo del volumen frente a su media móvil: 0 sin dato, 1 por debajo del primer límite, ...
+    """
+    window = window or DISCRETIZATION_CONFIG['volume_window']
+    edges = np.asarray(edges or DISCRETIZATION_CONFIG['volume_ratio_buckets'], dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    volume_ma = pd.Series(volume).rolling(window, min_periods=window).mean().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = volume / volume_ma
+    codes = np.searchsorted(edges, ratio, side='right') + 1
+    return np.where(np.isfinite(ratio), codes, 0).astype(np.uint8)
+
+
+def time_of_day_code(timestamps, bucket_minutes: int = None) -> np.ndarray:
+    """
+    Tramo de la hora del día (minuto del día // bucket_minutes)
+    """
+    bucket_minutes = bucket_minutes or DISCRETIZATION_CONFIG['time_bucket_minutes']
+    minute_of_day = (timestamps_to_ns(timestamps) // NS_PER_MINUTE) % MINUTES_PER_DAY
+    return (minute_of_day // bucket_minutes).astype(np.uint8)
+
+
+def _width(levels: int) -> int:
+    return max(int(levels - 1).bit_length(), 1)
+
+
+class FeatureMatrix:
+    """
+    Features discretas de una serie de velas empaquetadas en una palabra entera por vela
+
+    Atributos:
+        timestamps: int64 (ns) de cada vela
+        codes: Palabra por vela (uint8/16/32/64 según el total de bits)
+        fields: Lista de (nombre, desplazamiento, bits, paso, base); el valor de la
+            feature es ((codes >> desplazamiento) & máscara) * paso + base
+        labels: Etiqueta por vela (1 'Buy', 0 'Sell', -1 descartada) o None
+    """
+
+    def __init__(self, timestamps, codes, fields, labels=None):
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.codes = np.asarray(codes)
+        self.fields = [tuple(field) for field in fields]
+        self.labels = None if labels is None else np.asarray(labels, dtype=np.int8)
+
+    @classmethod
+    def from_columns(cls, timestamps, columns: dict, labels=None) -> 'FeatureMatrix':
+        """
+        Empaqueta columnas discretas
+
+        Args:
+            columns: {nombre: (valores enteros, niveles, paso, base)}; el código guardado es
+                (valor - base) / paso y debe estar en [0, niveles)
+        """
+        fields, offset = [], 0
+        for name, (_, levels, step, base) in columns.items():
+            width = _width(levels)
+            fields.append((name, offset, width, step, base))
+            offset += width
+        if offset > 64:
+            raise ValueError(f"Las features ocupan {offset} bits; el máximo es 64")
+        dtype = next(dtype for dtype in (np.uint8, np.uint16, np.uint32, np.uint64)
+                     if offset <= np.dtype(dtype).itemsize * 8)
+        codes = np.zeros(len(timestamps), dtype=dtype)
+        for (name, field_offset, _, step, base), (values, *_) in zip(fields, columns.values()):
+            code = ((np.asarray(values, dtype=np.int64) - base) // step).astype(dtype)
+            codes |= code << dtype(field_offset)
+        return cls(timestamps_to_ns(timestamps), codes, fields, labels)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def names(self) -> list:
+        return [field[0] for field in self.fields]
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.codes.nbytes + (0 if self.labels is None else self.labels.nbytes)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Valores (int8) de una feature
+        """
+        for field_name, offset, width, step, base in self.fields:
+            if field_name == name:
+                code = (self.codes >> self.codes.dtype.type(offset)) & self.codes.dtype.type((1 << width) - 1)
+                return (code.astype(np.int8) * np.int8(step) + np.int8(base)).astype(np.int8)
+        raise KeyError(f"Feature no disponible: {name}. Opciones: {self.names}")
+
+    def to_array(self, columns=None, dtype=np.int8) -> np.ndarray:
+        """
+        Matriz densa (velas, features) en C-contiguo; con dtype=np.float32 es la entrada
+        que los árboles de sklearn usan sin copia
+        """
+        columns = columns or self.names
+        array = np.empty((len(self), len(columns)), dtype=dtype)
+        for j, name in enumerate(columns):
+            array[:, j] = self.column(name)
+        return array
+
+    def to_frame(self, columns=None) -> pd.DataFrame:
+        columns = columns or self.names
+        return pd.DataFrame(self.to_array(columns), columns=columns,
+                            index=pd.DatetimeIndex(self.timestamps.view('datetime64[ns]'), name='timestamp'))
+
+    def take(self, rows) -> 'FeatureMatrix':
+        return FeatureMatrix(self.timestamps[rows], self.codes[rows], self.fields,
+                             None if self.labels is None else self.labels[rows])
+
+    @classmethod
+    def concat(cls, matrices: list) -> 'FeatureMatrix':
+        """
+        Une matrices con los mismos campos (p. ej. varios años)
+        """
+        fields = matrices[0].fields
+        if any(matrix.fields != fields for matrix in matrices[1:]):
+            raise ValueError("Las matrices tienen campos distintos; no se pueden concatenar")
+        labels = None if any(matrix.labels is None for matrix in matrices) else \
+            np.concatenate([matrix.labels for matrix in matrices])
+        return cls(np.concatenate([matrix.timestamps for matrix in matrices]),
+                   np.concatenate([matrix.codes for matrix in matrices]), fields, labels)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        arrays = {} if self.labels is None else {'labels': self.labels}
+        np.savez_compressed(path, version=_MATRIX_VERSION, timestamps=self.timestamps, codes=self.codes,
+                            names=np.array(self.names), layout=np.array([field[1:] for field in self.fields]),
+                            **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'FeatureMatrix':
+        with np.load(path) as data:
+            if int(data['version']) != _MATRIX_VERSION:
+                raise ValueError(f"Versión de la matriz de features no soportada en {path}")
+            fields = [(str(name), *map(int, layout)) for name, layout in zip(data['names'], data['layout'])]
+            labels = data['labels'] if 'labels' in data.files else None
+            return cls(data['timestamps'], data['codes'], fields, labels)
+
+
+def build_feature_matrix(df: pd.DataFrame) -> FeatureMatrix:
+    """
+    Discretiza y empaqueta las features de un DataFrame de velas con indicadores
+
+    Incluye las señales ±1 de las columnas disponibles (MACD, SMA, EMA, MOM, RSI), el
+    hueco antes de la vela, el tramo de volumen relativo (si hay volumen) y el tramo de
+    la hora del día; si hay columna 'buy-sl' se guarda como etiqueta.
+    """
+    df = df.rename(columns={'rsi': 'RSI'})
+    timestamps = timestamps_to_ns(df['timestamp'])
+    columns = {}
+    for name, values in sign_signals(df).items():
+        # RSI admite 0 (sin dato): tres niveles a partir de -1; el resto, dos niveles con paso 2
+        columns[name] = (values, 3, 1, -1) if name == 'RSI' else (values, 2, 2, -1)
+    columns['gap'] = (gap_mask(timestamps), 2, 1, 0)
+    if 'volume' in df.columns:
+        columns['volume_ratio'] = (volume_ratio_code(df['volume']),
+                                   len(DISCRETIZATION_CONFIG['volume_ratio_buckets']) + 2, 1, 0)
+    columns['time_of_day'] = (time_of_day_code(timestamps),
+                              -(-MINUTES_PER_DAY // DISCRETIZATION_CONFIG['time_bucket_minutes']), 1, 0)
+    labels = None
+    if 'buy-sl' in df.columns:
+        labels = df['buy-sl'].map(LABEL_CODES).fillna(-1).to_numpy(dtype=np.int8)
+    return FeatureMatrix.from_columns(timestamps, columns, labels)
+
+
+def feature_matrix_path(year: int, symbol: str = None) -> str:
+    return os.path.join(partition_dir('labelled', symbol), f'{year}_features.npz')
+
+
+def build_partition_matrix(year: int, symbol: str = None) -> FeatureMatrix:
+    """
+    Construye y guarda la matriz de features de una partición etiquetada
+    """
+    partitions = dict(list_partitions('labelled', symbol, years=[year]))
+    if year not in partitions:
+        raise FileNotFoundError(f"No hay partición etiquetada para {year}")
+    df = pd.read_csv(partitions[year], usecols=lambda c: c in (
+        'timestamp', 'close', 'volume', 'RSI', 'rsi', 'MACD', 'EMA', 'SMA', 'MOM', 'buy-sl'))
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    matrix = build_feature_matrix(df)
+    matrix.save(feature_matrix_path(year, symbol))
+    logging.info(f'{year}: {len(matrix)} velas, features {matrix.names} en {matrix.codes.dtype.itemsize} bytes/vela')
+    return matrix
+
+
+def build_feature_matrices(years=None, symbol: str = None) -> dict:
+    """
+    Matrices de todas las particiones etiquetadas (o las de years)
+
+    Returns:
+        dict: {año: FeatureMatrix}
+    """
+    return {year: build_partition_matrix(year, symbol) for year, _ in list_partitions('labelled', symbol, years)}
+
+
+def load_feature_matrix(year: int, symbol: str = None) -> FeatureMatrix:
+    path = feature_matrix_path(year, symbol)
+    return FeatureMatrix.load(path) if os.path.exists(path) else build_partition_matrix(year, symbol)
+
+
+def load_training_set(years=None, symbol: str = None, columns=None, dtype=np.float32) -> tuple:
+    """
+    Matriz de entrenamiento de todas las particiones (o las de years)
+
+    Como model_training, solo se usan las velas en horario de mercado con etiqueta
+    'Buy' o 'Sell'. Solo se usan los campos comunes a todos los años.
+
+    Returns:
+        tuple: (X denso en dtype, y bool, nombres de las columnas)
+    """
+    matrices = [load_feature_matrix(year, symbol) for year, _ in list_partitions('labelled', symbol, years)]
+    if not matrices:
+        raise FileNotFoundError("No hay particiones etiquetadas")
+    common = [name for name in matrices[0].names if all(name in matrix.names for matrix in matrices)]
+    columns = columns or common
+    blocks, labels = [], []
+    for matrix in matrices:
+        keep = session_mask(matrix.timestamps, *SESSION_CONFIG['market_hours']) & (matrix.labels >= 0)
+        subset = matrix.take(keep)
+        blocks.append(subset.to_array(columns, dtype))
+        labels.append(subset.labels == 1)
+    return np.concatenate(blocks), np.concatenate(labels), columns
+
+
+if __name__ == '__main__':
+    from sklearn.base import clone
+
+    from ml_training import models
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+
+    matrices = build_feature_matrices()
+    packed = sum(matrix.codes.nbytes for matrix in matrices.values())
+    unpacked = sum(len(matrix) * len(matrix.names) * 8 for matrix in matrices.values())
+    print(f"🧮 {sum(map(len, matrices.values()))} velas: {packed / 1e6:.2f} MB empaquetadas "
+          f"frente a {unpacked / 1e6:.2f} MB en columnas int64")
+    X, y, columns = load_training_set()
+    model = clone(models['RandomForest']).fit(X, y)
+    print(f"🌲 RandomForest entrenado con {len(y)} velas y features {columns}")
+    for feature, importance in zip(columns, model.feature_importances_):
+        print(f"   • {feature}: {importance:.2f}")
@@ -0,0 +1,226 @@
+"""
+Entrenamiento incremental (out-of-core) sobre todo el histórico etiquetado
+
+Las features y etiquetas se leen del partition store en bloques; el escalado se
+ajusta con partial_fit en una primera pasada y el modelo se entrena bloque a bloque:
+    - modelos con partial_fit (SGD, Naive Bayes): se actualizan con cada bloque,
+    - HistGradientBoosting: cada bloque se discretiza a uint8 (255 bins fijos sobre
+      las features escaladas) y el modelo se ajusta sobre la matriz binaria compacta.
+
+El estado (modelo, escalado, última vela vista) se guarda en un checkpoint, de modo
+que los meses nuevos se añaden sin releer el histórico: el escalado queda fijo y solo
+se leen las velas posteriores a la última del checkpoint. Los modelos con partial_fit
+solo ven esas velas; HistGradientBoosting no es incremental de verdad: el checkpoint
+guarda la matriz binaria de todo el histórico y el modelo se reajusta desde cero sobre
+ella (con warm_start, sklearn recalcula sus bins en cada fit y los árboles ya
+ajustados pasarían a apuntar a otros bins).
+"""
+import logging
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+from config import INCREMENTAL_TRAINING_CONFIG, SESSION_CONFIG
+from partition_store import iter_partition_chunks, list_partitions
+from session_calendar import session_mask, timestamps_to_ns
+from ml_training import mapping_dict, model_score
+
+# Mismas features y escalado que ml_training.model_training
+FEATURES = ['RSI', 'MACD', 'EMA', 'MOM']
+MINMAX_FEATURES = ['RSI']
+STANDARD_FEATURES = ['MACD', 'EMA', 'MOM']
+
+# Modelos con entrenamiento incremental
+INCREMENTAL_MODELS = {
+    'SGD': lambda: SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42),
+    'NaiveBayes': lambda: GaussianNB(),
+    'HistGradientBoosting': lambda: HistGradientBoostingClassifier(
+        max_iter=INCREMENTAL_TRAINING_CONFIG['boosting_iterations'], learning_rate=0.1, max_depth=3,
+        early_stopping=False, random_state=42)
+}
+_CLASSES = np.array([False, True])
+
+
+class IncrementalScaler:
+    """
+    Equivalente incremental del ColumnTransformer de model_training (MinMax para RSI, estándar para el resto)
+    """
+
+    def __init__(self):
+        self.minmax = MinMaxScaler()
+        self.standard = StandardScaler()
+
+    def partial_fit(self, features: pd.DataFrame) -> 'IncrementalScaler':
+        self.minmax.partial_fit(features[MINMAX_FEATURES])
+        self.standard.partial_fit(features[STANDARD_FEATURES])
+        return self
+
+    def transform(self, features: pd.DataFrame) -> np.ndarray:
+        return np.hstack([self.minmax.transform(features[MINMAX_FEATURES]),
+                          self.standard.transform(features[STANDARD_FEATURES])])
+
+
+def bin_features(scaled: np.ndarray) -> np.ndarray:
+    """
+    Discretiza las features escaladas a uint8 con bins fijos (independientes de los datos vistos)
+
+    RSI (MinMax) se reparte en [0, 1] y el resto (estándar) en [-4, 4] desviaciones.
+    """
+    n_bins = 255
+    edges = [np.linspace(0.0, 1.0, n_bins - 1)] * len(MINMAX_FEATURES) + \
+            [np.linspace(-4.0, 4.0, n_bins - 1)] * len(STANDARD_FEATURES)
+    binned = np.empty(scaled.shape, dtype=np.uint8)
+    for j, column_edges in enumerate(edges):
+        binned[:, j] = np.searchsorted(column_edges, scaled[:, j])
+    return binned
+
+
+def iter_training_chunks(years=None, symbol: str = None, target: tuple = None, chunksize: int = None,
+                         after_ns: int = None):
+    """
+    Bloques (features, etiqueta, timestamps) de las particiones etiquetadas en orden temporal
+
+    Args:
+        years: Años a leer (por defecto, todas las particiones etiquetadas)
+        symbol: Símbolo (por defecto DATA_CONFIG['symbol'])
+        target: (profit, stop_loss, horizonte) de la rejilla de label_grid; None usa la columna 'buy-sl'
+        chunksize: Filas por bloque (por defecto DATA_CONFIG['chunk_size'])
+        after_ns: Solo velas posteriores a este instante (int64 ns)
+
+    Yields:
+        tuple: (DataFrame de features, array bool de etiquetas, timestamps int64 ns)
+    """
+    columns = ['timestamp', *FEATURES] + ([] if target is not None else ['buy-sl'])
+    for year, path in list_partitions('labelled', symbol, years):
+        labels = None
+        if target is not None:
+            from label_grid import load_labels
+            labels = load_labels(year, symbol)
+        for chunk in iter_partition_chunks([path], chunksize, columns):
+            # Mismo filtro que model_training: solo horario de mercado
+            chunk = chunk[session_mask(chunk['timestamp'], *SESSION_CONFIG['market_hours'])]
+            chunk = chunk.dropna(subset=FEATURES)
+            if target is None:
+                chunk = chunk[chunk['buy-sl'].isin(['Buy', 'Sell'])]
+            timestamps = timestamps_to_ns(chunk['timestamp'])
+            if after_ns is not None:
+                keep = timestamps > after_ns
+                chunk, timestamps = chunk[keep], timestamps[keep]
+            if len(chunk) == 0:
+                continue
+            if target is None:
+                y = chunk['buy-sl'].map(mapping_dict).to_numpy(dtype=bool)
+            else:
+                y = labels.align(timestamps).target(*target)
+            yield chunk[FEATURES], y, timestamps
+
+
+def checkpoint_path(model_type: str) -> str:
+    return os.path.join(INCREMENTAL_TRAINING_CONFIG['models_path'], f'{model_type}_incremental.pkl')
+
+
+def _save_checkpoint(state: dict, path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    joblib.dump(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def train_incremental(model_type: str = 'SGD', years=None, symbol: str = None, target: tuple = None,
+                      path: str = None, resume: bool = True, chunksize: int = None) -> dict:
+    """
+    Entrena (o continúa entrenando) un modelo sobre las particiones etiquetadas sin cargarlas enteras
+
+    Args:
+        model_type: Modelo de INCREMENTAL_MODELS
+        years: Años a usar (por defecto, todos)
+        symbol: Símbolo (por defecto DATA_CONFIG['symbol'])
+        target: Combinación (profit, stop_loss, horizonte) de label_grid; None usa 'buy-sl'
+        path: Checkpoint (por defecto trained_models/<modelo>_incremental.pkl)
+        resume: Si hay checkpoint, añade solo las velas posteriores a la última vista
+        chunksize: Filas por bloque
+
+    Returns:
+        dict: Estado del checkpoint (model, scaler, target, rows, last_timestamp, ...)
+    """
+    if model_type not in INCREMENTAL_MODELS:
+        raise ValueError(f"Modelo sin entrenamiento incremental: {model_type}. "
+                         f"Opciones: {list(INCREMENTAL_MODELS)}")
+    path = path or checkpoint_path(model_type)
+
+    if resume and os.path.exists(path):
+        state = joblib.load(path)
+        if state['model_type'] != model_type:
+            raise ValueError(f"El checkpoint {path} es de {state['model_type']}, no de {model_type}")
+        target = state['target']
+        logging.info(f"Reanudando {model_type} desde {pd.Timestamp(state['last_timestamp'])} "
+                     f"({state['rows']} velas ya vistas)")
+    else:
+        # Primera pasada: solo el escalado
+        scaler = IncrementalScaler()
+        for features, _, _ in iter_training_chunks(years, symbol, target, chunksize):
+            scaler.partial_fit(features)
+        state = {'model_type': model_type, 'model': INCREMENTAL_MODELS[model_type](), 'scaler': scaler,
+                 'target': target, 'rows': 0, 'positives': 0, 'last_timestamp': None,
+                 'binned': np.empty((0, len(FEATURES)), np.uint8), 'labels': np.empty(0, bool)}
+
+    model, scaler = state['model'], state['scaler']
+    boosting = isinstance(model, HistGradientBoostingClassifier)
+    new_rows = 0
+    for features, y, timestamps in iter_training_chunks(years, symbol, target, chunksize,
+                                                        state['last_timestamp']):
+        scaled = scaler.transform(features)
+        if boosting:
+            # El boosting se ajusta al final sobre la matriz binaria compacta
+            state['binned'] = np.concatenate([state['binned'], bin_features(scaled)])
+            state['labels'] = np.concatenate([state['labels'], y])
+        else:
+            model.partial_fit(scaled, y, classes=_CLASSES)
+        new_rows += len(y)
+        state['positives'] += int(y.sum())
+        state['last_timestamp'] = int(timestamps[-1])
+
+    if new_rows == 0:
+        logging.info(f'{model_type}: sin velas nuevas')
+        return state
+    if boosting:
+        # Reajuste completo sobre el histórico binario ampliado (ver docstring del módulo)
+        state['model'] = model = INCREMENTAL_MODELS[model_type]()
+        model.fit(state['binned'], state['labels'])
+    state['rows'] += new_rows
+    _save_checkpoint(state, path)
+    logging.info(f"{model_type}: {new_rows} velas nuevas, {state['rows']} en total; checkpoint en {path}")
+    return state
+
+
+def evaluate_incremental(state: dict, years=None, symbol: str = None, chunksize: int = None) -> pd.DataFrame:
+    """
+    Métricas de model_score del modelo de un checkpoint sobre los años indicados (leídos por bloques)
+    """
+    model, scaler = state['model'], state['scaler']
+    boosting = isinstance(model, HistGradientBoostingClassifier)
+    y_true, y_pred = [], []
+    for features, y, _ in iter_training_chunks(years, symbol, state['target'], chunksize):
+        scaled = scaler.transform(features)
+        y_pred.append(model.predict(bin_features(scaled) if boosting else scaled))
+        y_true.append(y)
+    return model_score(np.concatenate(y_true), np.concatenate(y_pred).astype(bool))
+
+
+if __name__ == '__main__':
+    import sys
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+
+    model_type = sys.argv[1] if len(sys.argv) > 1 else 'SGD'
+    state = train_incremental(model_type)
+    print(evaluate_incremental(state))
@@ -0,0 +1,242 @@
+"""
+Etiquetado por lotes para una rejilla de objetivos (take profit, stop loss, horizonte)
+
+Calcula en una sola pasada sobre cada partición las etiquetas de slprofit_strategy
+para todas las combinaciones de la rejilla: el recorrido hacia delante de los
+retornos se hace una vez y, para cada umbral distinto, se guarda el primer
+desplazamiento en que se alcanza. Cada combinación se resuelve después comparando
+esos primeros cruces con su horizonte, sin volver a recorrer las ventanas.
+
+Las etiquetas se guardan junto a las features (labelled_data/<año>_labels.npz) como
+una matriz de bits (una columna por combinación) y los desplazamientos de salida,
+de modo que ml_training puede comparar objetivos sin reetiquetar.
+"""
+import itertools
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_CONFIG, LABEL_GRID_CONFIG
+from bars import Bars
+from data_quality import load_quality_index
+from partition_store import list_partitions, partition_dir
+
+_LABELS_VERSION = 1
+
+
+def default_grid() -> np.ndarray:
+    """
+    Producto cartesiano de los valores de LABEL_GRID_CONFIG como filas (profit, stop_loss, horizonte)
+    """
+    return np.array(list(itertools.product(LABEL_GRID_CONFIG['profits'], LABEL_GRID_CONFIG['stop_losses'],
+                                           LABEL_GRID_CONFIG['horizons'])), dtype=np.float64)
+
+
+def config_name(profit: float, stop_loss: float, horizon: int) -> str:
+    return f'tp{profit:g}_sl{stop_loss:g}_h{int(horizon)}'
+
+
+def first_passages(close: np.ndarray, profits: np.ndarray, stop_losses: np.ndarray, max_offset: int):
+    """
+    Primer desplazamiento (1..max_offset) en que el retorno desde cada vela alcanza cada umbral
+
+    Returns:
+        tuple: (up (n_profits, n), down (n_stops, n)); max_offset + 1 si no se alcanza
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    never = max_offset + 1
+    up = np.full((len(profits), n), never, dtype=np.int32)
+    down = np.full((len(stop_losses), n), never, dtype=np.int32)
+    for k in range(1, min(max_offset, n - 1) + 1):
+        # Retorno de la vela i a la vela i + k, compartido por todos los umbrales
+        ret = (close[k:] - close[:-k]) / close[:-k]
+        for row, profit in zip(up, profits):
+            head = row[:n - k]
+            head[(head == never) & (ret >= profit)] = k
+        for row, stop_loss in zip(down, stop_losses):
+            head = row[:n - k]
+            head[(head == never) & (ret <= stop_loss)] = k
+    return up, down
+
+
+def label_grid(close: np.ndarray, gap_before: np.ndarray, grid) -> tuple:
+    """
+    Etiquetas de slprofit_strategy para cada combinación de la rejilla
+
+    Una vela es 'Buy' si dentro de su horizonte el take profit se alcanza antes que el
+    stop loss y no hay un hueco justo antes de la vela en que se alcanza.
+
+    Args:
+        close: Precios de cierre
+        gap_before: Máscara de huecos (data_quality.gap_mask) alineada con close
+        grid: Filas (profit, stop_loss, horizonte); el horizonte es el `range` de slprofit_strategy
+
+    Returns:
+        tuple: (buy (n, C) bool, exit_offset (n, C) uint16 con el índice devuelto por slprofit_strategy)
+    """
+    grid = np.asarray(grid, dtype=np.float64).reshape(-1, 3)
+    close = np.asarray(close, dtype=np.float64)
+    gap_before = np.asarray(gap_before, dtype=bool)
+    n = len(close)
+    profits, stop_losses = np.unique(grid[:, 0]), np.unique(grid[:, 1])
+    max_horizon = int(grid[:, 2].max()) if len(grid) else 1
+    up, down = first_passages(close, profits, stop_losses, max_horizon - 1)
+
+    positions = np.arange(n)
+    buy = np.zeros((n, len(grid)), dtype=bool)
+    exit_offset = np.zeros((n, len(grid)), dtype=np.uint16)
+    for c, (profit, stop_loss, horizon) in enumerate(grid):
+        horizon = int(horizon)
+        never = max_horizon
+        u = up[np.searchsorted(profits, profit)]
+        d = down[np.searchsorted(stop_losses, stop_loss)]
+        u = np.where(u <= horizon - 1, u, never)
+        d = np.where(d <= horizon - 1, d, never)
+        first = np.minimum(u, d)
+        hit = first < never
+        gap_at_hit = gap_before[np.minimum(positions + u, n - 1)]
+        buy[:, c] = hit & (u < d) & ~gap_at_hit
+        # Sin cruce, slprofit_strategy devuelve el último índice de la ventana (o su longitud si está vacía)
+        window = np.minimum(horizon, n - positions)
+        exit_offset[:, c] = np.where(hit, first - 1, np.where(window > 1, window - 2, window))
+    return buy, exit_offset
+
+
+class LabelMatrix:
+    """
+    Etiquetas de una rejilla de objetivos para las velas de una partición
+
+    Atributos:
+        timestamps: int64 (ns) de cada vela
+        grid: Filas (profit, stop_loss, horizonte) de cada columna
+        buy_bits: Etiquetas 'Buy' empaquetadas en bits (n, ceil(C / 8))
+        exit_offset: Índice de salida de slprofit_strategy por vela y combinación (uint16)
+    """
+
+    def __init__(self, timestamps, grid, buy_bits, exit_offset):
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.grid = np.asarray(grid, dtype=np.float64).reshape(-1, 3)
+        self.buy_bits = np.asarray(buy_bits, dtype=np.uint8)
+        self.exit_offset = np.asarray(exit_offset, dtype=np.uint16)
+
+    @classmethod
+    def from_labels(cls, timestamps, grid, buy, exit_offset):
+        return cls(timestamps, grid, np.packbits(np.asarray(buy, dtype=bool), axis=1), exit_offset)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def names(self) -> list:
+        return [config_name(*row) for row in self.grid]
+
+    @property
+    def buy(self) -> np.ndarray:
+        return np.unpackbits(self.buy_bits, axis=1, count=len(self.grid)).astype(bool)
+
+    def column(self, profit: float, stop_loss: float, horizon: int) -> int:
+        matches = np.flatnonzero(np.all(np.isclose(self.grid, [profit, stop_loss, horizon]), axis=1))
+        if len(matches) == 0:
+            raise KeyError(f"Combinación no calculada: {config_name(profit, stop_loss, horizon)}")
+        return int(matches[0])
+
+    def target(self, profit: float, stop_loss: float, horizon: int) -> np.ndarray:
+        """
+        Etiqueta booleana ('Buy' = True) de una combinación
+        """
+        c = self.column(profit, stop_loss, horizon)
+        return np.unpackbits(self.buy_bits[:, c // 8:c // 8 + 1], axis=1)[:, c % 8].astype(bool)
+
+    def labels(self, profit: float, stop_loss: float, horizon: int) -> pd.DataFrame:
+        """
+        Columnas 'buy-sl' y 'selling-time' en el formato de slprofit_strategy
+        """
+        c = self.column(profit, stop_loss, horizon)
+        return pd.DataFrame({'buy-sl': np.where(self.target(profit, stop_loss, horizon), 'Buy', 'Sell'),
+                             'selling-time': self.exit_offset[:, c].astype(np.int64)})
+
+    def align(self, timestamps) -> 'LabelMatrix':
+        """
+        Filas correspondientes a los timestamps dados (p. ej. las velas que quedan tras el dropna de las features)
+        """
+        from session_calendar import timestamps_to_ns
+
+        timestamps = timestamps_to_ns(timestamps)
+        rows = np.searchsorted(self.timestamps, timestamps)
+        rows = np.minimum(rows, len(self.timestamps) - 1)
+        if len(timestamps) and (len(self.timestamps) == 0 or np.any(self.timestamps[rows] != timestamps)):
+            raise KeyError("Hay velas sin etiquetas en la matriz; regenera la rejilla de la partición")
+        return LabelMatrix(timestamps, self.grid, self.buy_bits[rows], self.exit_offset[rows])
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Una columna booleana por combinación, indexada por timestamp
+        """
+        return pd.DataFrame(self.buy, columns=self.names,
+                            index=pd.DatetimeIndex(self.timestamps.view('datetime64[ns]'), name='timestamp'))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(path, version=_LABELS_VERSION, timestamps=self.timestamps, grid=self.grid,
+                            buy_bits=self.buy_bits, exit_offset=self.exit_offset)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            if int(data['version']) != _LABELS_VERSION:
+                raise ValueError(f"Versión de etiquetas no soportada en {path}")
+            return cls(data['timestamps'], data['grid'], data['buy_bits'], data['exit_offset'])
+
+
+def labels_path(year: int, symbol: str = None) -> str:
+    return os.path.join(partition_dir('labelled', symbol), f'{year}_labels.npz')
+
+
+def label_partition(year: int, grid=None, symbol: str = None) -> LabelMatrix:
+    """
+    Etiqueta una partición raw completa para toda la rejilla y la guarda junto a las features
+    """
+    grid = default_grid() if grid is None else grid
+    partitions = dict(list_partitions('raw', symbol, years=[year]))
+    if year not in partitions:
+        raise FileNotFoundError(f"No hay partición raw para {year}")
+    columns = (DATA_CONFIG['timestamp_column'], DATA_CONFIG['price_column'])
+    bars = Bars.from_frame(pd.read_csv(partitions[year], usecols=lambda c: c in columns), clean=True)
+    quality = load_quality_index(year, 'raw', symbol)
+    gap_before = quality.mask_for(bars.timestamps, quality.gap_before)
+
+    buy, exit_offset = label_grid(bars.close, gap_before, grid)
+    labels = LabelMatrix.from_labels(bars.timestamps, grid, buy, exit_offset)
+    labels.save(labels_path(year, symbol))
+    logging.info(f'{year}: {len(labels)} velas etiquetadas para {len(labels.grid)} combinaciones')
+    return labels
+
+
+def load_labels(year: int, symbol: str = None) -> LabelMatrix:
+    return LabelMatrix.load(labels_path(year, symbol))
+
+
+def build_label_grid(years=None, grid=None, symbol: str = None) -> dict:
+    """
+    Etiqueta todas las particiones raw (o las de years)
+
+    Returns:
+        dict: {año: LabelMatrix}
+    """
+    return {year: label_partition(year, grid, symbol) for year, _ in list_partitions('raw', symbol, years)}
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+
+    matrices = build_label_grid()
+    rates = pd.DataFrame({year: labels.buy.mean(axis=0) for year, labels in matrices.items()},
+                         index=next(iter(matrices.values())).names).T.rename_axis('year')
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(rates.round(3))
@@ -1,31 +1,40 @@
 import pandas as pd
-import talib as ta
 import logging
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from config import FEATURE_CONFIG
 from utils import slprofit_strategy, discretize_features, simple_strategy
+from session_calendar import SessionCalendar
+from data_quality import gap_mask
+from bars import as_bars, frame_of
+from partition_store import list_partitions, write_partition
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
 )
 
-def get_volatility(df: pd.DataFrame) -> pd.DataFrame:
-    # Estudiar la volatilidad diaria en horario de mercado
-    df = df[['timestamp', 'close']]
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df[(df['timestamp'].dt.hour >= 10) & (df['timestamp'].dt.hour < 16)]
-    # Agrupar por día
-    df.set_index('timestamp', inplace=True)
-    df['date'] = df.index.date
-    max_values = df.groupby('date')['close'].max()
-    min_values = df.groupby('date')['close'].min()
-    avg = df.groupby('date')['close'].mean()
-    volatility = (max_values - min_values)/avg
-    return volatility
+def get_volatility(df, calendar: SessionCalendar = None) -> pd.Series:
+    # Estudiar la volatilidad diaria en horario de mercado (una sola reducción agrupada por día)
+    # Acepta DataFrame o Bars; con Bars se reutiliza su calendario ya construido
+    bars = as_bars(df)
+    calendar = calendar or bars.calendar
+    return calendar.daily_volatility(bars.close)
 
 
-# Add indicators to raw_data
-def labelling_data(df: pd.DataFrame(), idx: int) -> pd.DataFrame():
+def label_slprofit(df: pd.DataFrame, profit: float, stop_loss: float, range: int, quality=None) -> list:
+    # Etiqueta cada vela con slprofit_strategy leyendo los huecos del índice de calidad
+    # (data_quality.QualityIndex) en lugar de recalcularlos en cada ventana
+    if quality is not None:
+        gap_before = quality.mask_for(df['timestamp'], quality.gap_before)
+    else:
+        gap_before = gap_mask(df['timestamp'])
+    return [slprofit_strategy(df.iloc[i:i+range], profit=profit, stop_loss=stop_loss, range=range,
+                              gap_before=gap_before[i:i+range]) for i in np.arange(len(df))]
+
+
+def add_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    import talib as ta  # Solo el cálculo de indicadores necesita TA-Lib
     df['RSI'] = ta.RSI(df['close'], timeperiod=7)
     df['MACD'], df['Signal'], df['Hist'] = ta.MACD(df['close'], fastperiod=5, slowperiod=13, signalperiod=9)
     df['EMA'] = ta.EMA(df['close'], timeperiod=10)
@@ -33,25 +42,84 @@ def labelling_data(df: pd.DataFrame(), idx: int) -> pd.DataFrame():
     df['MOM'] = ta.MOM(df['close'], timeperiod=10)
     # df['AD'] = ta.OBV(df['close'], df['volume'])
     # __, df['middleBollinger'], __ = ta.BBANDS(df['close'], timeperiod=20)
+    return df
+
+
+# Add indicators to raw_data
+def labelling_data(df: pd.DataFrame(), year: int, warmup: pd.DataFrame = None, symbol: str = None) -> pd.DataFrame():
+    # warmup: últimas velas de la partición anterior; los indicadores arrancan con su estado
+    # (EMA, MACD, RSI) en lugar de en frío y se descartan antes de guardar
+    df = frame_of(df)
+    n_warmup = 0 if warmup is None else len(warmup)
+    if n_warmup:
+        index = df.index
+        df = add_indicators(pd.concat([frame_of(warmup), df], ignore_index=True)).iloc[n_warmup:]
+        df.index = index
+    else:
+        df = add_indicators(df)
 
 
     # Add result based on stop-loss/take-profit, for reference lets start with 0.5% take profit and 0.2% stop loss and evaluation periods of 240 interval
-    # results = [slprofit_strategy(df.iloc[i:i+136], profit=0.005, stop_loss=-0.002, range=136) for i in range(len(df))]
+    # results = label_slprofit(df, profit=0.005, stop_loss=-0.002, range=136, quality=load_quality_index(year))
     # df['selling-time'] = [x[1] for x in results]
     # df['buy-sl'] = [x[0] for x in results]
+    # Para comparar varios objetivos sin reetiquetar: label_grid.build_label_grid() y ml_training.compare_targets
     # Lets start with an easy one, positive if avg next 5 values is above prize
     # df['buy-sl'] = [simple_strategy(df.iloc[i:i+10]) for i in range(len(df))]
 
 
     df = df.dropna()
-    volatility = get_volatility(df)
-    df.drop(columns=['Unnamed: 0', 'Signal', 'Hist'], inplace=True)
-    logging.info('Indicators aggregated')
-    df.to_csv(f'labelled_data/202{idx}_labelled_data.csv')
+    df = df.drop(columns=['Unnamed: 0', 'Signal', 'Hist'], errors='ignore')
+    logging.info(f'{year}: indicators aggregated')
+    write_partition(df, year, 'labelled', symbol)
     return df
 
 
+def _label_partition_task(args):
+    year, path, previous_path, warmup_bars, symbol = args
+    warmup = None
+    if previous_path is not None and warmup_bars > 0:
+        warmup = pd.read_csv(previous_path).tail(warmup_bars)
+    df = labelling_data(pd.read_csv(path), year, warmup, symbol)
+    return year, len(df)
+
+
+def _warmup_partitions(partitions) -> dict:
+    # Solo calienta con la partición del año inmediatamente anterior: tras un salto en el
+    # histórico (2003 -> 2021) el estado de los indicadores no tiene sentido y se arranca en frío
+    paths = dict(partitions)
+    return {year: paths[year - 1] for year in paths if year - 1 in paths}
+
+
+def build_features(years=None, symbol: str = None, max_workers: int = None, warmup_bars: int = None) -> dict:
+    """
+    Calcula los indicadores de cada partición en paralelo y los escribe en el partition store
+
+    Cada año arranca con una cola de calentamiento de la partición del año anterior (si
+    existe; tras un salto en el histórico arranca en frío), de modo que el resultado
+    coincide con un cálculo continuo sobre los años consecutivos (las medias
+    exponenciales olvidan el estado inicial mucho antes de FEATURE_CONFIG['warmup_bars']).
+
+    Args:
+        years: Años a calcular (por defecto, todas las particiones raw)
+        symbol: Símbolo (por defecto DATA_CONFIG['symbol'])
+        max_workers: Procesos (por defecto FEATURE_CONFIG['parallel_workers'])
+        warmup_bars: Velas de la partición anterior usadas como calentamiento
+
+    Returns:
+        dict: {año: filas escritas}
+    """
+    warmup_bars = FEATURE_CONFIG['warmup_bars'] if warmup_bars is None else warmup_bars
+    max_workers = max_workers or FEATURE_CONFIG['parallel_workers']
+    partitions = list_partitions('raw', symbol)
+    previous = _warmup_partitions(partitions)
+    tasks = [(year, path, previous.get(year), warmup_bars, symbol) for year, path in partitions
+             if years is None or year in years]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return dict(executor.map(_label_partition_task, tasks))
+
+
 
 if __name__ == '__main__':
-    for i in range(1, 5):
-        labelling_data(pd.read_csv(f'raw_data/202{i}_data.csv'), i)
\ No newline at end of file
+    for year, rows in build_features().items():
+        logging.info(f'{year}: {rows} filas con indicadores')
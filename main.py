@@ -6,6 +6,7 @@ from trading_strategies import volume_breakout_15min_strategy, volume_breakout_5
 from backtesting import comprehensive_backtest, analyze_trade_details
 from visualization import display_backtest_results, display_trade_analysis, plot_backtest_results, create_performance_dashboard, plot_commission_impact
 from config import INTERACTIVE_BROKERS_CONFIG
+from partition_store import partition_path
 import pandas as pd
 
 
@@ -24,7 +25,7 @@ def run_volume_strategy_backtest(data_file='raw_data/2024_data.csv', initial_cap
     print("📊 Cargando datos...")
     df = pd.DataFrame()
     for i in range(4, 5):
-        df = pd.concat([df, pd.read_csv(f'labelled_data/202{i}_labelled_data.csv')])
+        df = pd.concat([df, pd.read_csv(partition_path(2020 + i, 'labelled'))])
     df = clean_noisy_data(df)
     print(f"   • Datos cargados: {len(df)} registros")
     print(f"   • Período: {df['timestamp'].min()} a {df['timestamp'].max()}")
@@ -57,8 +58,8 @@ def run_volume_strategy_backtest(data_file='raw_data/2024_data.csv', initial_cap
     display_backtest_results(metrics, strategy_params, initial_capital)
     
     # Análisis detallado de trades
-    trade_details, exit_stats = analyze_trade_details(results)
-    display_trade_analysis(trade_details, exit_stats)
+    trades, breakdowns = analyze_trade_details(results)
+    display_trade_analysis(trades, breakdowns)
     
     return results, equity_curve, metrics
 
@@ -82,6 +83,15 @@ def run_visualization_suite(results, equity_curve, metrics):
     create_performance_dashboard(equity_curve, results, metrics)
 
 
+def run_strategy_comparison(years=None, initial_capital=10000):
+    """
+    Compara las estrategias de 15 y 5 minutos cargando y preparando los datos una sola vez
+    """
+    from comparison import run_comparison
+    print("\n⚖️  Comparando estrategias...")
+    return run_comparison(years=years or [2024], initial_capital=initial_capital)
+
+
 def main():
     """
     Función principal del sistema
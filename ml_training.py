@@ -4,6 +4,7 @@ from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.metrics import confusion_matrix, accuracy_score, precision_score, recall_score, f1_score
 from sklearn.preprocessing import StandardScaler, MinMaxScaler, RobustScaler
 from sklearn.compose import ColumnTransformer
+from sklearn.base import clone
 import pandas as pd
 import time
 import joblib
@@ -11,6 +12,9 @@ import logging
 
 from labelling import labelling_data
 import utils as ut
+from session_calendar import session_mask
+from partition_store import partition_path
+from config import SESSION_CONFIG
 
 mapping_dict = {'Gap-Buy': True, 'Buy': True, 'Gap-Sell': False, 'Sell': False, 'Threshold Limit': False}
 
@@ -20,7 +24,7 @@ models = {'DecisionTree': DecisionTreeClassifier(min_samples_leaf=4),
 
 
 def get_all_data(file_number: int) -> pd.DataFrame:
-    df = pd.concat([pd.read_csv(f'labelled_data/202{i}_labelled_data.csv') for i in range(1, file_number)])
+    df = pd.concat([pd.read_csv(partition_path(2020 + i, 'labelled')) for i in range(1, file_number)])
     return df
 
 
@@ -36,7 +40,7 @@ def model_score(y_test, y_pred) -> pd.DataFrame():
 def model_training(model_type: str, df: pd.DataFrame) -> pd.DataFrame():
     ## Limit training to data from hours between 10 am and 4 pm, to reduce noise
     df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df[(df['timestamp'].dt.hour >= 10) & (df['timestamp'].dt.hour < 16)]
+    df = df[session_mask(df['timestamp'], *SESSION_CONFIG['market_hours'])]
 
     df = df[~df['buy-sl'].isin(['Gap-Buy', 'Gap-Sell', 'Threshold Limit'])]
     df['buy-sl'] = df['buy-sl'].map(mapping_dict)
@@ -66,9 +70,47 @@ def model_training(model_type: str, df: pd.DataFrame) -> pd.DataFrame():
     # df_pred['name'] = model_type
     joblib.dump(scaler, f'trained_models/{model_type}_scaler_2.pkl')
     joblib.dump(obj, f'trained_models/{model_type}_trained_2.pkl')
+    # Versión en arrays para la predicción vela a vela (tree_inference)
+    from tree_inference import compile_model, compiled_path
+    compile_model(obj, scaler).save(compiled_path(model_type))
     return  df
 
 
+def compare_targets(df: pd.DataFrame, labels, model_type: str = 'DecisionTree') -> pd.DataFrame:
+    """
+    Entrena y puntúa el modelo con cada objetivo de una rejilla de etiquetas (label_grid)
+
+    Args:
+        df: Features con columna timestamp (las velas deben estar en la matriz de etiquetas)
+        labels: label_grid.LabelMatrix de las mismas velas (o de la partición completa)
+        model_type: Modelo de `models` a entrenar para cada objetivo
+
+    Returns:
+        DataFrame con una fila por combinación (positivos, accuracy, precision, recall, f1)
+    """
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df[session_mask(df['timestamp'], *SESSION_CONFIG['market_hours'])]
+    labels = labels.align(df['timestamp'])
+    scaler = ColumnTransformer(transformers=[
+        ('minmax', MinMaxScaler(), ['RSI']),
+        ('standard', StandardScaler(), ['MACD', 'EMA', 'MOM'])
+    ])
+    features_scaled = scaler.fit_transform(df[['RSI', 'MACD', 'EMA', 'MOM']])
+
+    rows = []
+    for name, target in zip(labels.names, labels.buy.T):
+        x_train, x_test, y_train, y_test = train_test_split(features_scaled, target, test_size=0.2,
+                                                            random_state=42)
+        obj = clone(models[model_type]).fit(x_train, y_train)
+        score = model_score(y_test, obj.predict(x_test)).drop(columns='matrix')
+        score.insert(0, 'target', name)
+        score.insert(1, 'positive_rate', target.mean())
+        rows.append(score)
+        logging.info(f'{name}: f1 {score["f1_score"].iloc[0]:.3f}')
+    return pd.concat(rows, ignore_index=True).set_index('target')
+
+
 def model_testing(model_path:str, scaler_path:str, df:pd.DataFrame()):
     df = ut.clean_noisy_data(df)
     # First we get model and scaler to try
@@ -99,7 +141,7 @@ if __name__ == '__main__':
 
     ## Model testing
     total_data = get_all_data(5)
-    labelling_data(total_data, 1)
+    labelling_data(total_data, 2021)
     df_train, df_test = train_test_split(total_data, test_size=0.2, random_state=42)
     model_training(model_type='RandomForest', df = df_train)
     model_testing(model_path='trained_models/RandomForest_trained_2.pkl', scaler_path='trained_models/RandomForest_scaler_2.pkl', df = df_test)
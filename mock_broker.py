@@ -0,0 +1,145 @@
+"""
+Broker simulado en local para probar la pasarela de órdenes sin servicio externo
+
+Implementa el protocolo de order_gateway (connect, disconnect, send, recv):
+    - órdenes a mercado ejecutadas al último precio (con slippage opcional),
+    - órdenes stop y limit de venta que se activan con los precios de cada vela,
+    - brackets: los hijos se activan al ejecutarse el padre y se cancelan entre sí (OCA),
+    - deduplicación por order_id de los reenvíos tras una reconexión,
+    - caídas de conexión simuladas para ejercitar la reconexión.
+"""
+import asyncio
+import collections
+
+
+class MockBroker:
+    """
+    Args:
+        latency: Retardo simulado de cada envío (segundos)
+        slippage: Deslizamiento relativo aplicado a las ejecuciones a mercado y stop
+        drop_every: Si se indica, la conexión se cae tras ese número de mensajes enviados
+    """
+
+    def __init__(self, latency: float = 0.0, slippage: float = 0.0, drop_every: int = None):
+        self.latency = latency
+        self.slippage = slippage
+        self.drop_every = drop_every
+        self.connected = False
+        self.connections = 0
+        self.messages = 0
+        self.last_price = None
+        self.last_time = None
+        self.orders = {}
+        self._working = []
+        self._events = collections.deque()
+        self._wakeup = asyncio.Event()
+
+    # --- Protocolo de la pasarela ---
+
+    async def connect(self):
+        self.connected = True
+        self.connections += 1
+
+    async def disconnect(self):
+        self._drop()
+
+    async def send(self, message: dict):
+        if not self.connected:
+            raise ConnectionError('Broker simulado desconectado')
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.messages += 1
+        if self.drop_every and self.messages % self.drop_every == 0:
+            # El mensaje se pierde con la conexión; la pasarela debe reenviarlo
+            self._drop()
+            raise ConnectionError('Caída de conexión simulada')
+        if message['action'] == 'place':
+            self._place(message)
+        elif message['action'] == 'cancel':
+            self._cancel(message['order_id'])
+
+    async def recv(self) -> dict:
+        # Espera a que haya eventos o se caiga la conexión (seguro ante cancelación)
+        while not self._events:
+            if not self.connected:
+                raise ConnectionError('Broker simulado desconectado')
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        if not self.connected:
+            raise ConnectionError('Broker simulado desconectado')
+        return self._events.popleft()
+
+    def pending_events(self) -> int:
+        return len(self._events)
+
+    # --- Mercado simulado ---
+
+    def on_price(self, timestamp, price: float):
+        """
+        Nuevo precio de mercado: ejecuta las órdenes stop y limit activas que se crucen
+
+        Dentro de un mismo precio se comprueban primero los stops (igual que el backtest).
+        """
+        self.last_price = price
+        self.last_time = timestamp
+        for kind in ('stop', 'limit'):
+            for order in [o for o in self._working if o['order_type'] == kind and o['active']]:
+                if order['status'] != 'working':
+                    continue
+                triggered = (price <= order['price']) if kind == 'stop' else (price >= order['price'])
+                if triggered:
+                    fill = price * (1 - self.slippage) if kind == 'stop' else price
+                    self._fill(order, fill)
+
+    # --- Internos ---
+
+    def _drop(self):
+        self.connected = False
+        self._wakeup.set()
+
+    def _emit(self, kind: str, order: dict, **fields):
+        self._events.append({'type': kind, 'order_id': order['order_id'], 'time': self.last_time, **fields})
+        self._wakeup.set()
+
+    def _place(self, message: dict):
+        if message['order_id'] in self.orders:
+            return
+        order = {**message, 'status': 'working', 'active': message['parent_id'] is None}
+        self.orders[order['order_id']] = order
+        if order['parent_id'] is not None:
+            parent = self.orders.get(order['parent_id'])
+            if parent is None or parent['status'] in ('cancelled', 'rejected'):
+                order['status'] = 'cancelled'
+                self._emit('cancelled', order)
+                return
+            order['active'] = parent['status'] == 'filled'
+        self._emit('accepted', order)
+        if order['order_type'] == 'market':
+            if self.last_price is None:
+                order['status'] = 'rejected'
+                self._emit('rejected', order, reason='sin precio de mercado')
+                return
+            slip = self.slippage if order['side'] == 'buy' else -self.slippage
+            self._fill(order, self.last_price * (1 + slip))
+        else:
+            self._working.append(order)
+
+    def _cancel(self, order_id: int):
+        order = self.orders.get(order_id)
+        if order is None or order['status'] != 'working':
+            return
+        order['status'] = 'cancelled'
+        if order in self._working:
+            self._working.remove(order)
+        self._emit('cancelled', order)
+
+    def _fill(self, order: dict, price: float):
+        order['status'] = 'filled'
+        if order in self._working:
+            self._working.remove(order)
+        self._emit('filled', order, price=price, quantity=order['quantity'])
+        for other in list(self._working):
+            if other['parent_id'] == order['order_id']:
+                other['active'] = True
+            elif order['oca_group'] is not None and other['oca_group'] == order['oca_group']:
+                self._cancel(other['order_id'])
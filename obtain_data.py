@@ -5,6 +5,8 @@ import pandas as pd
 import os
 import time
 import logging
+from config import DATA_CONFIG, DATA_QUALITY_CONFIG
+from data_quality import scan_bars
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,7 +17,10 @@ API_KEY = os.getenv("API_KEY")
 symbol = "KO"
 
 # Define las fechas de inicio y fin
-interval = "5"  # Velas de 5 minutos
+interval = str(DATA_CONFIG['bar_minutes'])  # Minutos por vela (5 por defecto, 1 para velas de 1 minuto)
+
+# Columnas de Alpha Vantage -> columnas de las particiones
+ALPHA_COLUMNS = {'2. high': 'high', '3. low': 'low', '4. close': 'close', '5. volume': 'volume'}
 
 def polygon_trial():
     for i in range(3, 24):
@@ -43,8 +48,40 @@ def polygon_trial():
 
 
 
-def alphavantage_trial():
+def validate_month(df: pd.DataFrame, year: str, month: str, bar_minutes: int = None) -> bool:
+    """
+    Comprueba un mes descargado (huecos, duplicados, volumen cero, cobertura) antes de concatenarlo
+
+    Registra todos los problemas, pero solo rechaza el mes (False) si está vacío o si tiene
+    problemas bloqueantes: filas desordenadas, timestamps duplicados o más retornos atípicos
+    que DATA_QUALITY_CONFIG['max_outlier_fraction']. El llamador decide si lo repara
+    (repair_month) o lo descarta.
+    """
+    if df.empty:
+        logging.warning(f'{year}-{month}: sin datos')
+        return False
+    summary = scan_bars(df['timestamp'], df['close'], df['volume'],
+                        bar_minutes=bar_minutes or DATA_CONFIG['bar_minutes']).summary()
+    issues = {k: summary[k] for k in ('unsorted', 'duplicates', 'zero_volume', 'outliers', 'incomplete_days')
+              if summary[k]}
+    if issues:
+        logging.warning(f'{year}-{month}: {issues} (huecos intradía: {summary["intraday_gaps"]})')
+    too_many_outliers = summary['outliers'] > DATA_QUALITY_CONFIG['max_outlier_fraction'] * len(df)
+    return not (summary['unsorted'] or summary['duplicates'] or too_many_outliers)
+
+
+def repair_month(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ordena un mes por timestamp y deja un único registro por timestamp (el último)
+    """
+    return (df.sort_values('timestamp', kind='stable')
+            .drop_duplicates('timestamp', keep='last').reset_index(drop=True))
+
+
+def alphavantage_trial(bar_minutes: int = None):
     ALPHA_KEY = "CLMCZZL2MAND1HPW"
+    bar_minutes = bar_minutes or DATA_CONFIG['bar_minutes']
+    av_interval = f"{bar_minutes}min"
 
     for i in range(21, 23):
         annual_df = pd.DataFrame()
@@ -53,20 +90,29 @@ def alphavantage_trial():
             try:
                 month = f"{k}" if k > 9 else f"0{k}"
                 # URL del endpoint de Alpha Vantage
-                url = f"https://www.alphavantage.co/query?function=TIME_SERIES_INTRADAY&symbol={symbol}&interval=5min&apikey={ALPHA_KEY}&month={year}-{month}&outputsize=full&extended_hours=true"
+                url = f"https://www.alphavantage.co/query?function=TIME_SERIES_INTRADAY&symbol={symbol}&interval={av_interval}&apikey={ALPHA_KEY}&month={year}-{month}&outputsize=full&extended_hours=true"
 
                 # Realizamos la solicitud HTTP
                 response = requests.get(url)
                 data = response.json()
 
                 # Convertimos los datos a un DataFrame
-                if "Time Series (5min)" in data:
-                    df = pd.DataFrame(data["Time Series (5min)"]).T
+                if f"Time Series ({av_interval})" in data:
+                    df = pd.DataFrame(data[f"Time Series ({av_interval})"]).T
                     df = df.astype(float)  # Aseguramos que los valores sean numéricos
                     df['timestamp'] = pd.to_datetime(df.index)
-                    clean_df = df[['timestamp', '4. close', '5. volume']]
+                    # Máximos y mínimos para resolver stops y objetivos dentro de la vela
+                    clean_df = df[['timestamp', *ALPHA_COLUMNS]].rename(columns=ALPHA_COLUMNS)
                     clean_df = clean_df.iloc[::-1].reset_index(drop=True)
-                    annual_df = pd.concat([annual_df, clean_df])
+                    valid = validate_month(clean_df, year, month, bar_minutes)
+                    if not valid and not clean_df.empty:
+                        # Orden y duplicados se reparan; si aún no es válido (atípicos), se descarta
+                        clean_df = repair_month(clean_df)
+                        valid = validate_month(clean_df, year, month, bar_minutes)
+                    if valid:
+                        annual_df = pd.concat([annual_df, clean_df])
+                    else:
+                        logging.warning(f'{year}-{month}: mes descartado')
 
                 if k % 4 == 0:
                     time.sleep(70)
@@ -74,6 +120,9 @@ def alphavantage_trial():
             except Exception as e:
                 logging.exception(f'Could not do {year}-{month}')
 
+        if not annual_df.empty:
+            # Meses solapados o repetidos: orden cronológico y un único registro por timestamp
+            annual_df = repair_month(annual_df)
         logging.info(f'Year {year} recovered')
         annual_df.to_csv(f"raw_data/{year}_data.csv")
 
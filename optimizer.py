@@ -0,0 +1,385 @@
+"""
+Optimizador adaptativo de parámetros de estrategia (TPE) con poda por escalones de meses
+
+Cada candidato se evalúa primero sobre un subconjunto de meses repartido por todo el
+periodo; si su Sharpe y su Calmar parciales quedan por debajo del cuantil de los
+candidatos ya evaluados en ese escalón, se detiene. Solo los supervivientes llegan al
+backtest completo. Las propuestas siguen un Tree-structured Parzen Estimator: se
+modelan por separado las densidades de los mejores trials, l(x), y del resto, g(x), y
+se propone el candidato que maximiza l(x)/g(x).
+
+Varios trials se evalúan en paralelo y el estado del estudio se guarda en JSON tras
+cada evento, de modo que una búsqueda interrumpida se puede reanudar.
+"""
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from config import OPTIMIZER_CONFIG
+from bars import Bars, as_bars
+from backtesting import comprehensive_backtest
+
+# Métricas guardadas de cada escalón
+RUNG_METRICS = ('sharpe_ratio', 'calmar_ratio', 'total_return', 'max_drawdown', 'total_trades')
+_OBJECTIVES = {'sharpe': 'sharpe_ratio', 'calmar': 'calmar_ratio'}
+_METRIC_LIMIT = 1e6
+
+
+def _finite(value) -> float:
+    """
+    Métricas no finitas (sin trades, equity negativa...) acotadas para poder compararlas
+    """
+    value = float(value)
+    if math.isnan(value):
+        return -_METRIC_LIMIT
+    return min(max(value, -_METRIC_LIMIT), _METRIC_LIMIT)
+
+
+def month_subsets(bars: Bars, fractions) -> list:
+    """
+    Subconjuntos anidados de meses para cada escalón
+
+    Los meses se ordenan con una secuencia de van der Corput para que cada subconjunto
+    cubra todo el periodo (no solo el principio) y el escalón siguiente amplíe el anterior.
+
+    Returns:
+        list: Un Bars por escalón con las velas de los meses seleccionados
+    """
+    month = bars.datetimes.astype('datetime64[M]').astype(np.int64)
+    months = np.unique(month)
+    n = len(months)
+    # Radical inverso en base 2 de la posición de cada mes
+    bits = max(int(n - 1).bit_length(), 1)
+    radical = np.array([int(format(i, f'0{bits}b')[::-1], 2) for i in range(n)])
+    order = np.argsort(radical, kind='stable')
+
+    subsets = []
+    for fraction in fractions:
+        if fraction >= 1:
+            subsets.append(bars)
+            continue
+        selected = months[order[:max(1, int(math.ceil(fraction * n)))]]
+        subsets.append(bars[np.isin(month, selected)])
+    return subsets
+
+
+class SearchSpace:
+    """
+    Espacio de búsqueda {parámetro: (mínimo, máximo, 'float' | 'int' | 'log')}
+
+    Internamente cada parámetro se normaliza a [0, 1] (en escala logarítmica para 'log').
+    """
+
+    def __init__(self, space: dict = None):
+        self.space = {name: tuple(spec) for name, spec in (space or OPTIMIZER_CONFIG['search_space']).items()}
+        for name, (low, high, kind) in self.space.items():
+            if kind not in ('float', 'int', 'log'):
+                raise ValueError(f"Tipo desconocido para {name}: {kind}")
+            if kind == 'log' and (low <= 0 or high <= 0):
+                raise ValueError(f"{name}: los límites de un parámetro 'log' deben ser positivos")
+
+    @property
+    def names(self) -> list:
+        return list(self.space)
+
+    def to_unit(self, params: dict) -> np.ndarray:
+        values = []
+        for name, (low, high, kind) in self.space.items():
+            if kind == 'log':
+                values.append((math.log(params[name]) - math.log(low)) / (math.log(high) - math.log(low)))
+            else:
+                values.append((params[name] - low) / (high - low))
+        return np.clip(np.array(values, dtype=np.float64), 0.0, 1.0)
+
+    def from_unit(self, unit: np.ndarray) -> dict:
+        params = {}
+        for u, (name, (low, high, kind)) in zip(np.clip(unit, 0.0, 1.0), self.space.items()):
+            if kind == 'log':
+                params[name] = float(math.exp(math.log(low) + u * (math.log(high) - math.log(low))))
+            elif kind == 'int':
+                params[name] = int(round(low + u * (high - low)))
+            else:
+                params[name] = float(low + u * (high - low))
+        return params
+
+
+def _parzen_log_density(x: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """
+    Log-densidad en [0, 1] de una mezcla de gaussianas centradas en las observaciones
+    más una componente uniforme (prior), para cada columna (parámetro) por separado
+
+    Args:
+        x: Puntos a evaluar (n_puntos, n_parámetros)
+        centers: Observaciones (n_obs, n_parámetros)
+    """
+    n_obs = len(centers)
+    bandwidth = _bandwidth(centers)
+    z = (x[:, None, :] - centers[None, :, :]) / bandwidth
+    kernels = np.exp(-0.5 * z ** 2) / (bandwidth * math.sqrt(2 * math.pi))
+    # Prior uniforme con el peso de una observación
+    density = (kernels.sum(axis=1) + 1.0) / (n_obs + 1)
+    return np.log(density)
+
+
+def _bandwidth(centers: np.ndarray) -> np.ndarray:
+    n_obs = len(centers)
+    spread = centers.std(axis=0) if n_obs > 1 else np.full(centers.shape[1], 0.5)
+    return np.clip(1.06 * spread * n_obs ** -0.2, 0.05, 0.5)
+
+
+def _sample_parzen(rng: np.random.Generator, centers: np.ndarray, n_samples: int) -> np.ndarray:
+    """
+    Muestras de la mezcla de _parzen_log_density (parámetro a parámetro)
+    """
+    n_obs, n_params = centers.shape
+    bandwidth = _bandwidth(centers)
+    # Índice n_obs = componente uniforme
+    component = rng.integers(0, n_obs + 1, size=(n_samples, n_params))
+    chosen = centers[np.minimum(component, n_obs - 1), np.arange(n_params)]
+    samples = np.where(component == n_obs, rng.random((n_samples, n_params)),
+                       chosen + rng.normal(size=(n_samples, n_params)) * bandwidth)
+    # Reflejar en los bordes para mantener [0, 1]
+    samples = np.abs(samples)
+    return np.where(samples > 1, 2 - samples, samples).clip(0.0, 1.0)
+
+
+class Study:
+    """
+    Estado de una búsqueda: espacio, objetivo, escalones y trials
+
+    Cada trial es un dict con number, params, state ('running', 'pruned', 'complete'),
+    rungs (métricas de cada escalón evaluado) y value (objetivo en el escalón final).
+    """
+
+    def __init__(self, name: str = 'study', space: dict = None, objective: str = None, rungs=None,
+                 seed: int = 0, path: str = None, data_fingerprint: dict = None):
+        self.name = name
+        self.space = SearchSpace(space)
+        self.objective = objective or OPTIMIZER_CONFIG['objective']
+        if self.objective not in _OBJECTIVES:
+            raise ValueError(f"Objetivo desconocido: {self.objective}. Opciones: {list(_OBJECTIVES)}")
+        self.rungs = tuple(rungs or OPTIMIZER_CONFIG['rungs'])
+        if not self.rungs or self.rungs[-1] != 1.0:
+            raise ValueError("El último escalón debe evaluar todos los meses (1.0)")
+        self.seed = seed
+        self.path = path or os.path.join(OPTIMIZER_CONFIG['studies_path'], f'{name}.json')
+        self.data_fingerprint = data_fingerprint
+        self.trials = []
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path) as f:
+            state = json.load(f)
+        study = cls(state['name'], state['space'], state['objective'], state['rungs'], state['seed'],
+                    path, state.get('data_fingerprint'))
+        study.trials = state['trials']
+        return study
+
+    @classmethod
+    def load_or_create(cls, name: str, path: str = None, **kwargs):
+        """
+        Retoma el estudio guardado o crea uno nuevo con kwargs
+
+        Al retomar, un objetivo o unos escalones pasados explícitamente deben coincidir con
+        los guardados: los trials previos se puntuaron con ellos.
+        """
+        path = path or os.path.join(OPTIMIZER_CONFIG['studies_path'], f'{name}.json')
+        if not os.path.exists(path):
+            return cls(name, path=path, **kwargs)
+        study = cls.load(path)
+        if kwargs.get('objective') is not None and kwargs['objective'] != study.objective:
+            raise ValueError(f"El estudio '{name}' se creó con el objetivo '{study.objective}', "
+                             f"no '{kwargs['objective']}'")
+        if kwargs.get('rungs') is not None and tuple(kwargs['rungs']) != study.rungs:
+            raise ValueError(f"El estudio '{name}' se creó con los escalones {list(study.rungs)}")
+        return study
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        state = {'name': self.name, 'space': self.space.space, 'objective': self.objective,
+                 'rungs': self.rungs, 'seed': self.seed, 'data_fingerprint': self.data_fingerprint,
+                 'trials': self.trials}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def metric(self) -> str:
+        return _OBJECTIVES[self.objective]
+
+    @property
+    def completed(self) -> list:
+        return [t for t in self.trials if t['state'] == 'complete']
+
+    @property
+    def best_trial(self) -> dict:
+        completed = self.completed
+        return max(completed, key=lambda t: t['value']) if completed else None
+
+    @property
+    def best_params(self) -> dict:
+        best = self.best_trial
+        return dict(best['params']) if best else None
+
+    @property
+    def backtest_cost(self) -> float:
+        """
+        Coste de la búsqueda en backtests completos equivalentes
+        """
+        return sum(sum(self.rungs[:len(t['rungs'])]) for t in self.trials)
+
+    def suggest(self, n_startup_trials: int = None, n_ei_candidates: int = None, gamma: float = None) -> dict:
+        """
+        Propone los parámetros del siguiente trial (aleatorios al principio, TPE después)
+        """
+        n_startup_trials = OPTIMIZER_CONFIG['n_startup_trials'] if n_startup_trials is None else n_startup_trials
+        n_ei_candidates = n_ei_candidates or OPTIMIZER_CONFIG['n_ei_candidates']
+        gamma = gamma or OPTIMIZER_CONFIG['gamma']
+        rng = np.random.default_rng([self.seed, len(self.trials)])
+        n_params = len(self.space.names)
+
+        scored = [t for t in self.trials if t['state'] in ('complete', 'pruned')]
+        if len(scored) < max(n_startup_trials, 2):
+            return self.space.from_unit(rng.random(n_params))
+
+        # Orden: primero los que llegaron más lejos y, dentro de cada escalón, por su objetivo
+        def rank_key(trial):
+            last = trial['rungs'][-1]
+            return (len(trial['rungs']), last[self.metric])
+        ranked = sorted(scored, key=rank_key, reverse=True)
+        n_good = max(1, int(math.ceil(gamma * len(ranked))))
+        good = np.array([self.space.to_unit(t['params']) for t in ranked[:n_good]])
+        # Los trials en curso cuentan como "malos" para no repetir propuestas (constant liar)
+        bad_trials = ranked[n_good:] + [t for t in self.trials if t['state'] == 'running']
+        bad = np.array([self.space.to_unit(t['params']) for t in bad_trials]) if bad_trials else np.empty((0, n_params))
+
+        candidates = _sample_parzen(rng, good, n_ei_candidates)
+        score = _parzen_log_density(candidates, good).sum(axis=1)
+        if len(bad):
+            score -= _parzen_log_density(candidates, bad).sum(axis=1)
+        return self.space.from_unit(candidates[int(np.argmax(score))])
+
+    def should_prune(self, trial: dict, prune_quantile: float = None, min_trials: int = None) -> bool:
+        """
+        Un trial se poda si su Sharpe y su Calmar en el escalón actual están ambos por
+        debajo del cuantil de los demás trials evaluados en ese mismo escalón
+        """
+        prune_quantile = OPTIMIZER_CONFIG['prune_quantile'] if prune_quantile is None else prune_quantile
+        min_trials = OPTIMIZER_CONFIG['min_trials_to_prune'] if min_trials is None else min_trials
+        rung = len(trial['rungs']) - 1
+        if rung >= len(self.rungs) - 1:
+            return False
+        others = [t['rungs'][rung] for t in self.trials
+                  if t is not trial and len(t['rungs']) > rung]
+        if len(others) < min_trials:
+            return False
+        current = trial['rungs'][rung]
+        return all(current[m] < np.quantile([o[m] for o in others], prune_quantile)
+                   for m in ('sharpe_ratio', 'calmar_ratio'))
+
+
+# Estado de cada proceso evaluador (se inicializa una vez por proceso)
+_WORKER = {}
+
+
+def _init_worker(subsets, strategy_func, initial_capital, cost_model):
+    _WORKER.update(subsets=subsets, strategy_func=strategy_func, initial_capital=initial_capital,
+                   cost_model=cost_model)
+
+
+def _evaluate_rung(number: int, params: dict, rung: int):
+    """
+    Backtest de un trial sobre el subconjunto de meses de un escalón
+    """
+    _, _, metrics = comprehensive_backtest(_WORKER['subsets'][rung], _WORKER['strategy_func'], params,
+                                           _WORKER['initial_capital'], cost_model=_WORKER['cost_model'])
+    return number, {name: _finite(metrics[name]) for name in RUNG_METRICS}
+
+
+def _fingerprint(bars: Bars) -> dict:
+    return {'bars': len(bars),
+            'start': int(bars.timestamps[0]) if len(bars) else None,
+            'end': int(bars.timestamps[-1]) if len(bars) else None}
+
+
+def optimize(df, strategy_func, n_trials: int = None, study: Study = None, initial_capital=10000,
+             cost_model=None, base_params: dict = None, n_jobs: int = None,
+             prune_quantile: float = None, verbose: bool = True) -> Study:
+    """
+    Busca los mejores parámetros de una estrategia con TPE y poda por escalones
+
+    Args:
+        df: DataFrame o Bars con los datos
+        strategy_func: Función de estrategia
+        n_trials: Trials totales del estudio (incluidos los ya hechos al reanudar)
+        study: Estudio a continuar (por defecto, uno nuevo con la configuración)
+        initial_capital: Capital inicial
+        cost_model: Modelo de costes
+        base_params: Parámetros fijos de la estrategia fuera del espacio de búsqueda
+        n_jobs: Trials evaluados en paralelo (por defecto OPTIMIZER_CONFIG['n_jobs'])
+        prune_quantile: Cuantil de poda (por defecto OPTIMIZER_CONFIG['prune_quantile'])
+        verbose: Imprime el progreso
+
+    Returns:
+        Study con todos los trials; best_params contiene el mejor conjunto
+    """
+    bars = as_bars(df)
+    n_trials = n_trials or OPTIMIZER_CONFIG['n_trials']
+    n_jobs = n_jobs or OPTIMIZER_CONFIG['n_jobs'] or os.cpu_count() or 1
+    study = study or Study()
+    fingerprint = _fingerprint(bars)
+    if study.data_fingerprint is None:
+        study.data_fingerprint = fingerprint
+    elif study.data_fingerprint != fingerprint:
+        raise ValueError(f"El estudio '{study.name}' se creó con otros datos: {study.data_fingerprint}")
+
+    subsets = month_subsets(bars, study.rungs)
+    base_params = base_params or {}
+    running = {}
+
+    def submit(executor, trial):
+        params = {**base_params, **trial['params']}
+        future = executor.submit(_evaluate_rung, trial['number'], params, len(trial['rungs']))
+        running[future] = trial
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(subsets, strategy_func, initial_capital, cost_model)) as executor:
+        # Reanudar trials interrumpidos desde su siguiente escalón
+        for trial in study.trials:
+            if trial['state'] == 'running':
+                submit(executor, trial)
+
+        while running or len(study.trials) < n_trials:
+            while len(running) < n_jobs and len(study.trials) < n_trials:
+                trial = {'number': len(study.trials), 'params': study.suggest(), 'state': 'running',
+                         'rungs': [], 'value': None}
+                study.trials.append(trial)
+                submit(executor, trial)
+            study.save()
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                trial = running.pop(future)
+                _, metrics = future.result()
+                trial['rungs'].append(metrics)
+                if len(trial['rungs']) == len(study.rungs):
+                    trial['state'] = 'complete'
+                    trial['value'] = metrics[study.metric]
+                elif study.should_prune(trial, prune_quantile):
+                    trial['state'] = 'pruned'
+                else:
+                    submit(executor, trial)
+                    continue
+                if verbose:
+                    value = f"{trial['value']:.3f}" if trial['state'] == 'complete' else '-'
+                    best = study.best_trial
+                    best_value = f"{best['value']:.3f}" if best else '-'
+                    print(f"   • Trial {trial['number']:3d} {trial['state']:8s} escalón {len(trial['rungs'])}/"
+                          f"{len(study.rungs)}  {study.objective}={value}  mejor={best_value}")
+            study.save()
+
+    return study
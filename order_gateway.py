@@ -0,0 +1,345 @@
+"""
+Pasarela asíncrona de órdenes para trading en vivo o en paper
+
+La pasarela mantiene una conexión persistente con el broker (reconectando con
+backoff exponencial), acepta órdenes sin bloquear a la estrategia mediante una
+cola y sigue el estado de cada orden y de cada bracket (entrada con stop loss y
+take profit). Mide la latencia desde la llegada de la vela hasta el envío de la orden.
+
+El broker es cualquier objeto con las corrutinas connect(), disconnect(),
+send(mensaje) y recv() -> evento; mock_broker.MockBroker implementa ese protocolo
+para pruebas sin servicio externo.
+"""
+import asyncio
+import collections
+import itertools
+import logging
+import time
+
+import numpy as np
+
+from config import GATEWAY_CONFIG
+
+
+# Estados de una orden en la pasarela
+ORDER_STATES = ('created', 'queued', 'sent', 'accepted', 'filled', 'cancelled', 'rejected')
+_FINAL_STATES = ('filled', 'cancelled', 'rejected')
+
+
+class Order:
+    """
+    Orden individual
+
+    Atributos:
+        order_id: Identificador único (también usado por el broker para deduplicar reenvíos)
+        side: 'buy' o 'sell'
+        quantity: Número de acciones
+        order_type: 'market', 'stop' o 'limit'
+        price: Precio de activación (stop) o límite (limit)
+        parent_id: Orden padre de un bracket (solo se activa cuando el padre se ejecuta)
+        oca_group: Grupo one-cancels-all (la ejecución de una cancela las demás)
+        bar_ns: Instante (perf_counter_ns) de llegada de la vela que originó la orden
+        sent_ns: Instante en que la orden se escribió en la conexión
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, side: str, quantity: int, order_type: str = 'market', price: float = None,
+                 parent_id: int = None, oca_group: str = None, bar_ns: int = None, tag: str = ''):
+        if side not in ('buy', 'sell'):
+            raise ValueError(f"Lado de orden desconocido: {side}")
+        if order_type not in ('market', 'stop', 'limit'):
+            raise ValueError(f"Tipo de orden desconocido: {order_type}")
+        self.order_id = next(Order._ids)
+        self.side = side
+        self.quantity = int(quantity)
+        self.order_type = order_type
+        self.price = price
+        self.parent_id = parent_id
+        self.oca_group = oca_group
+        self.bar_ns = bar_ns
+        self.tag = tag
+        self.state = 'created'
+        self.sent_ns = None
+        self.fill_price = None
+        self.fill_time = None
+
+    @property
+    def latency_ns(self):
+        if self.bar_ns is None or self.sent_ns is None:
+            return None
+        return self.sent_ns - self.bar_ns
+
+    def to_message(self) -> dict:
+        return {'action': 'place', 'order_id': self.order_id, 'side': self.side, 'quantity': self.quantity,
+                'order_type': self.order_type, 'price': self.price, 'parent_id': self.parent_id,
+                'oca_group': self.oca_group}
+
+    def __repr__(self):
+        return (f"Order({self.order_id}, {self.side} {self.quantity} {self.order_type}"
+                f"{'' if self.price is None else f' @ {self.price:.4f}'}, {self.state})")
+
+
+class Bracket:
+    """
+    Entrada a mercado con stop loss y take profit hijos en un grupo OCA
+
+    Estados: 'pending' (entrada sin ejecutar), 'open' (en posición), 'closed' y 'cancelled'.
+    """
+
+    def __init__(self, entry: Order, stop: Order, take: Order):
+        self.entry = entry
+        self.stop = stop
+        self.take = take
+        self.exit_order = None
+        self.state = 'pending'
+        self.exit_reason = None
+
+    @property
+    def orders(self) -> list:
+        return [o for o in (self.entry, self.stop, self.take, self.exit_order) if o is not None]
+
+    @property
+    def entry_price(self):
+        return self.entry.fill_price
+
+    @property
+    def exit_price(self):
+        for order in (self.stop, self.take, self.exit_order):
+            if order is not None and order.state == 'filled':
+                return order.fill_price
+        return None
+
+    def to_record(self) -> dict:
+        return {'entry_time': self.entry.fill_time, 'entry_price': self.entry_price,
+                'exit_time': next((o.fill_time for o in (self.stop, self.take, self.exit_order)
+                                   if o is not None and o.state == 'filled'), None),
+                'exit_price': self.exit_price, 'quantity': self.entry.quantity,
+                'state': self.state, 'exit_reason': self.exit_reason}
+
+
+class OrderGateway:
+    """
+    Conexión persistente con el broker, cola de envío no bloqueante y seguimiento de órdenes
+
+    Args:
+        broker: Objeto con connect(), disconnect(), send(mensaje) y recv()
+        reconnect_delay, max_reconnect_delay: Backoff de reconexión (por defecto GATEWAY_CONFIG)
+        queue_size: Tamaño máximo de la cola de envío
+        on_bracket_closed: Callback(bracket) al cerrarse o cancelarse un bracket
+    """
+
+    def __init__(self, broker, reconnect_delay: float = None, max_reconnect_delay: float = None,
+                 queue_size: int = None, on_bracket_closed=None):
+        self.broker = broker
+        self.reconnect_delay = reconnect_delay or GATEWAY_CONFIG['reconnect_delay']
+        self.max_reconnect_delay = max_reconnect_delay or GATEWAY_CONFIG['max_reconnect_delay']
+        self.queue = asyncio.Queue(maxsize=queue_size or GATEWAY_CONFIG['queue_size'])
+        self.on_bracket_closed = on_bracket_closed
+        self.orders = {}
+        self.brackets = []
+        self._bracket_of = {}
+        self._retry = collections.deque()
+        self.connected = asyncio.Event()
+        self.reconnects = 0
+        self.latencies_ns = []
+        self._task = None
+
+    # --- Ciclo de vida ---
+
+    async def start(self):
+        """
+        Arranca la conexión en segundo plano y espera a que se establezca
+        """
+        self._task = asyncio.create_task(self._connection_loop())
+        await self.connected.wait()
+
+    async def stop(self, flush: bool = True):
+        if flush:
+            await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.connected.clear()
+        await self.broker.disconnect()
+
+    async def flush(self):
+        """
+        Espera a que todas las órdenes encoladas se hayan enviado y sus eventos procesado
+        """
+        pending_events = getattr(self.broker, 'pending_events', None)
+        while True:
+            await self.queue.join()
+            # Deja que el bucle de recepción procese lo recibido (puede encolar cancelaciones)
+            await asyncio.sleep(0)
+            if self.queue.empty() and not (pending_events and pending_events()):
+                break
+
+    async def _connection_loop(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                await self.broker.connect()
+                self.connected.set()
+                delay = self.reconnect_delay
+                await self._run_session()
+            except (ConnectionError, OSError) as e:
+                self.connected.clear()
+                self.reconnects += 1
+                logging.warning(f'Conexión con el broker perdida ({e}); reintento en {delay:.1f}s')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _run_session(self):
+        """
+        Envío y recepción concurrentes; si uno de los dos falla se detienen ambos
+        """
+        tasks = [asyncio.create_task(self._send_loop()), asyncio.create_task(self._recv_loop())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for task in done:
+            task.result()
+
+    async def _send_loop(self):
+        while True:
+            # Primero lo que quedó sin enviar al caer la conexión
+            item = self._retry.popleft() if self._retry else await self.queue.get()
+            try:
+                await self._send(item)
+            except (ConnectionError, OSError, asyncio.CancelledError):
+                # Se reenvía tras reconectar (el broker deduplica por order_id)
+                self._retry.appendleft(item)
+                raise
+            self.queue.task_done()
+
+    async def _send(self, item):
+        action, order = item
+        if action == 'place':
+            if order.state in _FINAL_STATES:
+                return
+            order.sent_ns = time.perf_counter_ns()
+            await self.broker.send(order.to_message())
+            if order.state == 'queued':
+                order.state = 'sent'
+            if order.latency_ns is not None:
+                self.latencies_ns.append(order.latency_ns)
+        else:
+            await self.broker.send({'action': 'cancel', 'order_id': order.order_id})
+
+    async def _recv_loop(self):
+        while True:
+            self._handle_event(await self.broker.recv())
+
+    # --- Envío de órdenes (no bloqueante) ---
+
+    def submit(self, order: Order) -> Order:
+        """
+        Encola una orden para su envío; no espera al broker
+
+        Raises:
+            asyncio.QueueFull: Si la cola de envío está llena
+        """
+        order.state = 'queued'
+        self.orders[order.order_id] = order
+        self.queue.put_nowait(('place', order))
+        return order
+
+    def cancel(self, order: Order):
+        if order.state not in _FINAL_STATES:
+            self.queue.put_nowait(('cancel', order))
+
+    def submit_bracket(self, quantity: int, stop_price: float, take_price: float,
+                       bar_ns: int = None) -> Bracket:
+        """
+        Entrada a mercado con stop loss y take profit (OCA) que se activan al ejecutarse la entrada
+        """
+        entry = Order('buy', quantity, 'market', bar_ns=bar_ns, tag='entry')
+        oca_group = f'bracket-{entry.order_id}'
+        stop = Order('sell', quantity, 'stop', stop_price, entry.order_id, oca_group, bar_ns, 'stop_loss')
+        take = Order('sell', quantity, 'limit', take_price, entry.order_id, oca_group, bar_ns, 'take_profit')
+        bracket = Bracket(entry, stop, take)
+        self.brackets.append(bracket)
+        for order in (entry, stop, take):
+            self._bracket_of[order.order_id] = bracket
+            self.submit(order)
+        return bracket
+
+    def close_bracket(self, bracket: Bracket, reason: str, bar_ns: int = None):
+        """
+        Cierra un bracket a mercado (salida por tiempo o fin de día) cancelando sus hijos
+        """
+        if bracket.state == 'pending':
+            for order in (bracket.entry, bracket.stop, bracket.take):
+                self.cancel(order)
+            return None
+        if bracket.state != 'open' or bracket.exit_order is not None:
+            return None
+        bracket.exit_reason = reason
+        self.cancel(bracket.stop)
+        self.cancel(bracket.take)
+        bracket.exit_order = Order('sell', bracket.entry.quantity, 'market', bar_ns=bar_ns, tag=reason)
+        self._bracket_of[bracket.exit_order.order_id] = bracket
+        return self.submit(bracket.exit_order)
+
+    # --- Eventos del broker ---
+
+    def _handle_event(self, event: dict):
+        order = self.orders.get(event['order_id'])
+        if order is None or order.state in _FINAL_STATES:
+            return
+        kind = event['type']
+        if kind == 'accepted':
+            order.state = 'accepted'
+            return
+        if kind == 'filled':
+            order.state = 'filled'
+            order.fill_price = event['price']
+            order.fill_time = event.get('time')
+        elif kind in ('cancelled', 'rejected'):
+            order.state = kind
+        else:
+            logging.warning(f'Evento desconocido del broker: {event}')
+            return
+        self._update_bracket(order)
+
+    def _update_bracket(self, order: Order):
+        bracket = self._bracket_of.get(order.order_id)
+        if bracket is None or bracket.state in ('closed', 'cancelled'):
+            return
+        if order is bracket.entry:
+            if order.state == 'filled':
+                bracket.state = 'open'
+            else:
+                bracket.state = 'cancelled'
+                self._notify(bracket)
+        elif order.state == 'filled':
+            # Stop, take profit o salida a mercado: la posición queda cerrada
+            bracket.state = 'closed'
+            if order is not bracket.exit_order:
+                bracket.exit_reason = order.tag
+                self.cancel(bracket.take if order is bracket.stop else bracket.stop)
+            self._notify(bracket)
+
+    def _notify(self, bracket: Bracket):
+        if self.on_bracket_closed is not None:
+            self.on_bracket_closed(bracket)
+
+    # --- Instrumentación ---
+
+    def latency_summary(self) -> dict:
+        """
+        Latencia vela -> orden enviada (microsegundos)
+        """
+        if not self.latencies_ns:
+            return {'orders': 0}
+        latencies = np.asarray(self.latencies_ns, dtype=np.float64) / 1e3
+        return {'orders': len(latencies), 'mean_us': float(latencies.mean()),
+                'p50_us': float(np.percentile(latencies, 50)), 'p90_us': float(np.percentile(latencies, 90)),
+                'p99_us': float(np.percentile(latencies, 99)), 'max_us': float(latencies.max()),
+                'reconnects': self.reconnects}
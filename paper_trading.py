@@ -0,0 +1,225 @@
+"""
+Paper trading vela a vela sobre la pasarela asíncrona de órdenes
+
+LiveVolumeBreakout toma la decisión de la estrategia de volume breakout con la
+información disponible hasta la vela actual (sin mirar velas futuras) y
+run_paper_session reproduce un histórico como si llegara en vivo: cada vela
+actualiza el precio del broker, la estrategia decide y la pasarela envía las
+órdenes (entrada con bracket de stop loss y take profit, o cierre a mercado).
+
+Diferencias con el backtest vectorizado:
+    - en 15 minutos se usa el bloque parcial en curso (el backtest ve el bloque completo),
+    - la última vela de un día no se conoce de antemano: si el día acaba antes de
+      las 16:55 la posición se cierra en la primera vela del día siguiente.
+"""
+import asyncio
+import collections
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import SESSION_CONFIG, VOLUME_STRATEGY_CONFIG
+from bars import as_bars
+from session_calendar import NS_PER_MINUTE, MINUTES_PER_DAY, to_minutes
+from order_gateway import OrderGateway
+from mock_broker import MockBroker
+from accumulators import MetricsAccumulator
+
+NS_PER_DAY = NS_PER_MINUTE * MINUTES_PER_DAY
+
+
+class LiveVolumeBreakout:
+    """
+    Decisión causal vela a vela de volume_breakout_5min/15min_strategy
+
+    Args:
+        timeframe: '5min' (señal sobre cada vela) o '15min' (señal sobre el bloque de 15 min en curso)
+        volume_multiplier, trend_window, exit_periods, stop_loss, take_profit, volume_window:
+            Mismos parámetros que las estrategias de trading_strategies
+    """
+
+    def __init__(self, timeframe: str = '5min', volume_multiplier: float = 1.5, trend_window: int = 3,
+                 exit_periods: int = 12, stop_loss: float = -0.005, take_profit: float = 0.02,
+                 volume_window: int = 20, session_config: dict = None):
+        if timeframe not in ('5min', '15min'):
+            raise ValueError(f"Timeframe no soportado en vivo: {timeframe}")
+        self.timeframe = timeframe
+        self.volume_multiplier = volume_multiplier
+        self.trend_window = trend_window
+        self.exit_periods = exit_periods
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.volume_window = volume_window if timeframe == '5min' else 20
+        self.eod_minute = to_minutes((session_config or SESSION_CONFIG)['end_of_day'])
+        # Volúmenes y cierres de los bloques anteriores al actual
+        self._volumes = collections.deque(maxlen=self.volume_window - 1)
+        self._closes = collections.deque(maxlen=max(trend_window - 1, 1))
+        self._bucket = None
+        self._bucket_volume = 0.0
+        self._bucket_close = None
+        self.in_position = False
+        self.entry_index = None
+        self.day = None
+        self.index = -1
+        self._closed_at = None
+
+    def _signal(self, ts_ns: int, close: float, volume: float) -> bool:
+        bucket = ts_ns // (15 * NS_PER_MINUTE) if self.timeframe == '15min' else ts_ns
+        if bucket != self._bucket:
+            if self._bucket is not None:
+                self._volumes.append(self._bucket_volume)
+                self._closes.append(self._bucket_close)
+            self._bucket, self._bucket_volume = bucket, 0.0
+        self._bucket_volume += volume
+        self._bucket_close = close
+
+        volumes = len(self._volumes) + 1
+        high_volume = False
+        if volumes >= 10:
+            mean = (sum(self._volumes) + self._bucket_volume) / volumes
+            high_volume = self._bucket_volume > mean * self.volume_multiplier
+        if self.trend_window < 2 or len(self._closes) < self.trend_window - 1:
+            return False
+        prices = list(self._closes)[-(self.trend_window - 1):] + [close]
+        uptrend = all(b >= a for a, b in zip(prices, prices[1:])) and prices[-1] > prices[0]
+        return high_volume and uptrend
+
+    def position_closed(self, bar_index: int):
+        """
+        Notificación de la pasarela: la posición se ha cerrado en la vela bar_index
+        """
+        self.in_position = False
+        self.entry_index = None
+        self._closed_at = bar_index
+
+    def on_bar(self, ts_ns: int, close: float, volume: float):
+        """
+        Procesa una vela cerrada
+
+        Returns:
+            str o None: 'enter', 'time_exit', 'end_of_day' o None
+        """
+        self.index += 1
+        signal = self._signal(ts_ns, close, volume)
+        day = ts_ns // NS_PER_DAY
+        new_day, self.day = day != self.day, day
+        end_of_day = (ts_ns // NS_PER_MINUTE) % MINUTES_PER_DAY >= self.eod_minute
+
+        if self.in_position:
+            # Misma prioridad que el backtest: tiempo antes que fin de día
+            if self.index - self.entry_index >= self.exit_periods:
+                return 'time_exit'
+            if new_day or end_of_day:
+                return 'end_of_day'
+            return None
+        # Tras una salida no se vuelve a entrar en la misma vela
+        if signal and not end_of_day and self._closed_at != self.index:
+            self.in_position = True
+            self.entry_index = self.index
+            return 'enter'
+        return None
+
+
+async def _replay(bars, strategy: LiveVolumeBreakout, capital: float, broker):
+    current = {'index': -1}
+    metrics = MetricsAccumulator(capital)
+
+    def on_bracket_closed(bracket):
+        nonlocal capital
+        if bracket.state == 'closed':
+            capital += bracket.entry.quantity * (bracket.exit_price - bracket.entry_price)
+            trade_return = bracket.exit_price / bracket.entry_price - 1
+            metrics.update_trade(trade_return, trade_return)
+        strategy.position_closed(current['index'])
+
+    gateway = OrderGateway(broker, on_bracket_closed=on_bracket_closed)
+    await gateway.start()
+    open_bracket = None
+    volume = bars.volume if bars.volume is not None else np.zeros(len(bars))
+    for i, (ts_ns, close, vol) in enumerate(zip(bars.timestamps.tolist(), bars.close.tolist(), volume.tolist())):
+        bar_ns = time.perf_counter_ns()
+        current['index'] = i
+        # El broker ejecuta los stops y take profits con el nuevo precio antes de decidir
+        broker.on_price(ts_ns, close)
+        await gateway.flush()
+        if open_bracket is not None and open_bracket.state in ('closed', 'cancelled'):
+            open_bracket = None
+
+        action = strategy.on_bar(ts_ns, close, vol)
+        if action == 'enter':
+            quantity = int(capital // close)
+            if quantity > 0:
+                open_bracket = gateway.submit_bracket(quantity, close * (1 + strategy.stop_loss),
+                                                      close * (1 + strategy.take_profit), bar_ns)
+            else:
+                strategy.position_closed(i)
+        elif action is not None and open_bracket is not None:
+            gateway.close_bracket(open_bracket, action, bar_ns)
+        await gateway.flush()
+        # Equity a precio de mercado al cierre de la vela
+        equity = capital
+        if open_bracket is not None and open_bracket.state == 'open':
+            equity += open_bracket.entry.quantity * (close - open_bracket.entry_price)
+        metrics.update_bar(ts_ns, equity)
+    await gateway.stop()
+    return gateway, capital, metrics
+
+
+def run_paper_session(data, timeframe: str = '5min', strategy_params: dict = None, initial_capital=10000,
+                      broker=None):
+    """
+    Reproduce un histórico vela a vela a través de la pasarela de órdenes
+
+    Args:
+        data: DataFrame o Bars ya limpios
+        timeframe: '5min' o '15min'
+        strategy_params: Parámetros de la estrategia (por defecto VOLUME_STRATEGY_CONFIG)
+        initial_capital: Capital inicial
+        broker: Broker con el protocolo de order_gateway (por defecto MockBroker())
+
+    Returns:
+        tuple: (DataFrame de brackets, resumen de latencias, capital final, métricas de metrics_from_stats
+            calculadas en vivo con MetricsAccumulator)
+    """
+    bars = as_bars(data)
+    params = {name: VOLUME_STRATEGY_CONFIG[name]
+              for name in ('volume_multiplier', 'trend_window', 'exit_periods', 'stop_loss', 'take_profit',
+                           'volume_window')}
+    params.update(strategy_params or {})
+    strategy = LiveVolumeBreakout(timeframe, **params)
+    broker = broker or MockBroker()
+
+    gateway, capital, metrics = asyncio.run(_replay(bars, strategy, initial_capital, broker))
+    brackets = pd.DataFrame([b.to_record() for b in gateway.brackets])
+    for column in ('entry_time', 'exit_time'):
+        if column in brackets:
+            brackets[column] = pd.to_datetime(brackets[column])
+    return brackets, gateway.latency_summary(), capital, metrics.metrics()
+
+
+if __name__ == "__main__":
+    import logging
+    import sys
+
+    from partition_store import load_bars
+
+    # Avisos de la pasarela (reconexiones, eventos desconocidos) con el formato del resto de scripts
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else 2024
+    bars, _ = load_bars(years=[year])
+    for timeframe in ('5min', '15min'):
+        start = time.perf_counter()
+        brackets, latency, capital, metrics = run_paper_session(bars, timeframe)
+        elapsed = time.perf_counter() - start
+        print(f"📡 {timeframe}: {len(bars)} velas en {elapsed:.2f}s ({len(bars) / elapsed:,.0f} velas/s), "
+              f"{len(brackets)} brackets, capital final {capital:,.2f}")
+        print(f"   Latencia vela -> orden (µs): media {latency.get('mean_us', 0):.1f}, "
+              f"p50 {latency.get('p50_us', 0):.1f}, p99 {latency.get('p99_us', 0):.1f}, "
+              f"reconexiones {latency.get('reconnects', 0)}")
+        print(f"   Retorno {metrics['total_return']:.2%}, max drawdown {metrics['max_drawdown']:.2%}, "
+              f"win rate {metrics['win_rate']:.2%}")
@@ -0,0 +1,130 @@
+"""
+Acceso a las particiones anuales de datos (raw_data/, labelled_data/) por bloques
+"""
+import os
+import re
+
+import pandas as pd
+
+from config import DATA_CONFIG
+
+# Nombres de archivo aceptados: 2024_data.csv, 2024_labelled_data.csv, 2000_data_labelled.csv
+_PARTITION_PATTERN = re.compile(r'^(\d{4})_(?:data|labelled_data|data_labelled)\.csv$')
+
+
+def partition_dir(dataset: str = 'raw', symbol: str = None) -> str:
+    """
+    Carpeta de un dataset ('raw' o 'labelled'); si existe una subcarpeta del símbolo se usa esa
+    """
+    base = DATA_CONFIG['raw_data_path'] if dataset == 'raw' else DATA_CONFIG['labelled_data_path']
+    symbol = symbol or DATA_CONFIG['symbol']
+    symbol_dir = os.path.join(base, symbol)
+    return symbol_dir if os.path.isdir(symbol_dir) else base
+
+
+def list_partitions(dataset: str = 'raw', symbol: str = None, years=None):
+    """
+    Particiones anuales disponibles, ordenadas por año
+    
+    Args:
+        dataset: 'raw' o 'labelled'
+        symbol: Símbolo (por defecto DATA_CONFIG['symbol'])
+        years: Iterable opcional de años a incluir
+    
+    Returns:
+        list: [(año, ruta)]
+    """
+    directory = partition_dir(dataset, symbol)
+    if not os.path.isdir(directory):
+        return []
+    partitions = []
+    for name in os.listdir(directory):
+        match = _PARTITION_PATTERN.match(name)
+        if match and (years is None or int(match.group(1)) in years):
+            partitions.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(partitions)
+
+
+def partition_path(year: int, dataset: str = 'raw', symbol: str = None) -> str:
+    """
+    Ruta de la partición de un año: la existente o, si no hay, <año>_data.csv / <año>_labelled_data.csv
+    """
+    existing = dict(list_partitions(dataset, symbol, years=[year]))
+    if year in existing:
+        return existing[year]
+    name = f'{year}_data.csv' if dataset == 'raw' else f'{year}_labelled_data.csv'
+    return os.path.join(partition_dir(dataset, symbol), name)
+
+
+def write_partition(df: pd.DataFrame, year: int, dataset: str = 'labelled', symbol: str = None) -> str:
+    """
+    Escribe la partición de un año de forma atómica (un lector nunca ve un CSV a medias)
+    
+    Returns:
+        str: Ruta escrita
+    """
+    path = partition_path(year, dataset, symbol)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    df.to_csv(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def iter_partition_chunks(paths, chunksize: int = None, columns=None):
+    """
+    Lee las particiones en orden en bloques de tamaño acotado
+    
+    Args:
+        paths: Rutas de las particiones (en orden temporal)
+        chunksize: Filas por bloque (por defecto DATA_CONFIG['chunk_size'])
+        columns: Columnas a leer (por defecto timestamp, close y volume)
+    
+    Yields:
+        DataFrame de como máximo chunksize filas con timestamps ya parseados;
+        las columnas ausentes en la partición se rellenan con NaN (high y low, con el cierre)
+    """
+    chunksize = chunksize or DATA_CONFIG['chunk_size']
+    columns = columns or [DATA_CONFIG['timestamp_column'], DATA_CONFIG['price_column'],
+                          DATA_CONFIG['volume_column']]
+    for path in paths:
+        for chunk in pd.read_csv(path, usecols=lambda c: c in columns, chunksize=chunksize,
+                                 parse_dates=[DATA_CONFIG['timestamp_column']]):
+            # Las particiones antiguas no tienen todas las columnas (p. ej. volumen en 2000-2002)
+            chunk = chunk.reindex(columns=columns)
+            for column in ('high', 'low'):
+                if column in columns:
+                    chunk[column] = chunk[column].fillna(chunk[DATA_CONFIG['price_column']])
+            yield chunk
+
+
+def load_bars(dataset: str = 'raw', symbol: str = None, years=None, session: str = 'trading'):
+    """
+    Carga de una vez las particiones pedidas como un único Bars
+
+    Args:
+        dataset: 'raw' o 'labelled'
+        symbol: Símbolo (por defecto DATA_CONFIG['symbol'])
+        years: Iterable opcional de años a incluir
+        session: Sesión del calendario a conservar ('trading', 'market' o None para todo)
+
+    Returns:
+        tuple: (Bars, [(año, ruta)])
+    """
+    from bars import Bars
+
+    partitions = list_partitions(dataset, symbol, years)
+    if not partitions:
+        raise FileNotFoundError(f"No hay particiones {dataset} para {years or 'ningún año'}")
+    # high y low solo existen en las descargas con máximos y mínimos (p. ej. velas de 1 minuto)
+    columns = (DATA_CONFIG['timestamp_column'], DATA_CONFIG['price_column'], DATA_CONFIG['volume_column'],
+               'high', 'low')
+    df = pd.concat([pd.read_csv(path, usecols=lambda c: c in columns,
+                                parse_dates=[DATA_CONFIG['timestamp_column']])
+                    for _, path in partitions], ignore_index=True)
+    for column in ('high', 'low'):
+        if column in df.columns:
+            # Años sin máximos/mínimos mezclados con años que sí los tienen: se usa el cierre
+            df[column] = df[column].fillna(df[DATA_CONFIG['price_column']])
+    bars = Bars.from_frame(df, clean=True)
+    return (bars.session(session) if session else bars), partitions
@@ -0,0 +1,139 @@
+"""
+Backtesting particionado por días de sesión para estrategias intradía
+
+Las estrategias de volume breakout cierran siempre la posición al final del día,
+así que cada día de sesión es independiente salvo por el capital que se arrastra.
+Las señales y los trades se generan en paralelo por bloques de días (con velas de
+calentamiento para las medias móviles) y la equity se encadena después en una
+única pasada de capitalización con el modelo de costes.
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import BACKTEST_CONFIG, DATA_CONFIG, VOLUME_STRATEGY_CONFIG
+from session_calendar import SessionCalendar
+from bars import Bars, as_bars
+from trading_strategies import EXIT_REASONS, build_signal_frame, volume_breakout_15min_strategy
+from backtesting import (extract_trades, calculate_trade_costs, calculate_equity_curve,
+                         calculate_performance_metrics, default_cost_model)
+
+
+def default_warmup_bars(strategy_func, strategy_params: dict, bar_minutes: int = None) -> int:
+    """
+    Velas de calentamiento necesarias para que las ventanas móviles de la estrategia
+    estén completas al inicio de cada bloque
+
+    Args:
+        strategy_func: Función de estrategia
+        strategy_params: Parámetros de la estrategia
+        bar_minutes: Tamaño de vela de los datos (por defecto DATA_CONFIG['bar_minutes'];
+            los motores pasan el inferido de las velas, Bars.bar_minutes)
+    """
+    bar_minutes = bar_minutes or DATA_CONFIG['bar_minutes']
+    volume_window = strategy_params.get('volume_window', VOLUME_STRATEGY_CONFIG['volume_window'])
+    trend_window = strategy_params.get('trend_window', VOLUME_STRATEGY_CONFIG['trend_window'])
+    # Ventanas expresadas en minutos (volume_breakout_5min_strategy)
+    if strategy_params.get('volume_minutes') is not None:
+        volume_window = math.ceil(strategy_params['volume_minutes'] / bar_minutes)
+    if strategy_params.get('trend_minutes') is not None:
+        trend_window = math.ceil(strategy_params['trend_minutes'] / bar_minutes)
+    # La estrategia de 15 minutos trabaja sobre velas agregadas (3 de 5 minutos o 15 de 1 minuto)
+    bars_per_signal_bar = math.ceil(15 / bar_minutes) if strategy_func is volume_breakout_15min_strategy else 1
+    return (volume_window + trend_window) * bars_per_signal_bar
+
+
+def _day_chunks(calendar: SessionCalendar, days_per_chunk: int, warmup_bars: int):
+    """
+    Bloques (inicio_calentamiento, inicio, fin) en posiciones de vela, alineados a días completos
+    """
+    chunks = []
+    for first_day in range(0, calendar.n_days, days_per_chunk):
+        last_day = min(first_day + days_per_chunk, calendar.n_days) - 1
+        start = int(calendar.day_start[first_day])
+        end = int(calendar.day_end[last_day])
+        # Calentamiento con días completos previos hasta cubrir warmup_bars velas
+        warmup_day = first_day
+        while warmup_day > 0 and start - calendar.day_start[warmup_day] < warmup_bars:
+            warmup_day -= 1
+        chunks.append((int(calendar.day_start[warmup_day]), start, end))
+    return chunks
+
+
+def _run_day_chunk(args):
+    """
+    Ejecuta la estrategia sobre un bloque de días y devuelve sus trades en posiciones globales
+    """
+    strategy_func, strategy_params, chunk_df, warmup_start, start = args
+    results = strategy_func(chunk_df, **strategy_params)
+    trades = extract_trades(results)
+    # Descartar los trades del calentamiento (siempre cerrados dentro de sus días)
+    trades = trades[trades['entry_pos'] >= start - warmup_start]
+    exits = trades['exit_pos'].to_numpy()
+    reason_codes = pd.Index(EXIT_REASONS).get_indexer(trades['exit_reason'].to_numpy())
+    return (trades['entry_pos'].to_numpy() + warmup_start,
+            np.where(exits >= 0, exits + warmup_start, -1),
+            reason_codes.astype(np.int8), trades['exit_price'].to_numpy())
+
+
+def partitioned_backtest(df, strategy_func, strategy_params=None, initial_capital=10000,
+                         cost_model=None, max_workers=None, days_per_chunk=None, warmup_bars=None,
+                         calendar: SessionCalendar = None):
+    """
+    Backtesting por bloques de días en paralelo con encadenado secuencial de la equity
+    
+    Produce los mismos resultados que comprehensive_backtest para estrategias que
+    cierran la posición al final de cada día.
+    
+    Args:
+        df: DataFrame o Bars con datos de trading (ordenado por timestamp)
+        strategy_func: Función de estrategia intradía
+        strategy_params: Parámetros de la estrategia
+        initial_capital: Capital inicial
+        cost_model: Modelo de costes (por defecto, el de comprehensive_backtest)
+        max_workers: Procesos (por defecto BACKTEST_CONFIG['parallel_workers'])
+        days_per_chunk: Días por tarea (por defecto BACKTEST_CONFIG['days_per_chunk'])
+        warmup_bars: Velas de calentamiento (por defecto, según las ventanas de la estrategia)
+        calendar: Calendario de sesiones de df (se construye si no se pasa)
+    
+    Returns:
+        tuple: (results_df, equity_curve, metrics)
+    """
+    strategy_params = strategy_params or {}
+    max_workers = max_workers or BACKTEST_CONFIG['parallel_workers']
+    days_per_chunk = days_per_chunk or BACKTEST_CONFIG['days_per_chunk']
+    
+    if isinstance(df, Bars):
+        # Los cortes de Bars son vistas y sus timestamps ya están validados
+        bars = df
+        rows = df
+    else:
+        df = df.reset_index(drop=True)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        bars = as_bars(df)
+        rows = df.iloc
+    calendar = calendar or bars.calendar
+    if warmup_bars is None:
+        warmup_bars = default_warmup_bars(strategy_func, strategy_params, bars.bar_minutes)
+    
+    tasks = [(strategy_func, strategy_params, rows[warmup_start:end], warmup_start, start)
+             for warmup_start, start, end in _day_chunks(calendar, days_per_chunk, warmup_bars)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        chunk_trades = list(executor.map(_run_day_chunk, tasks))
+    
+    entries = np.concatenate([c[0] for c in chunk_trades]) if chunk_trades else np.empty(0, np.int64)
+    exits = np.concatenate([c[1] for c in chunk_trades]) if chunk_trades else np.empty(0, np.int64)
+    reasons = np.concatenate([c[2] for c in chunk_trades]) if chunk_trades else np.empty(0, np.int8)
+    exit_prices = np.concatenate([c[3] for c in chunk_trades]) if chunk_trades else np.empty(0)
+    results = build_signal_frame(df, entries, exits, reasons, exit_prices=exit_prices)
+    
+    # Encadenado de la equity: una única pasada de capitalización sobre todos los trades
+    cost_model = cost_model or default_cost_model()
+    trade_costs = calculate_trade_costs(extract_trades(results), initial_capital, cost_model)
+    equity_curve = calculate_equity_curve(results, initial_capital, cost_model=cost_model,
+                                          trade_costs=trade_costs)
+    metrics = calculate_performance_metrics(equity_curve, results, trade_costs)
+    
+    return results, equity_curve, metrics
@@ -0,0 +1,147 @@
+"""
+Generación de reportes headless (sin pantalla) para uno o muchos backtests
+"""
+import base64
+import html
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from config import OUTPUT_CONFIG
+from visualization import (create_performance_dashboard, plot_commission_impact,
+                           plot_strategy_performance_comparison)
+
+
+# Métricas mostradas en las tablas de los reportes
+REPORT_METRICS = ['total_return', 'annualized_return', 'sharpe_ratio', 'max_drawdown',
+                  'calmar_ratio', 'win_rate', 'profit_factor', 'total_trades', 'total_commissions']
+
+
+def _use_headless_backend():
+    """
+    Fuerza el backend no interactivo (también en procesos hijos)
+    """
+    if plt.get_backend().lower() != 'agg':
+        plt.switch_backend('Agg')
+
+
+def _slugify(name: str) -> str:
+    """
+    Convierte el nombre de un run en un nombre de carpeta seguro
+    """
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(name)).strip('_') or 'run'
+
+
+def _metrics_table(rows: dict) -> pd.DataFrame:
+    """
+    Tabla de métricas {nombre_run: metrics} con las columnas de REPORT_METRICS
+    """
+    table = pd.DataFrame.from_dict(rows, orient='index')
+    return table[[c for c in REPORT_METRICS if c in table.columns]]
+
+
+def _image_tag(path: str, inline: bool) -> str:
+    if inline:
+        with open(path, 'rb') as f:
+            data = base64.b64encode(f.read()).decode('ascii')
+        return f'<img src="data:image/png;base64,{data}">'
+    return f'<img src="{html.escape(os.path.basename(path))}">'
+
+
+def _write_html(path: str, title: str, body: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+                f'<style>body{{font-family:sans-serif;margin:2em}}img{{max-width:100%}}'
+                f'table{{border-collapse:collapse}}td,th{{border:1px solid #ccc;padding:4px 8px}}</style>'
+                f'</head><body><h1>{html.escape(title)}</h1>\n{body}\n</body></html>\n')
+
+
+def render_run_report(name, results, equity_curve, metrics, output_dir, fmt=None):
+    """
+    Renderiza el dashboard y el impacto de comisiones de un run a disco
+    
+    Args:
+        name: Nombre del run (se usa para la carpeta y el título)
+        results: DataFrame con señales de la estrategia
+        equity_curve: Curva de equity
+        metrics: Métricas del backtesting
+        output_dir: Carpeta raíz de los reportes
+        fmt: 'png' (solo imágenes) o 'html' (página autocontenida con imágenes embebidas)
+    
+    Returns:
+        dict: {'name', 'path' (archivo principal relativo a output_dir), 'metrics'}
+    """
+    _use_headless_backend()
+    fmt = fmt or OUTPUT_CONFIG['report_format']
+    run_dir = os.path.join(output_dir, _slugify(name))
+    os.makedirs(run_dir, exist_ok=True)
+    
+    images = [create_performance_dashboard(equity_curve, results, metrics,
+                                           save_path=os.path.join(run_dir, 'dashboard.png'))]
+    commission_path = plot_commission_impact(metrics, save_path=os.path.join(run_dir, 'commission_impact.png'))
+    if commission_path:
+        images.append(commission_path)
+    
+    if fmt == 'html':
+        table = _metrics_table({name: metrics}).T.to_html(header=False)
+        body = table + '\n' + '\n'.join(_image_tag(p, inline=True) for p in images)
+        main_file = os.path.join(run_dir, 'report.html')
+        _write_html(main_file, f'Reporte: {name}', body)
+        for p in images:
+            os.remove(p)
+    elif fmt == 'png':
+        main_file = images[0]
+    else:
+        raise ValueError(f"Formato de reporte desconocido: {fmt}")
+    
+    return {'name': name, 'path': os.path.relpath(main_file, output_dir), 'metrics': metrics}
+
+
+def _render_run_report_task(args):
+    return render_run_report(*args)
+
+
+def render_batch_reports(runs, output_dir=None, fmt=None, max_workers=None):
+    """
+    Renderiza en paralelo los reportes de muchos runs (barridos, walk-forward...)
+    y genera un index.html con la comparación de estrategias y enlaces a cada run
+    
+    Args:
+        runs: Dict {nombre: (results, equity_curve, metrics)}
+        output_dir: Carpeta de salida (por defecto OUTPUT_CONFIG['reports_path'])
+        fmt: 'png' o 'html' (por defecto OUTPUT_CONFIG['report_format'])
+        max_workers: Procesos a usar (por defecto OUTPUT_CONFIG['report_workers'])
+    
+    Returns:
+        str: Ruta del index.html generado
+    """
+    _use_headless_backend()
+    output_dir = output_dir or OUTPUT_CONFIG['reports_path']
+    fmt = fmt or OUTPUT_CONFIG['report_format']
+    max_workers = max_workers or OUTPUT_CONFIG['report_workers']
+    os.makedirs(output_dir, exist_ok=True)
+    
+    tasks = [(name, results, equity_curve, metrics, output_dir, fmt)
+             for name, (results, equity_curve, metrics) in runs.items()]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_use_headless_backend) as executor:
+        rendered = list(executor.map(_render_run_report_task, tasks))
+    
+    # Comparación de estrategias (formato {nombre: (equity, trades, metrics)})
+    comparison = {name: (equity_curve, results, metrics)
+                  for name, (results, equity_curve, metrics) in runs.items()}
+    plot_strategy_performance_comparison(comparison, save_path=os.path.join(output_dir, 'comparison.png'))
+    
+    table = _metrics_table({r['name']: r['metrics'] for r in rendered})
+    table.insert(0, 'reporte', [f'<a href="{html.escape(r["path"])}">{html.escape(str(r["name"]))}</a>'
+                                for r in rendered])
+    body = (table.to_html(escape=False, index=False, float_format=lambda v: f'{v:.4f}')
+            + '\n<h2>Comparación de estrategias</h2>\n' + _image_tag('comparison.png', inline=False))
+    
+    index_path = os.path.join(output_dir, 'index.html')
+    _write_html(index_path, 'Reportes de backtesting', body)
+    return index_path
@@ -0,0 +1,206 @@
+"""
+Motor de remuestreo multi-timeframe con mapas de índice hijo -> padre
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from session_calendar import NS_PER_MINUTE, MINUTES_PER_DAY, timestamps_to_ns
+
+
+def parse_timeframe(timeframe) -> int:
+    """
+    Convierte un timeframe ('15min', '30min', '1h', 'daily', '1d' o un entero) a minutos
+    """
+    if isinstance(timeframe, (int, np.integer)):
+        minutes = int(timeframe)
+    elif timeframe in ('daily', 'D', '1D', '1d'):
+        minutes = MINUTES_PER_DAY
+    else:
+        match = re.fullmatch(r'(\d+)\s*(min|m|h)', str(timeframe))
+        if not match:
+            raise ValueError(f"Timeframe no soportado: {timeframe}")
+        minutes = int(match.group(1)) * (60 if match.group(2) == 'h' else 1)
+    if minutes <= 0 or (minutes < MINUTES_PER_DAY and MINUTES_PER_DAY % minutes != 0) \
+            or (minutes > MINUTES_PER_DAY):
+        raise ValueError(f"El timeframe debe dividir el día o ser diario: {timeframe}")
+    return minutes
+
+
+class ResampledBars:
+    """
+    Velas agregadas de un timeframe superior
+    
+    Atributos:
+        minutes: Tamaño del timeframe en minutos
+        timestamps: Inicio de cada vela agregada (int64 ns)
+        open, high, low, close, volume: Agregados OHLCV
+        count: Número de velas hijas por vela agregada
+        parent_index: Para cada vela hija, posición de su vela agregada
+        first_child: Posición de la primera vela hija de cada vela agregada
+    """
+    
+    def __init__(self, minutes, timestamps, open_, high, low, close, volume, count, parent_index):
+        self.minutes = minutes
+        self.timestamps = timestamps
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.count = count
+        self.parent_index = parent_index
+        self.first_child = np.concatenate(([0], np.cumsum(count)[:-1])).astype(np.int64)
+    
+    def __len__(self):
+        return len(self.timestamps)
+    
+    def to_child(self, parent_values: np.ndarray) -> np.ndarray:
+        """
+        Proyecta un array por vela agregada sobre las velas hijas
+        """
+        return np.asarray(parent_values)[self.parent_index]
+    
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'timestamp': self.timestamps.view('datetime64[ns]'),
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume': self.volume
+        })
+
+
+def resample_bars(timestamps, close, volume, timeframe, high=None, low=None) -> ResampledBars:
+    """
+    Agrega velas ordenadas a cualquier múltiplo de minutos (15m, 30m, 1h, diario)
+    
+    Los cubos se alinean a medianoche; solo se generan cubos con al menos una vela,
+    igual que resample(...).dropna() en pandas.
+    
+    Args:
+        timestamps: Timestamps de las velas hijas (ordenados)
+        close: Precios de cierre
+        volume: Volúmenes
+        timeframe: Timeframe destino ('15min', '1h', 'daily', minutos...)
+        high, low: Extremos de cada vela hija (por defecto, el cierre)
+    
+    Returns:
+        ResampledBars con los agregados y el mapa hijo -> padre
+    """
+    minutes = parse_timeframe(timeframe)
+    ts = timestamps_to_ns(timestamps)
+    close = np.asarray(close, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    high = close if high is None else np.asarray(high, dtype=np.float64)
+    low = close if low is None else np.asarray(low, dtype=np.float64)
+    
+    bucket = ts // (minutes * NS_PER_MINUTE)
+    if len(bucket) == 0:
+        empty = np.empty(0)
+        return ResampledBars(minutes, np.empty(0, np.int64), empty, empty, empty, empty, empty,
+                             np.empty(0, np.int64), np.empty(0, np.int64))
+    
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+    ends = np.append(starts[1:], len(bucket))
+    count = ends - starts
+    parent_index = np.repeat(np.arange(len(starts)), count)
+    
+    return ResampledBars(
+        minutes,
+        bucket[starts] * minutes * NS_PER_MINUTE,
+        close[starts],
+        np.maximum.reduceat(high, starts),
+        np.minimum.reduceat(low, starts),
+        close[ends - 1],
+        np.add.reduceat(volume, starts),
+        count,
+        parent_index
+    )
+
+
+def _concat_resampled(head: ResampledBars, tail: ResampledBars, child_offset: int,
+                      parent_offset: int) -> ResampledBars:
+    """
+    Une velas agregadas ya calculadas con las recalculadas a partir de parent_offset
+    """
+    return ResampledBars(
+        head.minutes,
+        np.concatenate((head.timestamps[:parent_offset], tail.timestamps)),
+        np.concatenate((head.open[:parent_offset], tail.open)),
+        np.concatenate((head.high[:parent_offset], tail.high)),
+        np.concatenate((head.low[:parent_offset], tail.low)),
+        np.concatenate((head.close[:parent_offset], tail.close)),
+        np.concatenate((head.volume[:parent_offset], tail.volume)),
+        np.concatenate((head.count[:parent_offset], tail.count)),
+        np.concatenate((head.parent_index[:child_offset], tail.parent_index + parent_offset))
+    )
+
+
+class ResamplingCache:
+    """
+    Caché de remuestreos para una partición de datos
+    
+    Cada timeframe se calcula una sola vez; al añadir velas nuevas solo se
+    recalcula la última vela agregada (que podía estar incompleta) y las nuevas.
+    """
+    
+    def __init__(self, timestamps, close, volume, high=None, low=None):
+        self.timestamps = timestamps_to_ns(timestamps)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.float64)
+        self.high = None if high is None else np.asarray(high, dtype=np.float64)
+        self.low = None if low is None else np.asarray(low, dtype=np.float64)
+        self._cache = {}
+    
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        return cls(df['timestamp'], df['close'], df['volume'],
+                   df['high'] if 'high' in df.columns else None,
+                   df['low'] if 'low' in df.columns else None)
+    
+    def __len__(self):
+        return len(self.timestamps)
+    
+    def get(self, timeframe) -> ResampledBars:
+        """
+        Velas agregadas para el timeframe pedido (calculadas una sola vez)
+        """
+        minutes = parse_timeframe(timeframe)
+        if minutes not in self._cache:
+            self._cache[minutes] = resample_bars(self.timestamps, self.close, self.volume, minutes,
+                                                 self.high, self.low)
+        return self._cache[minutes]
+    
+    def append(self, timestamps, close, volume, high=None, low=None):
+        """
+        Añade velas nuevas (posteriores a las existentes) y actualiza los timeframes cacheados
+        """
+        timestamps = timestamps_to_ns(timestamps)
+        if len(timestamps) == 0:
+            return
+        if len(self.timestamps) and timestamps[0] < self.timestamps[-1]:
+            raise ValueError("Las velas añadidas deben ser posteriores a las existentes")
+        
+        close = np.asarray(close, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        if self.high is not None:
+            high = close if high is None else np.asarray(high, dtype=np.float64)
+            low = close if low is None else np.asarray(low, dtype=np.float64)
+            self.high = np.concatenate((self.high, high))
+            self.low = np.concatenate((self.low, low))
+        self.timestamps = np.concatenate((self.timestamps, timestamps))
+        self.close = np.concatenate((self.close, close))
+        self.volume = np.concatenate((self.volume, volume))
+        
+        for minutes, bars in self._cache.items():
+            # Recalcular desde la primera vela hija del último cubo (podía estar incompleto)
+            parent_offset = max(len(bars) - 1, 0)
+            child_offset = int(bars.first_child[parent_offset]) if len(bars) else 0
+            tail = resample_bars(self.timestamps[child_offset:], self.close[child_offset:],
+                                 self.volume[child_offset:], minutes,
+                                 None if self.high is None else self.high[child_offset:],
+                                 None if self.low is None else self.low[child_offset:])
+            self._cache[minutes] = _concat_resampled(bars, tail, child_offset, parent_offset)
@@ -0,0 +1,290 @@
+"""
+Almacén append-only de runs de backtesting
+
+Cada run guardado se compone de:
+    - una fila en un índice SQLite (parámetros, versión de los datos, métricas y
+      las métricas principales como columnas indexadas para filtrar rápido),
+    - un .npz comprimido por run con sus tablas en formato columnar (un array por
+      columna): trades, equity y, opcionalmente, las señales de la estrategia.
+
+Listar y filtrar miles de runs solo consulta el índice, y la equity de un run se
+lee sin tocar los demás (ni sus otras tablas: los miembros del .npz se leen bajo demanda).
+Los runs nunca se sobrescriben: cada guardado añade un run_id nuevo.
+"""
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import uuid
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from config import OUTPUT_CONFIG
+
+_STORE_VERSION = 1
+
+# Métricas con columna propia (e índice) en la tabla de runs
+INDEXED_METRICS = ['total_return', 'annualized_return', 'sharpe_ratio', 'max_drawdown', 'calmar_ratio',
+                   'win_rate', 'profit_factor', 'total_trades', 'total_commissions']
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    strategy TEXT,
+    data_version TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    params TEXT NOT NULL,
+    metrics TEXT NOT NULL,
+    tables TEXT NOT NULL,
+    {', '.join(f'{name} REAL' for name in INDEXED_METRICS)}
+);
+CREATE INDEX IF NOT EXISTS runs_name ON runs (name);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at);
+CREATE INDEX IF NOT EXISTS runs_period ON runs (start_date, end_date);
+{''.join(f'CREATE INDEX IF NOT EXISTS runs_{name} ON runs ({name});' for name in INDEXED_METRICS)}
+"""
+
+
+def data_version(data) -> str:
+    """
+    Huella corta de los datos de un backtest
+
+    Args:
+        data: Bars (se resumen timestamps y cierres) o lista de rutas de particiones (tamaño y fecha de modificación)
+    """
+    digest = hashlib.sha1()
+    if isinstance(data, (list, tuple)):
+        for path in data:
+            stat = os.stat(path)
+            digest.update(f'{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    else:
+        digest.update(np.ascontiguousarray(data.timestamps, dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(data.close, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def trade_ledger(results: pd.DataFrame, initial_capital, cost_model) -> pd.DataFrame:
+    """
+    Trades cerrados con sus costes (las columnas del trades.csv del backtest por streaming)
+    """
+    from backtesting import extract_trades, calculate_trade_costs
+
+    trades = extract_trades(results)
+    trade_costs = calculate_trade_costs(trades, initial_capital, cost_model)
+    closed = trades.loc[trade_costs.index].drop(columns=['entry_pos', 'exit_pos'])
+    return pd.concat([closed, trade_costs.drop(columns=closed.columns, errors='ignore')],
+                     axis=1).reset_index(drop=True)
+
+
+def _frame_to_arrays(table: str, df: pd.DataFrame) -> dict:
+    """
+    Columnas de un DataFrame como arrays del .npz ('<tabla>/<columna>') más su esquema
+    """
+    arrays, schema = {}, []
+    for i, column in enumerate(df.columns):
+        values = df.iloc[:, i]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            kind, array = 'datetime', values.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        elif pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+            kind, array = 'numeric', values.to_numpy()
+        else:
+            kind, array = 'text', values.astype(str).to_numpy(dtype=str)
+        arrays[f'{table}/{i}'] = array
+        schema.append([str(column), kind])
+    arrays[f'{table}/__schema__'] = np.array(json.dumps(schema))
+    return arrays
+
+
+def _arrays_to_frame(data, table: str) -> pd.DataFrame:
+    schema = json.loads(str(data[f'{table}/__schema__']))
+    columns = {}
+    for i, (column, kind) in enumerate(schema):
+        array = data[f'{table}/{i}']
+        columns[column] = array.view('datetime64[ns]') if kind == 'datetime' else array
+    return pd.DataFrame(columns, columns=[column for column, _ in schema])
+
+
+def _finite(value):
+    """
+    Valor numérico para las columnas indexadas (None si no es un número finito)
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if np.isfinite(value) else None
+
+
+def _iso(value) -> str:
+    return None if value is None or pd.isna(value) else pd.Timestamp(value).isoformat()
+
+
+class ResultsStore:
+    """
+    Índice SQLite + un .npz columnar por run
+
+    Args:
+        path: Carpeta del almacén (por defecto OUTPUT_CONFIG['store_path'])
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or OUTPUT_CONFIG['store_path']
+        self.runs_dir = os.path.join(self.path, 'runs')
+        os.makedirs(self.runs_dir, exist_ok=True)
+        self.index_path = os.path.join(self.path, 'index.sqlite')
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def run_path(self, run_id: str) -> str:
+        return os.path.join(self.runs_dir, f'{run_id}.npz')
+
+    def append(self, name: str, params: dict, metrics: dict, equity_curve: pd.DataFrame = None,
+               trades: pd.DataFrame = None, results: pd.DataFrame = None, strategy: str = None,
+               data_version: str = None, start_date=None, end_date=None) -> str:
+        """
+        Guarda un run nuevo
+
+        Args:
+            name: Nombre del run (puede repetirse entre guardados)
+            params: Parámetros de la estrategia
+            metrics: Métricas del backtesting
+            equity_curve, trades, results: Tablas a guardar (las que se omitan no se guardan)
+            strategy: Nombre de la estrategia
+            data_version: Huella de los datos (ver data_version())
+            start_date, end_date: Período del backtest (por defecto, el de la equity)
+
+        Returns:
+            str: run_id asignado
+        """
+        created_at = datetime.datetime.now()
+        run_id = f'{created_at:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+        if equity_curve is not None and len(equity_curve):
+            start_date = start_date if start_date is not None else equity_curve['timestamp'].iloc[0]
+            end_date = end_date if end_date is not None else equity_curve['timestamp'].iloc[-1]
+
+        tables = {'equity': equity_curve, 'trades': trades, 'results': results}
+        tables = {table: df for table, df in tables.items() if df is not None}
+        if tables:
+            arrays = {'__version__': np.array(_STORE_VERSION)}
+            for table, df in tables.items():
+                arrays.update(_frame_to_arrays(table, df))
+            # Escritura atómica antes de registrar el run en el índice
+            tmp_path = self.run_path(run_id) + '.tmp.npz'
+            np.savez_compressed(tmp_path, **arrays)
+            os.replace(tmp_path, self.run_path(run_id))
+
+        row = {'run_id': run_id, 'name': name, 'created_at': created_at.isoformat(), 'strategy': strategy,
+               'data_version': data_version, 'start_date': _iso(start_date), 'end_date': _iso(end_date),
+               'params': json.dumps(params, default=str), 'metrics': json.dumps(metrics, default=float),
+               'tables': json.dumps(list(tables)),
+               **{metric: _finite(metrics.get(metric)) for metric in INDEXED_METRICS}}
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"INSERT INTO runs ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                         list(row.values()))
+        return run_id
+
+    def list_runs(self, name: str = None, strategy: str = None, data_version: str = None, start=None,
+                  end=None, min_metrics: dict = None, max_metrics: dict = None, order_by: str = 'created_at',
+                  descending: bool = True, limit: int = None) -> pd.DataFrame:
+        """
+        Runs del índice que cumplen los filtros (sin leer ningún .npz)
+
+        Args:
+            name, strategy, data_version: Igualdad exacta
+            start, end: Solo runs cuyo período está dentro de [start, end]
+            min_metrics, max_metrics: Cotas sobre INDEXED_METRICS, p. ej. {'sharpe_ratio': 1}
+            order_by: Columna de ordenación (created_at, start_date o una de INDEXED_METRICS)
+            limit: Número máximo de runs
+
+        Returns:
+            DataFrame con una fila por run (params y metrics como dicts)
+        """
+        clauses, values = [], []
+        for column, value in (('name', name), ('strategy', strategy), ('data_version', data_version)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                values.append(value)
+        if start is not None:
+            clauses.append('start_date >= ?')
+            values.append(_iso(start))
+        if end is not None:
+            clauses.append('end_date <= ?')
+            values.append(_iso(end))
+        for bounds, operator in ((min_metrics, '>='), (max_metrics, '<=')):
+            for metric, value in (bounds or {}).items():
+                if metric not in INDEXED_METRICS:
+                    raise ValueError(f"Métrica no indexada: {metric}. Opciones: {INDEXED_METRICS}")
+                clauses.append(f'{metric} {operator} ?')
+                values.append(float(value))
+        if order_by not in ('created_at', 'start_date', 'end_date', 'name', *INDEXED_METRICS):
+            raise ValueError(f"No se puede ordenar por {order_by}")
+
+        query = 'SELECT * FROM runs'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
+        with closing(self._connect()) as conn, conn:
+            rows = [dict(row) for row in conn.execute(query, values)]
+
+        runs = pd.DataFrame(rows, columns=['run_id', 'name', 'created_at', 'strategy', 'data_version',
+                                           'start_date', 'end_date', 'params', 'metrics', 'tables',
+                                           *INDEXED_METRICS])
+        for column in ('params', 'metrics', 'tables'):
+            runs[column] = runs[column].map(json.loads)
+        for column in ('created_at', 'start_date', 'end_date'):
+            runs[column] = pd.to_datetime(runs[column])
+        return runs
+
+    def get_run(self, run_id: str) -> dict:
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute('SELECT * FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Run no encontrado: {run_id}")
+        run = dict(row)
+        for column in ('params', 'metrics', 'tables'):
+            run[column] = json.loads(run[column])
+        return run
+
+    def load_table(self, run_id: str, table: str = 'equity') -> pd.DataFrame:
+        """
+        Una tabla ('equity', 'trades' o 'results') de un run, sin leer las demás
+        """
+        path = self.run_path(run_id)
+        if not os.path.exists(path):
+            raise KeyError(f"El run {run_id} no tiene tablas guardadas")
+        with np.load(path) as data:
+            if int(data['__version__']) != _STORE_VERSION:
+                raise ValueError(f"Versión del almacén no soportada en {path}")
+            if f'{table}/__schema__' not in data.files:
+                raise KeyError(f"El run {run_id} no tiene la tabla '{table}'")
+            return _arrays_to_frame(data, table)
+
+    def load_run(self, run_id: str) -> tuple:
+        """
+        Returns:
+            tuple: (results, equity_curve, metrics) en el formato de comprehensive_backtest
+        """
+        run = self.get_run(run_id)
+        return self.load_table(run_id, 'results'), self.load_table(run_id, 'equity'), run['metrics']
+
+
+if __name__ == '__main__':
+    store = ResultsStore()
+    runs = store.list_runs()
+    print(f"🗄️  {len(runs)} runs en {store.path}")
+    if len(runs):
+        print(runs[['run_id', 'name', 'strategy', 'start_date', 'end_date', 'total_return', 'sharpe_ratio',
+                    'max_drawdown', 'total_trades']].to_string(index=False))
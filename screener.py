@@ -0,0 +1,198 @@
+"""
+Screener en tiempo real de la condición high_volume & uptrend sobre cientos de símbolos
+
+Es la versión vectorizada por símbolos de LiveVolumeBreakout._signal (paper_trading):
+el estado de todos los símbolos vive en arrays (volúmenes y cierres de los bloques
+anteriores en buffers circulares, más el bloque en curso) y cada vela nueva actualiza
+a la vez todos los símbolos que cotizan en ese instante, devolviendo solo los que
+disparan. Igual que en vivo, en 15 minutos se evalúa el bloque parcial en curso: en
+la última vela de cada bloque la señal coincide con la de volume_breakout_15min_strategy.
+"""
+import time
+
+import numpy as np
+
+from config import SCREENER_CONFIG, VOLUME_STRATEGY_CONFIG
+from resampling import parse_timeframe
+from session_calendar import NS_PER_MINUTE
+
+
+class VolumeBreakoutScreener:
+    """
+    Estado compacto por símbolo de la condición de volume breakout
+
+    Args:
+        symbols: Universo de símbolos (el orden define su índice)
+        timeframe: Bloque de agregación ('15min', '5min'...; por defecto SCREENER_CONFIG)
+        volume_multiplier, trend_window: Parámetros de la estrategia (por defecto VOLUME_STRATEGY_CONFIG)
+        volume_window, min_periods: Bloques de la media de volumen (por defecto SCREENER_CONFIG)
+    """
+
+    def __init__(self, symbols, timeframe: str = None, volume_multiplier: float = None, trend_window: int = None,
+                 volume_window: int = None, min_periods: int = None):
+        self.symbols = np.asarray(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols.tolist())}
+        self.bucket_ns = parse_timeframe(timeframe or SCREENER_CONFIG['timeframe']) * NS_PER_MINUTE
+        self.volume_multiplier = volume_multiplier or VOLUME_STRATEGY_CONFIG['volume_multiplier']
+        self.trend_window = trend_window or VOLUME_STRATEGY_CONFIG['trend_window']
+        volume_window = volume_window or SCREENER_CONFIG['volume_window']
+        self.min_periods = min_periods or SCREENER_CONFIG['min_periods']
+        if volume_window < 2:
+            raise ValueError("volume_window debe ser al menos 2")
+
+        n = len(self.symbols)
+        # Bloques anteriores al actual: buffers circulares (símbolo, posición)
+        self.volumes = np.zeros((n, volume_window - 1))
+        self.volume_count = np.zeros(n, dtype=np.int32)
+        self.volume_pos = np.zeros(n, dtype=np.int32)
+        self.closes = np.zeros((n, max(self.trend_window - 1, 1)))
+        self.close_count = np.zeros(n, dtype=np.int32)
+        self.close_pos = np.zeros(n, dtype=np.int32)
+        # Bloque en curso
+        self.bucket = np.full(n, -1, dtype=np.int64)
+        self.bucket_volume = np.zeros(n)
+        self.bucket_close = np.full(n, np.nan)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.volumes, self.volume_count, self.volume_pos, self.closes,
+                                              self.close_count, self.close_pos, self.bucket, self.bucket_volume,
+                                              self.bucket_close))
+
+    def symbol_index(self, symbols) -> np.ndarray:
+        """
+        Índices de unos símbolos del universo (resolver una vez y reutilizar en update_indices)
+        """
+        return np.array([self.index[symbol] for symbol in symbols], dtype=np.int64)
+
+    def update(self, timestamp_ns: int, symbols, close, volume) -> np.ndarray:
+        """
+        Procesa la vela cerrada en timestamp_ns de varios símbolos
+
+        Returns:
+            array: Símbolos que cumplen high_volume & uptrend
+        """
+        return self.symbols[self.update_indices(timestamp_ns, self.symbol_index(symbols), close, volume)]
+
+    def update_indices(self, timestamp_ns: int, rows, close, volume) -> np.ndarray:
+        """
+        Como update, con los índices de los símbolos (cada símbolo una vez como mucho)
+
+        Returns:
+            array: Índices de los símbolos que disparan
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        close = np.asarray(close, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        bucket = timestamp_ns // self.bucket_ns
+
+        # Los símbolos que empiezan bloque guardan el anterior en sus buffers
+        new = self.bucket[rows] != bucket
+        if new.any():
+            closing = rows[new & (self.bucket[rows] >= 0)]
+            if len(closing):
+                self._push(self.volumes, self.volume_count, self.volume_pos, closing, self.bucket_volume[closing])
+                if self.trend_window >= 2:
+                    self._push(self.closes, self.close_count, self.close_pos, closing, self.bucket_close[closing])
+            opened = rows[new]
+            self.bucket[opened] = bucket
+            self.bucket_volume[opened] = 0.0
+        self.bucket_volume[rows] += volume
+        self.bucket_close[rows] = close
+
+        # Volumen del bloque frente a la media de los anteriores y el actual
+        bucket_volume = self.bucket_volume[rows]
+        volumes = self.volume_count[rows] + 1
+        mean = (self.volumes[rows].sum(axis=1) + bucket_volume) / volumes
+        fire = (volumes >= self.min_periods) & (bucket_volume > mean * self.volume_multiplier)
+        if self.trend_window < 2:
+            return rows[np.zeros(len(rows), dtype=bool)]
+
+        # Tendencia: cierres de los trend_window - 1 bloques anteriores (del más antiguo al más reciente) y el actual
+        candidates = rows[fire]
+        width = self.trend_window - 1
+        order = (self.close_pos[candidates, None] + np.arange(width)) % width
+        prices = np.hstack((np.take_along_axis(self.closes[candidates], order, axis=1), close[fire, None]))
+        uptrend = (self.close_count[candidates] >= width) & np.all(np.diff(prices, axis=1) >= 0, axis=1) \
+            & (prices[:, -1] > prices[:, 0])
+        return candidates[uptrend]
+
+    @staticmethod
+    def _push(buffer, count, pos, rows, values):
+        buffer[rows, pos[rows]] = values
+        pos[rows] = (pos[rows] + 1) % buffer.shape[1]
+        count[rows] = np.minimum(count[rows] + 1, buffer.shape[1])
+
+
+def replay_from_bars(bars_by_symbol: dict) -> tuple:
+    """
+    Réplica grabada de varios símbolos ordenada por instante
+
+    Args:
+        bars_by_symbol: {símbolo: Bars}
+
+    Returns:
+        tuple: (símbolos, timestamps únicos, inicio de cada instante en los arrays,
+                índice de símbolo, cierre y volumen de cada vela en orden temporal)
+    """
+    symbols = list(bars_by_symbol)
+    timestamps = np.concatenate([bars.timestamps for bars in bars_by_symbol.values()])
+    rows = np.concatenate([np.full(len(bars), i) for i, bars in enumerate(bars_by_symbol.values())])
+    close = np.concatenate([bars.close for bars in bars_by_symbol.values()])
+    volume = np.concatenate([bars.volume for bars in bars_by_symbol.values()])
+    order = np.argsort(timestamps, kind='stable')
+    timestamps, rows, close, volume = timestamps[order], rows[order], close[order], volume[order]
+    starts = np.flatnonzero(np.concatenate(([True], timestamps[1:] != timestamps[:-1])))
+    return symbols, timestamps[starts], np.append(starts, len(timestamps)), rows, close, volume
+
+
+def recorded_replay(n_symbols: int = None, years=None) -> tuple:
+    """
+    Réplica de n_symbols construida con las velas grabadas del símbolo por defecto
+
+    Cada símbolo repite el calendario y los precios grabados (escalados) con el volumen
+    desplazado un número distinto de velas, de modo que los disparos no coinciden.
+    """
+    from bars import Bars
+    from partition_store import load_bars
+
+    bars, _ = load_bars(years=years)
+    n_symbols = n_symbols or SCREENER_CONFIG['replay_symbols']
+    volume = np.nan_to_num(bars.volume)
+    replay = {f'S{i:04d}': Bars(bars.timestamps, bars.close * (1 + 0.01 * i), np.roll(volume, 37 * i),
+                                validate=False) for i in range(n_symbols)}
+    return replay_from_bars(replay)
+
+
+def benchmark_replay(replay: tuple, **params) -> dict:
+    """
+    Recorre una réplica con el screener y mide el rendimiento
+
+    Returns:
+        dict: instantes, actualizaciones de símbolo, disparos, segundos, símbolos por segundo,
+        latencia media por instante (µs) y memoria del estado
+    """
+    symbols, timestamps, starts, rows, close, volume = replay
+    screener = VolumeBreakoutScreener(symbols, **params)
+    fired = 0
+    start = time.perf_counter()
+    for i, ts in enumerate(timestamps.tolist()):
+        lo, hi = starts[i], starts[i + 1]
+        fired += len(screener.update_indices(ts, rows[lo:hi], close[lo:hi], volume[lo:hi]))
+    elapsed = time.perf_counter() - start
+    return {'timestamps': len(timestamps), 'updates': len(rows), 'fired': fired, 'seconds': elapsed,
+            'symbols_per_second': len(rows) / elapsed, 'us_per_timestamp': elapsed / len(timestamps) * 1e6,
+            'state_bytes': screener.nbytes}
+
+
+if __name__ == '__main__':
+    import sys
+
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    replay = recorded_replay(n_symbols, years=[2024])
+    result = benchmark_replay(replay)
+    print(f"📡 Screener sobre {len(replay[0])} símbolos y {result['timestamps']} velas")
+    print(f"   • Disparos: {result['fired']}")
+    print(f"   • Rendimiento: {result['symbols_per_second']:,.0f} símbolos/s "
+          f"({result['us_per_timestamp']:.0f} µs por vela)")
+    print(f"   • Estado: {result['state_bytes'] / 1024:.0f} KB")
@@ -0,0 +1,150 @@
+"""
+Calendario de sesiones de trading precalculado por partición de datos
+"""
+import numpy as np
+import pandas as pd
+
+from config import SESSION_CONFIG
+
+NS_PER_MINUTE = 60 * 1_000_000_000
+MINUTES_PER_DAY = 24 * 60
+
+
+def to_minutes(hhmm: str) -> int:
+    """
+    Convierte 'HH:MM' en minutos desde medianoche
+    """
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def timestamps_to_ns(timestamps) -> np.ndarray:
+    """
+    Convierte timestamps (Series, DatetimeIndex o array) a int64 en nanosegundos
+    """
+    if isinstance(timestamps, np.ndarray) and timestamps.dtype == np.int64:
+        return timestamps
+    if isinstance(timestamps, (pd.Series, pd.Index, np.ndarray)) and timestamps.dtype == 'datetime64[ns]':
+        # Ya parseados: vista int64 sin volver a convertir
+        return np.asarray(timestamps).view('int64')
+    return pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def session_mask(timestamps, start: str, end: str) -> np.ndarray:
+    """
+    Máscara de velas con hora en [start, end); no requiere timestamps ordenados
+    """
+    minute_of_day = (timestamps_to_ns(timestamps) // NS_PER_MINUTE) % MINUTES_PER_DAY
+    return (minute_of_day >= to_minutes(start)) & (minute_of_day < to_minutes(end))
+
+
+class SessionCalendar:
+    """
+    Índice de sesiones construido una sola vez a partir de los timestamps de una partición
+    
+    Todas las consultas de sesión (filtrado de horario, agregaciones diarias y
+    salidas al final del día) se resuelven como búsquedas sobre arrays.
+    
+    Atributos:
+        timestamps: int64 en ns de cada vela
+        minute_of_day: Minuto del día de cada vela (0-1439)
+        day_id: Índice del día de sesión de cada vela (0..n_days-1)
+        days: Fecha (datetime64[D]) de cada día de sesión
+        day_start, day_end: Posiciones [inicio, fin) de cada día en las velas
+        trading_mask: Velas dentro de SESSION_CONFIG['trading_hours']
+        market_mask: Velas dentro de SESSION_CONFIG['market_hours']
+        end_of_day: Velas en las que hay que cerrar la posición (>= 'end_of_day' o última del día)
+        can_enter: Velas en las que se permite abrir posición
+    """
+    
+    def __init__(self, timestamps, session_config: dict = None):
+        config = session_config or SESSION_CONFIG
+        self.timestamps = timestamps_to_ns(timestamps)
+        if len(self.timestamps) > 1 and np.any(np.diff(self.timestamps) < 0):
+            raise ValueError("Los timestamps deben estar ordenados para construir el calendario")
+        
+        minutes = self.timestamps // NS_PER_MINUTE
+        self.minute_of_day = (minutes % MINUTES_PER_DAY).astype(np.int16)
+        day_number = minutes // MINUTES_PER_DAY
+        
+        # Límites de cada día: las velas de un mismo día son contiguas
+        n = len(day_number)
+        day_change = np.flatnonzero(np.diff(day_number)) + 1
+        self.day_start = np.concatenate(([0], day_change)).astype(np.int64) if n else np.empty(0, np.int64)
+        self.day_end = np.concatenate((day_change, [n])).astype(np.int64) if n else np.empty(0, np.int64)
+        self.days = day_number[self.day_start].astype('datetime64[D]')
+        self.day_id = np.repeat(np.arange(len(self.day_start)), self.day_end - self.day_start)
+        
+        self.trading_mask = self.session_mask(*config['trading_hours'])
+        self.market_mask = self.session_mask(*config['market_hours'])
+        
+        eod_minute = to_minutes(config['end_of_day'])
+        last_of_day = np.zeros(n, dtype=bool)
+        last_of_day[self.day_end - 1] = True
+        self.end_of_day = (self.minute_of_day >= eod_minute) | last_of_day
+        self.can_enter = (self.minute_of_day < eod_minute) & ~last_of_day
+    
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, timestamp_column: str = 'timestamp', session_config: dict = None):
+        return cls(df[timestamp_column], session_config)
+    
+    def __len__(self):
+        return len(self.timestamps)
+    
+    @property
+    def n_days(self) -> int:
+        return len(self.day_start)
+    
+    def session_mask(self, start: str, end: str) -> np.ndarray:
+        """
+        Máscara de velas con hora en [start, end)
+        """
+        return (self.minute_of_day >= to_minutes(start)) & (self.minute_of_day < to_minutes(end))
+    
+    def daily_ohlc(self, values, mask: np.ndarray = None) -> pd.DataFrame:
+        """
+        Agregación diaria (open, high, low, close, mean, count) en una sola reducción agrupada
+        
+        Args:
+            values: Valores por vela (por ejemplo, precios de cierre)
+            mask: Máscara opcional de velas a incluir (por ejemplo, market_mask)
+        
+        Returns:
+            DataFrame indexado por fecha ('date') con una fila por día con datos
+        """
+        values = np.asarray(values, dtype=np.float64)
+        day_id = self.day_id
+        if mask is not None:
+            values = values[mask]
+            day_id = day_id[mask]
+        if len(values) == 0:
+            return pd.DataFrame(columns=['open', 'high', 'low', 'close', 'mean', 'count'],
+                                index=pd.Index([], name='date'))
+        
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(day_id)) + 1))
+        ends = np.append(starts[1:], len(values))
+        counts = ends - starts
+        daily = pd.DataFrame({
+            'open': values[starts],
+            'high': np.maximum.reduceat(values, starts),
+            'low': np.minimum.reduceat(values, starts),
+            'close': values[ends - 1],
+            'mean': np.add.reduceat(values, starts) / counts,
+            'count': counts
+        }, index=pd.Index(self.days[day_id[starts]].astype(object), name='date'))
+        return daily
+    
+    def daily_volatility(self, close, mask: np.ndarray = None) -> pd.Series:
+        """
+        Volatilidad diaria: (máximo - mínimo) / media del cierre en cada día
+        
+        Por defecto se usa el horario de mercado nominal (market_mask).
+        """
+        daily = self.daily_ohlc(close, self.market_mask if mask is None else mask)
+        return ((daily['high'] - daily['low']) / daily['mean']).rename('close')
+    
+    def day_slice(self, day_index: int) -> slice:
+        """
+        Slice posicional de las velas de un día de sesión
+        """
+        return slice(int(self.day_start[day_index]), int(self.day_end[day_index]))
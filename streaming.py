@@ -0,0 +1,160 @@
+"""
+Backtesting por streaming (out-of-core) sobre todo el histórico particionado
+
+Las particiones se leen en bloques de tamaño acotado. Entre bloques se arrastra:
+    - la cola de velas necesaria para las ventanas móviles (días completos),
+    - el último día de sesión aún incompleto (con la posible posición abierta),
+    - el capital, el volumen mensual de acciones y los agregados de las métricas.
+Los trades y la equity se escriben a disco de forma incremental, así que la
+memoria máxima no depende de la longitud del histórico.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_CONFIG, OUTPUT_CONFIG
+from cost_model import CostModel
+from partition_store import list_partitions, iter_partition_chunks
+from partitioned_backtest import default_warmup_bars
+from session_calendar import NS_PER_MINUTE, MINUTES_PER_DAY, timestamps_to_ns
+from utils import clean_noisy_data
+from backtesting import extract_trades, calculate_trade_costs, calculate_equity_curve, default_cost_model
+from accumulators import MetricsAccumulator
+from bars import as_bars
+
+NS_PER_DAY = NS_PER_MINUTE * MINUTES_PER_DAY
+
+
+def _last_day_start(timestamps: np.ndarray) -> int:
+    """
+    Posición de la primera vela del último día presente en los timestamps
+    """
+    days = timestamps // NS_PER_DAY
+    return int(np.searchsorted(days, days[-1], side='left'))
+
+
+def _warmup_tail(segment: pd.DataFrame, warmup_bars: int) -> pd.DataFrame:
+    """
+    Últimos días completos del segmento que cubren al menos warmup_bars velas
+    """
+    if warmup_bars <= 0 or len(segment) == 0:
+        return segment.iloc[:0]
+    days = timestamps_to_ns(segment['timestamp']) // NS_PER_DAY
+    first_day = days[max(len(days) - warmup_bars, 0)]
+    return segment.iloc[int(np.searchsorted(days, first_day, side='left')):]
+
+
+class _StreamingState:
+    """
+    Estado arrastrado entre bloques del backtest por streaming
+    """
+    
+    def __init__(self, initial_capital):
+        self.initial_capital = initial_capital
+        self.capital = initial_capital
+        self.prior_volume = None
+        self.metrics = MetricsAccumulator(initial_capital)
+        self.segments = 0
+
+
+def _process_segment(segment, n_warmup, strategy_func, strategy_params, cost_model, state, writers):
+    """
+    Ejecuta la estrategia sobre un segmento de días completos y actualiza el estado
+    """
+    results = strategy_func(segment, **strategy_params).iloc[n_warmup:].reset_index(drop=True)
+    if len(results) == 0:
+        return
+    
+    trades = extract_trades(results)
+    trade_costs = calculate_trade_costs(trades, state.capital, cost_model, state.prior_volume)
+    equity_df = calculate_equity_curve(results, state.capital, cost_model=cost_model,
+                                       trade_costs=trade_costs, prior_volume=state.prior_volume)
+    
+    # Métricas del segmento, combinadas con las de los anteriores (la primera fila es el capital arrastrado)
+    if state.segments > 0:
+        equity_df = equity_df.iloc[1:]
+    segment_metrics = MetricsAccumulator(state.initial_capital)
+    segment_metrics.update_bars(equity_df['timestamp'].to_numpy(), equity_df['equity'].to_numpy())
+    segment_metrics.trades.update_batch(trade_costs['net_return'], trade_costs['gross_return'])
+    segment_metrics.costs.update(equity_df['total_commissions'].iloc[-1], equity_df['total_slippage'].iloc[-1])
+    
+    # Escritura incremental de equity y trades
+    costs = state.metrics.costs
+    equity_df = equity_df.assign(total_commissions=equity_df['total_commissions'] + costs.commissions,
+                                 total_slippage=equity_df['total_slippage'] + costs.slippage)
+    equity_df.to_csv(writers['equity'], mode='a', header=state.segments == 0, index=False)
+    closed = trades.loc[trade_costs.index].drop(columns=['entry_pos', 'exit_pos'])
+    pd.concat([closed, trade_costs], axis=1).to_csv(writers['trades'], mode='a',
+                                                     header=state.segments == 0, index=False)
+    
+    # Actualizar el estado arrastrado
+    state.metrics.merge(segment_metrics)
+    state.capital = trade_costs['capital_after'].iloc[-1] if len(trade_costs) else state.capital
+    state.prior_volume = CostModel.monthly_volume(closed['entry_time'], trade_costs['shares'],
+                                                  state.prior_volume)
+    state.segments += 1
+
+
+def streaming_backtest(strategy_func, strategy_params=None, initial_capital=10000, cost_model=None,
+                       paths=None, chunksize=None, output_dir=None, warmup_bars=None):
+    """
+    Backtesting out-of-core sobre particiones leídas en bloques
+    
+    Produce las mismas métricas que comprehensive_backtest sobre los mismos datos
+    concatenados y limpiados con clean_noisy_data, sin cargar nunca el histórico completo.
+    
+    Args:
+        strategy_func: Función de estrategia intradía
+        strategy_params: Parámetros de la estrategia
+        initial_capital: Capital inicial
+        cost_model: Modelo de costes (por defecto, el de comprehensive_backtest)
+        paths: Rutas de las particiones en orden (por defecto todas las de raw_data/)
+        chunksize: Filas por bloque (por defecto DATA_CONFIG['chunk_size'])
+        output_dir: Carpeta donde escribir trades.csv y equity.csv
+        warmup_bars: Velas de calentamiento (por defecto, según las ventanas de la estrategia)
+    
+    Returns:
+        tuple: (metrics, {'trades': ruta, 'equity': ruta})
+    """
+    strategy_params = strategy_params or {}
+    cost_model = cost_model or default_cost_model()
+    paths = paths or [path for _, path in list_partitions('raw')]
+    output_dir = output_dir or os.path.join(OUTPUT_CONFIG['results_path'], 'streaming')
+    
+    os.makedirs(output_dir, exist_ok=True)
+    writers = {'trades': os.path.join(output_dir, 'trades.csv'),
+               'equity': os.path.join(output_dir, 'equity.csv')}
+    for path in writers.values():
+        if os.path.exists(path):
+            os.remove(path)
+    
+    state = _StreamingState(initial_capital)
+    tail = pending = None
+    columns = [DATA_CONFIG['timestamp_column'], DATA_CONFIG['price_column'], DATA_CONFIG['volume_column'],
+               'high', 'low']
+    for chunk in iter_partition_chunks(paths, chunksize, columns):
+        chunk = clean_noisy_data(chunk)
+        data = chunk if pending is None else pd.concat([pending, chunk], ignore_index=True)
+        if len(data) == 0:
+            continue
+        # El último día puede continuar en el siguiente bloque: se arrastra sin procesar
+        split = _last_day_start(timestamps_to_ns(data['timestamp']))
+        pending = data.iloc[split:]
+        if split == 0:
+            continue
+        segment = data.iloc[:split] if tail is None else pd.concat([tail, data.iloc[:split]], ignore_index=True)
+        n_warmup = 0 if tail is None else len(tail)
+        _process_segment(segment.reset_index(drop=True), n_warmup, strategy_func, strategy_params,
+                         cost_model, state, writers)
+        if warmup_bars is None:
+            # Tamaño de vela inferido del primer segmento completo
+            warmup_bars = default_warmup_bars(strategy_func, strategy_params, as_bars(segment).bar_minutes)
+        tail = _warmup_tail(segment, warmup_bars)
+    
+    if pending is not None and len(pending):
+        segment = pending if tail is None else pd.concat([tail, pending], ignore_index=True)
+        _process_segment(segment.reset_index(drop=True), 0 if tail is None else len(tail), strategy_func,
+                         strategy_params, cost_model, state, writers)
+    
+    return state.metrics.metrics(), writers
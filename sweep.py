@@ -0,0 +1,306 @@
+"""
+Barrido de parámetros (grid search) de una estrategia sobre unas mismas velas
+
+grid_sweep ejecuta el backtest completo de cada combinación; factorized_sweep comparte
+las señales de entrada entre todas las combinaciones de parámetros de salida.
+"""
+import inspect
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from config import BACKTEST_CONFIG
+from bars import Bars, as_bars
+from cost_model import CostModel
+from backtesting import comprehensive_backtest, metrics_from_stats, trade_return_stats, default_cost_model
+from trading_strategies import (volume_breakout_5min_strategy, volume_breakout_15min_strategy,
+                                volume_breakout_5min_signals, volume_breakout_15min_signals)
+
+
+def parameter_grid(grid: dict) -> list:
+    """
+    Todas las combinaciones de un grid {parámetro: [valores]}
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def grid_sweep(df, strategy_func, grid: dict, initial_capital=10000, cost_model=None,
+               base_params: dict = None) -> pd.DataFrame:
+    """
+    Ejecuta el backtest de cada combinación del grid
+
+    Las velas se convierten una sola vez a Bars, de modo que el calendario de sesiones
+    y los remuestreos se comparten entre todas las combinaciones.
+
+    Args:
+        df: DataFrame o Bars con los datos
+        strategy_func: Función de estrategia
+        grid: Dict {parámetro: [valores]}
+        initial_capital: Capital inicial
+        cost_model: Modelo de costes (por defecto, el de comprehensive_backtest)
+        base_params: Parámetros fijos comunes a todas las combinaciones
+
+    Returns:
+        DataFrame con una fila por combinación: parámetros y métricas
+    """
+    bars = as_bars(df)
+    rows = []
+    for params in parameter_grid(grid):
+        strategy_params = {**(base_params or {}), **params}
+        _, _, metrics = comprehensive_backtest(bars, strategy_func, strategy_params, initial_capital,
+                                               cost_model=cost_model)
+        rows.append({**params, **metrics})
+    return pd.DataFrame(rows)
+
+
+# Parámetros de los que dependen las señales de entrada de cada estrategia; el resto solo afecta a las salidas
+ENTRY_PARAMS = {
+    volume_breakout_5min_strategy: ('volume_multiplier', 'trend_window', 'volume_window', 'volume_minutes',
+                                    'trend_minutes'),
+    volume_breakout_15min_strategy: ('volume_multiplier', 'trend_window')
+}
+EXIT_PARAMS = ('stop_loss', 'take_profit', 'exit_periods')
+
+
+def _entry_candidates(bars: Bars, strategy_func, entry_params: dict) -> np.ndarray:
+    """
+    Velas con señal de compra en las que se permite abrir posición
+    """
+    if strategy_func is volume_breakout_15min_strategy:
+        signals = volume_breakout_15min_signals(bars, **entry_params)
+    else:
+        signals, _ = volume_breakout_5min_signals(bars, **entry_params)
+    return np.flatnonzero(np.asarray(signals, dtype=bool) & bars.calendar.can_enter)
+
+
+def _forward_paths(bars: Bars, candidates: np.ndarray, horizon: int, intrabar: bool) -> dict:
+    """
+    Recorrido hacia delante de cada entrada candidata hasta el horizonte máximo
+
+    Returns:
+        dict con close (m, horizon + 1) desde la vela de entrada, worst/best (m, horizon) con el
+        retorno más desfavorable/favorable de cada vela posterior y end_of_day (m, horizon);
+        las posiciones más allá del final de los datos son NaN / False
+    """
+    n = len(bars)
+    offsets = np.arange(horizon + 1)
+    positions = candidates[:, None] + offsets
+    valid = positions < n
+    positions = np.minimum(positions, n - 1)
+    close = np.where(valid, bars.close[positions], np.nan)
+    entry_price = close[:, :1]
+    worst, best = (bars.low, bars.high) if intrabar else (bars.close, bars.close)
+    return {
+        'close': close,
+        'worst': np.where(valid, (worst[positions] - entry_price) / entry_price, np.nan)[:, 1:],
+        'best': np.where(valid, (best[positions] - entry_price) / entry_price, np.nan)[:, 1:],
+        'end_of_day': (valid & bars.calendar.end_of_day[positions])[:, 1:]
+    }
+
+
+def _first_offset(mask: np.ndarray) -> np.ndarray:
+    """
+    Primer desplazamiento (1..horizonte) en que se cumple la máscara de cada fila; inf si nunca
+    """
+    return np.where(mask.any(axis=-1), mask.argmax(axis=-1) + 1, np.inf)
+
+
+def _resolve_exits(paths: dict, exit_grid: np.ndarray) -> tuple:
+    """
+    Desplazamiento y código de salida de cada entrada candidata para todas las combinaciones de salida
+
+    Mismas reglas que _run_trade_engine: stop loss, take profit, tiempo y fin de día, en ese orden
+    de prioridad dentro de una vela.
+
+    Returns:
+        tuple: (offset (K, m), inf si la posición sigue abierta al final de los datos; code (K, m))
+    """
+    stop_losses, stop_index = np.unique(exit_grid[:, 0], return_inverse=True)
+    take_profits, take_index = np.unique(exit_grid[:, 1], return_inverse=True)
+    # Primeros cruces por umbral distinto, compartidos entre combinaciones
+    down = np.stack([_first_offset(paths['worst'] <= sl) for sl in stop_losses])[stop_index]
+    up = np.stack([_first_offset(paths['best'] >= tp) for tp in take_profits])[take_index]
+    end_of_day = _first_offset(paths['end_of_day'])[None, :]
+    available = np.isfinite(paths['close']).sum(axis=1)[None, :] - 1
+
+    periods = np.maximum(exit_grid[:, 2], 1)[:, None]
+    time_exit = np.where(periods <= available, periods, np.inf)
+    down = np.where(down <= periods, down, np.inf)
+    up = np.where(up <= periods, up, np.inf)
+    eod = np.where(end_of_day <= periods, end_of_day, np.inf)
+    offset = np.minimum(np.minimum(down, up), np.minimum(time_exit, eod))
+    code = np.select([down == offset, up == offset, time_exit == offset], [1, 2, 3], 4).astype(np.int8)
+    return offset, code
+
+
+def _chain_trades(candidates: np.ndarray, offset: np.ndarray) -> list:
+    """
+    Entradas ejecutadas de cada combinación: tras cada salida, la siguiente candidata posterior
+
+    Returns:
+        list: Por combinación, índices (en candidates) de los trades ejecutados
+    """
+    n_combos, m = offset.shape
+    exit_bar = candidates + np.where(np.isfinite(offset), offset, 0).astype(np.int64)
+    following = np.where(np.isfinite(offset), np.searchsorted(candidates, exit_bar + 1), m + 1)
+    following = np.hstack([following, np.full((n_combos, 1), m)])
+    current = np.zeros(n_combos, dtype=np.int64)
+    steps = []
+    rows = np.arange(n_combos)
+    # Un paso por trade, todas las combinaciones a la vez
+    while np.any(current < m):
+        steps.append(current)
+        current = np.where(current < m, following[rows, np.minimum(current, m)], current)
+    steps = np.array(steps, dtype=np.int64).reshape(-1, n_combos)
+    return [column[column < m] for column in steps.T]
+
+
+def _no_trade_metrics(bars: Bars, initial_capital) -> dict:
+    """
+    Métricas de una combinación sin trades: equity plana durante todo el periodo
+    """
+    stats = {
+        'initial_equity': initial_capital,
+        'final_equity': initial_capital,
+        'total_commissions': 0.0,
+        'total_slippage': 0.0,
+        'start_date': pd.Timestamp(bars.timestamps[0]),
+        'end_date': pd.Timestamp(bars.timestamps[-1]),
+        'returns_std': 0.0,
+        'max_drawdown': 0.0
+    }
+    stats.update(trade_return_stats([], []))
+    return metrics_from_stats(stats)
+
+
+def _path_metrics(bars: Bars, trades: np.ndarray, offset: np.ndarray, code: np.ndarray, paths: dict,
+                  candidates: np.ndarray, stop_loss: float, take_profit: float, intrabar: bool,
+                  initial_capital, cost_model: CostModel, bar_returns: tuple) -> dict:
+    """
+    Métricas de calculate_performance_metrics a partir de los trades y sus recorridos, sin construir la curva
+
+    Fuera de posición la equity es constante, así que los retornos por vela distintos de cero y el
+    drawdown solo dependen de las velas en posición de cada trade.
+    """
+    entry = candidates[trades]
+    length = offset[trades].astype(np.int64)
+    exit_bar = entry + length
+    exit_code = code[trades]
+    entry_price = bars.close[entry]
+    exit_price = bars.close[exit_bar]
+    if intrabar:
+        # Mismos precios que _run_trade_engine: nivel de la orden o, tras un hueco, el mínimo de la vela
+        stop_price = entry_price * (1 + stop_loss)
+        stop_fill = np.where(bars.high[exit_bar] >= stop_price, stop_price, bars.low[exit_bar])
+        exit_price = np.where(exit_code == 1, stop_fill,
+                     np.where(exit_code == 2, np.maximum(entry_price * (1 + take_profit), bars.low[exit_bar]),
+                              exit_price))
+    costs = cost_model.trade_costs(entry_price, exit_price, initial_capital,
+                                   bars.timestamps[entry].view('datetime64[ns]'))
+    capital_before = costs['capital_before'].to_numpy()
+    capital_after = costs['capital_after'].to_numpy()
+    shares = costs['shares'].to_numpy()
+
+    # Retornos por vela: entrada, velas intermedias (solo dependen del cierre) y salida
+    cumulative, cumulative_sq = bar_returns
+    entry_return = shares * entry_price / capital_before - 1
+    exit_return = capital_after / (shares * bars.close[exit_bar - 1]) - 1
+    inner = cumulative[exit_bar - 1] - cumulative[entry]
+    inner_sq = cumulative_sq[exit_bar - 1] - cumulative_sq[entry]
+    n_returns = len(bars) + 1
+    total = entry_return.sum() + exit_return.sum() + inner.sum()
+    total_sq = (entry_return ** 2).sum() + (exit_return ** 2).sum() + inner_sq.sum()
+    returns_std = np.sqrt(max(total_sq - total ** 2 / n_returns, 0.0) / (n_returns - 1))
+
+    # Drawdown: pico previo a cada trade y pico dentro de su recorrido
+    held = np.arange(paths['close'].shape[1] - 1)[None, :] < length[:, None]
+    equity = np.where(held, shares[:, None] * paths['close'][trades, :-1], np.nan)
+    running = np.fmax.accumulate(np.where(held, equity, -np.inf), axis=1)
+    trade_peak = np.maximum(running[:, -1], capital_after)
+    peak_before = np.maximum.accumulate(np.concatenate(([initial_capital], trade_peak[:-1])))
+    in_trade = np.nanmin(equity / np.maximum(peak_before[:, None], running), axis=1, initial=np.inf) - 1
+    at_exit = capital_after / np.maximum(peak_before, trade_peak) - 1
+    max_drawdown = min(0.0, in_trade.min(initial=0.0), at_exit.min(initial=0.0))
+
+    stats = {
+        'initial_equity': initial_capital,
+        'final_equity': capital_after[-1] if len(capital_after) else initial_capital,
+        'total_commissions': costs['commission'].sum(),
+        'total_slippage': costs['slippage_cost'].sum(),
+        'start_date': pd.Timestamp(bars.timestamps[0]),
+        'end_date': pd.Timestamp(bars.timestamps[-1]),
+        'returns_std': returns_std,
+        'max_drawdown': max_drawdown
+    }
+    stats.update(trade_return_stats(costs['net_return'], costs['gross_return']))
+    return metrics_from_stats(stats)
+
+
+def factorized_sweep(df, strategy_func, grid: dict, initial_capital=10000, cost_model=None,
+                     base_params: dict = None) -> pd.DataFrame:
+    """
+    Barrido equivalente a grid_sweep que calcula cada conjunto de señales de entrada una sola vez
+
+    Las señales de entrada solo dependen de ENTRY_PARAMS. Para cada conjunto distinto se
+    precalcula el recorrido de cada entrada candidata hasta el mayor exit_periods del grid y
+    todas las combinaciones de stop_loss, take_profit y exit_periods se resuelven a la vez
+    sobre esas matrices; las métricas se obtienen de los trades y sus recorridos sin construir
+    el DataFrame de señales ni la curva de equity.
+
+    Args:
+        df: DataFrame o Bars con los datos
+        strategy_func: volume_breakout_5min_strategy o volume_breakout_15min_strategy
+        grid: Dict {parámetro: [valores]} sobre ENTRY_PARAMS y EXIT_PARAMS
+        initial_capital: Capital inicial
+        cost_model: Modelo de costes (por defecto, el de comprehensive_backtest)
+        base_params: Parámetros fijos comunes a todas las combinaciones
+
+    Returns:
+        DataFrame con una fila por combinación (mismo orden y columnas que grid_sweep)
+    """
+    if strategy_func not in ENTRY_PARAMS:
+        raise ValueError(f"Barrido factorizado no disponible para {getattr(strategy_func, '__name__', strategy_func)}")
+    entry_names = ENTRY_PARAMS[strategy_func]
+    defaults = {name: parameter.default for name, parameter in inspect.signature(strategy_func).parameters.items()
+                if name in entry_names + EXIT_PARAMS}
+    unknown = set(grid) | set(base_params or {})
+    unknown -= set(defaults)
+    if unknown:
+        raise ValueError(f"Parámetros no soportados por el barrido factorizado: {sorted(unknown)}")
+
+    bars = as_bars(df)
+    cost_model = cost_model or default_cost_model()
+    intrabar = BACKTEST_CONFIG['intrabar_exits'] and bars.high is not None and bars.low is not None
+    combos = [{**defaults, **(base_params or {}), **params} for params in parameter_grid(grid)]
+    horizon = max(max(int(combo['exit_periods']), 1) for combo in combos)
+    bar_returns = np.concatenate(([0.0], np.diff(bars.close) / bars.close[:-1]))
+    bar_returns = (np.cumsum(bar_returns), np.cumsum(bar_returns ** 2))
+
+    # Agrupar las combinaciones por conjunto de señales de entrada
+    groups = {}
+    for i, combo in enumerate(combos):
+        groups.setdefault(tuple(combo[name] for name in entry_names), []).append(i)
+
+    rows = [None] * len(combos)
+    for entry_values, members in groups.items():
+        candidates = _entry_candidates(bars, strategy_func, dict(zip(entry_names, entry_values)))
+        exit_grid = np.array([[combos[i][name] for name in EXIT_PARAMS] for i in members], dtype=np.float64)
+        paths = _forward_paths(bars, candidates, horizon, intrabar)
+        offset, code = _resolve_exits(paths, exit_grid)
+        for k, (i, trades) in enumerate(zip(members, _chain_trades(candidates, offset))):
+            stop_loss, take_profit, _ = exit_grid[k]
+            if len(trades) == 0:
+                # Sin señales (o sin entradas válidas) para este conjunto de parámetros de entrada
+                metrics = _no_trade_metrics(bars, initial_capital)
+            elif not np.isfinite(offset[k, trades[-1]]):
+                # Posición abierta al final de los datos: la curva exacta requiere el backtest completo
+                _, _, metrics = comprehensive_backtest(bars, strategy_func, combos[i], initial_capital,
+                                                       cost_model=cost_model)
+            else:
+                metrics = _path_metrics(bars, trades, offset[k], code[k], paths, candidates, stop_loss,
+                                        take_profit, intrabar, initial_capital, cost_model, bar_returns)
+            params = {name: combos[i][name] for name in grid}
+            rows[i] = {**params, **metrics}
+    return pd.DataFrame(rows)
@@ -0,0 +1,299 @@
+"""
+Coordinador de barridos largos con cola de trabajos persistente en SQLite
+
+Un barrido (grid de parámetros, opcionalmente repetido sobre varias ventanas de
+fechas para un walk-forward) se guarda como una base de datos SQLite con un trabajo
+por combinación y ventana. Los workers son procesos independientes, en esta máquina
+o en otras que vean el mismo sistema de ficheros, que:
+    - reclaman un trabajo pendiente dentro de una transacción exclusiva,
+    - mantienen un latido mientras lo ejecutan,
+    - escriben sus métricas al terminar.
+
+Un trabajo cuyo worker deja de latir durante lease_timeout vuelve a la cola (cuenta
+como intento: tras max_attempts se marca como fallido), y tras una interrupción basta
+con lanzar de nuevo los workers: los trabajos terminados no se repiten. No hace falta
+ningún servicio externo.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from config import SWEEP_CONFIG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY,
+    spec TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    metrics TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, job_id);
+"""
+
+
+def queue_path(name: str) -> str:
+    return os.path.join(SWEEP_CONFIG['queue_path'], f'{name}.sqlite')
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # Sin WAL: el journal clásico es el que funciona sobre sistemas de ficheros de red
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def create_sweep(name: str, strategy: str, grid: dict, years=None, dataset: str = 'raw', symbol: str = None,
+                 initial_capital: float = 10000, base_params: dict = None, windows=None, cost_model=None) -> str:
+    """
+    Crea (o completa) la cola de trabajos de un barrido
+
+    Si la cola ya existe solo se añaden los trabajos nuevos, así que repetir la llamada
+    con el mismo grid no duplica nada.
+
+    Args:
+        name: Nombre del barrido (archivo SWEEP_CONFIG['queue_path']/<name>.sqlite)
+        strategy: Nombre de la función de trading_strategies
+        grid: Dict {parámetro: [valores]}
+        years, dataset, symbol: Particiones a cargar en cada worker (como partition_store.load_bars)
+        initial_capital: Capital inicial
+        base_params: Parámetros fijos comunes a todas las combinaciones
+        windows: Lista de (inicio, fin) para repetir cada combinación por ventanas (walk-forward)
+        cost_model: Modelo de costes de todos los trabajos (por defecto, el de comprehensive_backtest);
+            se guarda en la cola para que cada worker lo reconstruya
+
+    Returns:
+        str: Ruta de la cola
+    """
+    from backtesting import default_cost_model
+    from sweep import parameter_grid
+
+    path = queue_path(name)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    meta = {'strategy': strategy, 'years': years, 'dataset': dataset, 'symbol': symbol,
+            'initial_capital': initial_capital, 'base_params': base_params or {},
+            'cost_model': (cost_model or default_cost_model()).settings}
+    specs = [{'params': params, 'window': list(window) if window else None}
+             for window in (windows or [None]) for params in parameter_grid(grid)]
+
+    conn = _connect(path)
+    try:
+        conn.executescript(_SCHEMA)
+        conn.execute('BEGIN IMMEDIATE')
+        stored = {row['key']: json.loads(row['value']) for row in conn.execute('SELECT key, value FROM meta')}
+        if stored and stored != meta:
+            conn.execute('ROLLBACK')
+            raise ValueError(f"El barrido '{name}' ya existe con otra configuración: {stored}")
+        conn.executemany('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)',
+                         [(key, json.dumps(value)) for key, value in meta.items()])
+        before = conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+        conn.executemany('INSERT OR IGNORE INTO jobs (spec) VALUES (?)',
+                         [(json.dumps(spec, sort_keys=True, default=float),) for spec in specs])
+        added = conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0] - before
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    logging.info(f"Barrido '{name}': {added} trabajos nuevos, {before + added} en total")
+    return path
+
+
+def _claim(conn: sqlite3.Connection, worker: str):
+    """
+    Devuelve a la cola los trabajos sin latido y reclama el primer pendiente (o None)
+    """
+    now = time.time()
+    expiry = now - SWEEP_CONFIG['lease_timeout']
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Cada reclamación cuenta como intento: un trabajo que tumba a su worker no se repite sin fin
+        failed = conn.execute("UPDATE jobs SET state = 'failed', finished_at = ?, error = ? WHERE state = 'running' "
+                              "AND heartbeat_at < ? AND attempts >= ?",
+                              (now, 'lease expirado: el worker dejó de latir', expiry,
+                               SWEEP_CONFIG['max_attempts'])).rowcount
+        if failed:
+            logging.error(f'{failed} trabajos fallidos tras {SWEEP_CONFIG["max_attempts"]} intentos sin latido')
+        expired = conn.execute("UPDATE jobs SET state = 'pending', worker = NULL WHERE state = 'running' "
+                               "AND heartbeat_at < ?", (expiry,)).rowcount
+        if expired:
+            logging.warning(f'{expired} trabajos de workers caídos vuelven a la cola')
+        row = conn.execute("SELECT job_id, spec, attempts FROM jobs WHERE state = 'pending' "
+                           "ORDER BY job_id LIMIT 1").fetchone()
+        if row is not None:
+            conn.execute("UPDATE jobs SET state = 'running', worker = ?, attempts = attempts + 1, "
+                         "claimed_at = ?, heartbeat_at = ? WHERE job_id = ?", (worker, now, now, row['job_id']))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return row
+
+
+def _finish(conn: sqlite3.Connection, job_id: int, worker: str, metrics: dict = None, error: str = None,
+            attempts: int = 0) -> bool:
+    """
+    Registra el resultado si el trabajo sigue asignado a este worker (si no, otro lo ha retomado)
+    """
+    if error is None:
+        state = 'done'
+    else:
+        state = 'failed' if attempts >= SWEEP_CONFIG['max_attempts'] else 'pending'
+    updated = conn.execute(
+        "UPDATE jobs SET state = ?, worker = CASE WHEN ? = 'pending' THEN NULL ELSE worker END, "
+        "finished_at = ?, metrics = ?, error = ? WHERE job_id = ? AND worker = ? AND state = 'running'",
+        (state, state, time.time(), json.dumps(metrics, default=float) if metrics is not None else None,
+         error, job_id, worker)).rowcount
+    return updated == 1
+
+
+class _Heartbeat(threading.Thread):
+    """
+    Latido periódico del trabajo en curso de un worker (con su propia conexión)
+    """
+
+    def __init__(self, path: str, worker: str):
+        super().__init__(daemon=True)
+        self.path = path
+        self.worker = worker
+        self.stopped = threading.Event()
+
+    def run(self):
+        conn = _connect(self.path)
+        try:
+            while not self.stopped.wait(SWEEP_CONFIG['heartbeat_interval']):
+                conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE worker = ? AND state = 'running'",
+                             (time.time(), self.worker))
+        finally:
+            conn.close()
+
+
+def run_worker(path: str, worker: str = None, max_jobs: int = None) -> int:
+    """
+    Ejecuta trabajos de la cola hasta vaciarla (o hasta max_jobs)
+
+    Las velas se cargan una vez por worker; cada trabajo es un comprehensive_backtest.
+
+    Returns:
+        int: Trabajos completados por este worker
+    """
+    import trading_strategies
+    from backtesting import comprehensive_backtest
+    from cost_model import CostModel
+    from partition_store import load_bars
+
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    conn = _connect(path)
+    meta = {row['key']: json.loads(row['value']) for row in conn.execute('SELECT key, value FROM meta')}
+    strategy_func = getattr(trading_strategies, meta['strategy'])
+    bars, _ = load_bars(meta['dataset'], meta['symbol'], meta['years'])
+    cost_model = CostModel(**meta['cost_model'])
+
+    heartbeat = _Heartbeat(path, worker)
+    heartbeat.start()
+    completed = 0
+    try:
+        while max_jobs is None or completed < max_jobs:
+            row = _claim(conn, worker)
+            if row is None:
+                break
+            spec = json.loads(row['spec'])
+            try:
+                data = bars.between(*spec['window']) if spec['window'] else bars
+                _, _, metrics = comprehensive_backtest(data, strategy_func, {**meta['base_params'], **spec['params']},
+                                                       meta['initial_capital'], cost_model=cost_model)
+            except Exception as e:
+                logging.error(f"{worker}: trabajo {row['job_id']} fallido: {e!r}")
+                _finish(conn, row['job_id'], worker, error=repr(e), attempts=row['attempts'] + 1)
+                continue
+            if _finish(conn, row['job_id'], worker, metrics):
+                completed += 1
+            else:
+                logging.warning(f"{worker}: el trabajo {row['job_id']} se reasignó; resultado descartado")
+    finally:
+        heartbeat.stopped.set()
+        heartbeat.join()
+        conn.close()
+    logging.info(f'{worker}: {completed} trabajos completados')
+    return completed
+
+
+def _worker_process(path: str):
+    run_worker(path)
+
+
+def run_sweep(path: str, workers: int = None) -> pd.DataFrame:
+    """
+    Lanza workers locales sobre la cola y espera a que terminen
+
+    Se puede llamar de nuevo tras una interrupción: solo se ejecutan los trabajos pendientes
+    (y los de workers caídos, una vez vencido su latido).
+
+    Returns:
+        DataFrame de sweep_results
+    """
+    workers = workers or SWEEP_CONFIG['workers'] or os.cpu_count() or 1
+    processes = [multiprocessing.Process(target=_worker_process, args=(path,)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return sweep_results(path)
+
+
+def progress(path: str) -> dict:
+    """
+    Número de trabajos por estado
+    """
+    conn = _connect(path)
+    try:
+        return {row['state']: row['n'] for row in
+                conn.execute('SELECT state, COUNT(*) AS n FROM jobs GROUP BY state')}
+    finally:
+        conn.close()
+
+
+def sweep_results(path: str) -> pd.DataFrame:
+    """
+    Trabajos terminados: parámetros, ventana (si la hay) y métricas
+    """
+    conn = _connect(path)
+    try:
+        rows = conn.execute("SELECT job_id, spec, metrics FROM jobs WHERE state = 'done' ORDER BY job_id").fetchall()
+    finally:
+        conn.close()
+    records = []
+    for row in rows:
+        spec = json.loads(row['spec'])
+        window = dict(zip(('window_start', 'window_end'), spec['window'])) if spec['window'] else {}
+        records.append({'job_id': row['job_id'], **spec['params'], **window, **json.loads(row['metrics'])})
+    return pd.DataFrame(records)
+
+
+if __name__ == '__main__':
+    import sys
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+
+    # Worker suelto (p. ej. en otra máquina con el mismo sistema de ficheros): python sweep_coordinator.py <cola>
+    if len(sys.argv) < 2:
+        raise SystemExit('Uso: python sweep_coordinator.py <ruta de la cola>')
+    run_worker(sys.argv[1])
+    print(progress(sys.argv[1]))
@@ -0,0 +1,10 @@
+"""
+Configuración común de los tests: se ejecutan desde la raíz del repositorio
+(las rutas de config.py son relativas) con los módulos planos importables
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
@@ -0,0 +1,45 @@
+"""
+Métricas de backtesting: costes de la curva de equity y rendimiento anualizado
+"""
+import math
+
+import pandas as pd
+import pytest
+
+from backtesting import (comprehensive_backtest, calculate_equity_curve, calculate_performance_metrics,
+                         metrics_from_stats, trade_return_stats)
+from cost_model import CostModel
+from trading_strategies import volume_breakout_15min_strategy
+from utils import clean_noisy_data
+
+CAPITAL = 1000
+
+
+@pytest.fixture(scope='module')
+def results():
+    df = clean_noisy_data(pd.read_csv('raw_data/2024_data.csv', nrows=8000).drop(columns=['Unnamed: 0']))
+    return volume_breakout_15min_strategy(df)
+
+
+@pytest.mark.parametrize('schedule', ['percentage', 'fixed'])
+def test_metrics_recompute_costs_with_given_model(results, schedule):
+    model = CostModel(schedule=schedule)
+    _, _, expected = comprehensive_backtest(results[['timestamp', 'close', 'volume']].copy(),
+                                            volume_breakout_15min_strategy, None, CAPITAL, cost_model=model)
+    equity = calculate_equity_curve(results.copy(), CAPITAL, cost_model=model)
+    metrics = calculate_performance_metrics(equity, results, cost_model=model)
+    assert expected['total_trades'] > 0
+    for key in ('win_rate', 'avg_win', 'avg_loss', 'profit_factor', 'final_capital', 'total_commissions'):
+        assert metrics[key] == pytest.approx(expected[key], rel=1e-9), key
+
+
+@pytest.mark.parametrize('final_equity', [0.0, -150.0])
+def test_annualized_return_is_nan_when_equity_is_wiped_out(final_equity):
+    stats = {'initial_equity': 1000.0, 'final_equity': final_equity, 'total_commissions': 50.0,
+             'total_slippage': 10.0, 'start_date': pd.Timestamp('2024-01-02'),
+             'end_date': pd.Timestamp('2024-07-02'), 'returns_std': 0.01, 'max_drawdown': -1.0,
+             **trade_return_stats([-0.5, -0.6], [-0.45, -0.55])}
+    metrics = metrics_from_stats(stats)
+    assert isinstance(metrics['annualized_return'], float) and math.isnan(metrics['annualized_return'])
+    assert isinstance(metrics['sharpe_ratio'], float)
+    assert metrics['total_return'] == pytest.approx(final_equity / 1000.0 - 1)
@@ -0,0 +1,65 @@
+"""
+CostModel.trade_costs frente a un cálculo trade a trade
+"""
+import logging
+
+import numpy as np
+import pytest
+
+from cost_model import CostModel
+
+
+def _sequential_costs(model: CostModel, entry_price, exit_price, capital):
+    """
+    Referencia: reinversión de todo el capital trade a trade, resolviendo la comisión
+    de entrada por punto fijo escalar
+    """
+    capitals = [capital]
+    for p_in, p_out in zip(entry_price * (1 + model.slippage), exit_price * (1 - model.slippage)):
+        if model.per_share:
+            commission = 0.0
+            for _ in range(200):
+                shares = (capital - commission) / p_in
+                commission = float(model.commissions(shares * p_in, shares))
+        else:
+            commission = float(model.commissions(capital, 0.0))
+        shares = (capital - commission) / p_in
+        value = shares * p_out
+        capital = value - float(model.commissions(value, shares))
+        capitals.append(capital)
+    return np.array(capitals)
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(7)
+    entry = 50 + rng.normal(0, 1, 300).cumsum() * 0.1
+    return entry, entry * (1 + rng.normal(0, 0.004, 300))
+
+
+@pytest.mark.parametrize('schedule', ['percentage', 'fixed'])
+@pytest.mark.parametrize('capital', [1000, 10000, 500000])
+def test_trade_costs_match_sequential(prices, schedule, capital):
+    model = CostModel(schedule)
+    entry, exit_ = prices
+    costs = model.trade_costs(entry, exit_, capital)
+    expected = _sequential_costs(model, entry, exit_, capital)
+    np.testing.assert_allclose(costs['capital_before'], expected[:-1], rtol=1e-9)
+    np.testing.assert_allclose(costs['capital_after'], expected[1:], rtol=1e-9)
+
+
+def test_minimum_commission_binds_at_small_capital(prices):
+    entry, exit_ = prices
+    costs = CostModel('percentage', min_commission=1.0).trade_costs(entry[:1], exit_[:1], 1000)
+    assert costs['entry_commission'].iloc[0] == pytest.approx(1.0)
+
+
+def test_warns_when_regimes_do_not_converge(prices, caplog):
+    entry, exit_ = prices
+    with caplog.at_level(logging.WARNING):
+        CostModel('percentage').trade_costs(entry, exit_, 1000, max_iterations=1)
+    assert 'no convergen' in caplog.text
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        CostModel('percentage').trade_costs(entry, exit_, 1000)
+    assert 'no convergen' not in caplog.text
@@ -0,0 +1,39 @@
+"""
+Indicadores por particiones con calentamiento frente a un cálculo continuo
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import labelling
+from config import FEATURE_CONFIG
+from labelling import add_indicators, labelling_data, _warmup_partitions
+
+ROWS = 6000
+
+
+@pytest.fixture
+def no_write(monkeypatch):
+    monkeypatch.setattr(labelling, 'write_partition', lambda *args, **kwargs: None)
+
+
+def _raw(year, **kwargs):
+    return pd.read_csv(f'raw_data/{year}_data.csv', **kwargs).drop(columns=['Unnamed: 0'])
+
+
+def test_partitioned_features_match_continuous(no_write):
+    previous = _raw(2023)
+    current = _raw(2024, nrows=ROWS)
+    continuous = add_indicators(pd.concat([previous, current], ignore_index=True)).iloc[len(previous):]
+    continuous = continuous.dropna().drop(columns=['Signal', 'Hist'])
+    partitioned = labelling_data(current, 2024, warmup=previous.tail(FEATURE_CONFIG['warmup_bars']))
+    assert len(partitioned) == len(current)
+    assert list(partitioned.columns) == list(continuous.columns)
+    for column in ('RSI', 'MACD', 'EMA', 'SMA', 'MOM'):
+        np.testing.assert_allclose(partitioned[column].to_numpy(), continuous[column].to_numpy(),
+                                   rtol=1e-9, atol=1e-9, err_msg=column)
+
+
+def test_cold_start_after_gap_in_history():
+    partitions = [(2002, 'a'), (2003, 'b'), (2021, 'c'), (2022, 'd')]
+    assert _warmup_partitions(partitions) == {2003: 'a', 2022: 'c'}
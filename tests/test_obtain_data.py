@@ -0,0 +1,42 @@
+"""
+validate_month: rechazo de meses con problemas bloqueantes y reparación
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from obtain_data import validate_month, repair_month
+
+
+@pytest.fixture
+def month():
+    timestamps = pd.date_range('2024-03-04 10:00', periods=72, freq='5min')
+    close = 50 + 0.01 * np.sin(np.arange(72))
+    return pd.DataFrame({'timestamp': timestamps, 'close': close, 'volume': 100.0 + np.arange(72)})
+
+
+def test_clean_month_is_valid(month):
+    assert validate_month(month, '2024', '03', bar_minutes=5)
+
+
+def test_empty_month_is_rejected(month):
+    assert not validate_month(month.iloc[:0], '2024', '03', bar_minutes=5)
+
+
+@pytest.mark.parametrize('broken', ['unsorted', 'duplicates'])
+def test_repairable_month_is_rejected_then_repaired(month, broken):
+    if broken == 'unsorted':
+        df = month.iloc[::-1].reset_index(drop=True)
+    else:
+        df = pd.concat([month, month.iloc[10:15]], ignore_index=True)
+    assert not validate_month(df, '2024', '03', bar_minutes=5)
+    repaired = repair_month(df)
+    assert validate_month(repaired, '2024', '03', bar_minutes=5)
+    pd.testing.assert_frame_equal(repaired, month)
+
+
+def test_month_with_many_outliers_is_rejected(month):
+    df = month.copy()
+    df.loc[10:20:2, 'close'] *= 1.5
+    assert not validate_month(df, '2024', '03', bar_minutes=5)
+    assert not validate_month(repair_month(df), '2024', '03', bar_minutes=5)
@@ -0,0 +1,31 @@
+"""
+Reanudación de estudios del optimizador
+"""
+import pytest
+
+from optimizer import Study
+
+
+@pytest.fixture
+def saved(tmp_path):
+    path = str(tmp_path / 'study.json')
+    study = Study('study', objective='calmar', path=path)
+    study.trials = [{'number': 0, 'params': {}, 'state': 'complete', 'rungs': [], 'value': 1.0}]
+    study.save()
+    return path
+
+
+def test_resume_keeps_stored_objective(saved):
+    study = Study.load_or_create('study', path=saved)
+    assert study.objective == 'calmar' and len(study.trials) == 1
+    assert Study.load_or_create('study', path=saved, objective='calmar').objective == 'calmar'
+
+
+def test_resume_with_other_objective_raises(saved):
+    with pytest.raises(ValueError, match='calmar'):
+        Study.load_or_create('study', path=saved, objective='sharpe')
+
+
+def test_resume_with_other_rungs_raises(saved):
+    with pytest.raises(ValueError, match='escalones'):
+        Study.load_or_create('study', path=saved, rungs=(0.5, 1.0))
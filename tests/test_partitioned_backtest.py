@@ -0,0 +1,61 @@
+"""
+Motores alternativos (por bloques y streaming) frente a comprehensive_backtest con
+el modelo de costes por defecto y un capital pequeño, donde la comisión mínima pesa
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtesting import comprehensive_backtest
+from partitioned_backtest import partitioned_backtest, default_warmup_bars
+from streaming import streaming_backtest
+from trading_strategies import volume_breakout_15min_strategy, volume_breakout_5min_strategy
+from utils import clean_noisy_data
+
+CAPITAL = 1000
+ROWS = 8000
+
+
+def _assert_same_metrics(expected: dict, actual: dict):
+    for key, value in expected.items():
+        if isinstance(value, float):
+            assert actual[key] == pytest.approx(value, rel=1e-9, abs=1e-12, nan_ok=True), key
+        else:
+            assert actual[key] == value, key
+
+
+@pytest.fixture(scope='module')
+def raw_sample():
+    return pd.read_csv('raw_data/2024_data.csv', nrows=ROWS).drop(columns=['Unnamed: 0'])
+
+
+@pytest.fixture(scope='module')
+def reference(raw_sample):
+    return comprehensive_backtest(clean_noisy_data(raw_sample.copy()), volume_breakout_15min_strategy,
+                                  None, CAPITAL)
+
+
+def test_partitioned_matches_comprehensive_with_default_costs(raw_sample, reference):
+    _, expected_equity, expected = reference
+    assert expected['total_trades'] > 0
+    _, equity, metrics = partitioned_backtest(clean_noisy_data(raw_sample.copy()), volume_breakout_15min_strategy,
+                                              None, CAPITAL, max_workers=2, days_per_chunk=5)
+    np.testing.assert_allclose(equity['equity'], expected_equity['equity'], rtol=1e-9)
+    _assert_same_metrics(expected, metrics)
+
+
+def test_streaming_matches_comprehensive_with_default_costs(raw_sample, reference, tmp_path):
+    path = tmp_path / '2024_data.csv'
+    raw_sample.to_csv(path)
+    metrics, _ = streaming_backtest(volume_breakout_15min_strategy, None, CAPITAL, paths=[str(path)],
+                                    chunksize=1500, output_dir=str(tmp_path / 'out'))
+    expected = reference[2]
+    assert metrics['total_commissions'] == pytest.approx(expected['total_commissions'])
+    assert metrics['final_capital'] == pytest.approx(expected['final_capital'], rel=1e-9)
+
+
+def test_warmup_scales_with_bar_size():
+    params = {'volume_window': 20, 'trend_window': 3}
+    assert default_warmup_bars(volume_breakout_15min_strategy, params, 5) == 23 * 3
+    assert default_warmup_bars(volume_breakout_15min_strategy, params, 1) == 23 * 15
+    assert default_warmup_bars(volume_breakout_5min_strategy, params, 1) == 23
@@ -0,0 +1,27 @@
+"""
+Barrido factorizado frente al barrido combinación a combinación
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from sweep import factorized_sweep, grid_sweep
+from trading_strategies import volume_breakout_15min_strategy
+from utils import clean_noisy_data
+
+
+@pytest.fixture(scope='module')
+def data():
+    return clean_noisy_data(pd.read_csv('raw_data/2024_data.csv', nrows=8000).drop(columns=['Unnamed: 0']))
+
+
+def test_grid_value_without_signals(data):
+    # volume_multiplier = 50 no produce ninguna señal: la fila debe salir con cero trades
+    grid = {'volume_multiplier': [1.5, 50.0]}
+    expected = grid_sweep(data, volume_breakout_15min_strategy, grid, 1000)
+    result = factorized_sweep(data, volume_breakout_15min_strategy, grid, 1000)
+    assert list(result['total_trades']) == [expected['total_trades'][0], 0]
+    assert expected['total_trades'][0] > 0
+    for column in expected.columns:
+        np.testing.assert_allclose(result[column].astype(float), expected[column].astype(float),
+                                   rtol=1e-9, atol=1e-12, err_msg=column)
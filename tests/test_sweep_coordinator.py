@@ -0,0 +1,63 @@
+"""
+Cola de trabajos del coordinador de barridos: leases vencidos, intentos y modelo de costes
+"""
+import pytest
+
+import sweep_coordinator
+from backtesting import comprehensive_backtest
+from cost_model import CostModel
+from partition_store import load_bars
+from sweep_coordinator import create_sweep, progress, run_worker, sweep_results, _claim, _connect
+from trading_strategies import volume_breakout_15min_strategy
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setitem(sweep_coordinator.SWEEP_CONFIG, 'queue_path', str(tmp_path))
+    monkeypatch.setitem(sweep_coordinator.SWEEP_CONFIG, 'max_attempts', 2)
+    path = create_sweep('test', 'volume_breakout_15min_strategy', {'trend_window': [3]}, years=[2024])
+    conn = _connect(path)
+    yield path, conn
+    conn.close()
+
+
+def _expire_lease(conn):
+    conn.execute("UPDATE jobs SET heartbeat_at = heartbeat_at - 3600 WHERE state = 'running'")
+
+
+def test_expired_leases_count_as_attempts_until_failed(queue):
+    path, conn = queue
+    assert _claim(conn, 'a')['attempts'] == 0
+    _expire_lease(conn)
+    # Primer lease vencido: vuelve a la cola y el nuevo worker lo reclama como segundo intento
+    assert _claim(conn, 'b')['attempts'] == 1
+    _expire_lease(conn)
+    # Segundo lease vencido con max_attempts = 2: fallido y no se vuelve a reclamar
+    assert _claim(conn, 'c') is None
+    assert progress(path) == {'failed': 1}
+    row = conn.execute('SELECT attempts, error FROM jobs').fetchone()
+    assert row['attempts'] == 2 and 'lease' in row['error']
+
+
+def test_live_lease_is_not_requeued(queue):
+    path, conn = queue
+    assert _claim(conn, 'a') is not None
+    assert _claim(conn, 'b') is None
+    assert progress(path) == {'running': 1}
+
+
+def test_worker_matches_comprehensive_backtest_costs(queue):
+    # Capital pequeño: la comisión mínima del modelo por defecto (1.0) pesa en cada orden
+    path = create_sweep('small', 'volume_breakout_15min_strategy', {'trend_window': [3]}, years=[2024],
+                        initial_capital=1000)
+    assert run_worker(path, 'w') == 1
+    bars, _ = load_bars(years=[2024])
+    _, _, expected = comprehensive_backtest(bars, volume_breakout_15min_strategy, {'trend_window': 3}, 1000)
+    metrics = sweep_results(path).iloc[0]
+    assert metrics['total_commissions'] == pytest.approx(expected['total_commissions'])
+    assert metrics['final_capital'] == pytest.approx(expected['final_capital'], rel=1e-9)
+
+
+def test_cost_model_settings_round_trip():
+    model = CostModel(schedule='fixed', min_commission=0.5)
+    assert CostModel(**model.settings).settings == model.settings
@@ -0,0 +1,44 @@
+"""
+Motor de trades (stops dentro de la vela) y parámetros de las estrategias en minutos
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from bars import Bars
+from trading_strategies import _run_trade_engine, volume_breakout_5min_signals
+
+STOP_LOSS = -0.01
+TAKE_PROFIT = 0.02
+
+
+def _run(high, low, close):
+    close = np.asarray(close, dtype=float)
+    entry = np.zeros(len(close), dtype=bool)
+    entry[0] = True
+    end_of_day = np.zeros(len(close), dtype=bool)
+    return _run_trade_engine(close, entry, end_of_day, 10, STOP_LOSS, TAKE_PROFIT,
+                             np.asarray(high, dtype=float), np.asarray(low, dtype=float))
+
+
+def test_stop_crossed_inside_bar_fills_at_stop_level():
+    _, exits, reasons, prices = _run(high=[100, 100.5, 101], low=[100, 98.5, 99], close=[100, 99, 100])
+    assert (exits[0], reasons[0]) == (1, 1)
+    assert prices[0] == pytest.approx(99.0)
+
+
+def test_stop_gapped_through_fills_at_bar_low():
+    # La vela entera está por debajo del stop (99): no se puede vender a 99 ni al máximo
+    _, exits, reasons, prices = _run(high=[100, 97.5, 98], low=[100, 96, 97], close=[100, 96.5, 97.5])
+    assert (exits[0], reasons[0]) == (1, 1)
+    assert prices[0] == pytest.approx(96.0)
+
+
+def test_windows_in_minutes_match_bar_counts():
+    df = pd.read_csv('raw_data/2024_data.csv', nrows=3000)
+    bars = Bars.from_frame(df)
+    assert bars.bar_minutes == 5
+    by_bars, _ = volume_breakout_5min_signals(bars, 1.5, trend_window=3, volume_window=20)
+    by_minutes, _ = volume_breakout_5min_signals(bars, 1.5, volume_minutes=100, trend_minutes=15)
+    np.testing.assert_array_equal(by_minutes, by_bars)
+    assert by_bars.any()
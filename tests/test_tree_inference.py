@@ -0,0 +1,40 @@
+"""
+Modelos de árboles compilados frente a sklearn
+"""
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+from tree_inference import compile_model
+
+
+@pytest.fixture(scope='module')
+def features():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(rng.normal(size=(2000, 4)), columns=['RSI', 'MACD', 'EMA', 'MOM'])
+
+
+@pytest.mark.parametrize('model', [GradientBoostingClassifier(n_estimators=30, random_state=0),
+                                   RandomForestClassifier(n_estimators=10, random_state=0)])
+@pytest.mark.parametrize('n_classes', [2, 3])
+def test_compiled_predictions_match_sklearn(features, model, n_classes):
+    target = np.digitize(features['RSI'] + features['MACD'], np.linspace(-1, 1, n_classes + 1)[1:-1])
+    scaler = ColumnTransformer([('std', StandardScaler(), ['RSI', 'MACD']),
+                                ('minmax', MinMaxScaler(), ['EMA', 'MOM'])]).fit(features)
+    model.fit(scaler.transform(features), target)
+    compiled = compile_model(model, scaler)
+    np.testing.assert_array_equal(compiled.predict(features), model.predict(scaler.transform(features)))
+    np.testing.assert_allclose(compiled.predict_proba(features), model.predict_proba(scaler.transform(features)),
+                               rtol=0, atol=1e-15)
+
+
+def test_import_does_not_load_sklearn():
+    code = "import sys, tree_inference; print(any(m in sys.modules for m in ('sklearn', 'scipy', 'joblib')))"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
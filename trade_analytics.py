@@ -0,0 +1,196 @@
+"""
+Desgloses estadísticos de la tabla de trades
+
+Todas las agrupaciones (razón de salida, hora de entrada, día de la semana, mes,
+tramo de tenencia y tramo de volumen relativo) se calculan sobre arrays: cada
+clave se convierte a códigos enteros y los agregados salen de np.bincount y de una
+única ordenación por grupo para las medianas, así que el coste es lineal en el
+número de trades (millones de trades de un barrido incluidos).
+"""
+import numpy as np
+import pandas as pd
+
+from config import TRADE_ANALYTICS_CONFIG
+from session_calendar import timestamps_to_ns
+
+WEEKDAYS = np.array(['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo'])
+
+# Desgloses por defecto: nombre -> columna de la tabla de trades
+BREAKDOWNS = {
+    'exit_reason': 'exit_reason',
+    'entry_hour': 'entry_hour',
+    'weekday': 'weekday',
+    'month': 'month',
+    'holding': 'holding_bucket',
+    'volume_ratio': 'volume_ratio_bucket'
+}
+
+
+def _bucket_labels(edges, unit: str = '') -> np.ndarray:
+    edges = list(edges)
+    labels = [f'<{edges[0]:g}{unit}'] + [f'{a:g}-{b:g}{unit}' for a, b in zip(edges, edges[1:])]
+    return np.array(labels + [f'>={edges[-1]:g}{unit}'])
+
+
+def bucketize(values, edges, unit: str = '') -> pd.Categorical:
+    """
+    Tramos ordenados de unos valores según sus límites (NaN queda fuera de todos los tramos)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.searchsorted(np.asarray(edges, dtype=np.float64), values, side='right')
+    codes = np.where(np.isnan(values), -1, codes)
+    return pd.Categorical.from_codes(codes, categories=_bucket_labels(edges, unit), ordered=True)
+
+
+def trade_table(results: pd.DataFrame, trade_costs: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Trades cerrados de un resultado de estrategia con las columnas de los desgloses
+
+    Args:
+        results: Resultado de la estrategia (con buy_signal / sell_signal)
+        trade_costs: Costes de calculate_trade_costs (opcional); añade net_return y pnl
+
+    Returns:
+        DataFrame de extract_trades (solo cerrados) con return, holding_minutes, volume_ratio
+        y las columnas de agrupación (ver add_trade_features)
+    """
+    from backtesting import extract_trades
+
+    trades = extract_trades(results)
+    trades = trades[trades['exit_pos'] >= 0].copy()
+    trades['return'] = trades['gross_return']
+    if trade_costs is not None:
+        trades['net_return'] = trade_costs['net_return'].reindex(trades.index).to_numpy()
+        trades['pnl'] = (trade_costs['capital_after'] - trade_costs['capital_before']).reindex(trades.index).to_numpy()
+
+    # Volumen de la vela de entrada frente a su media móvil
+    if 'volume' in results.columns:
+        volume = results['volume'].to_numpy(dtype=np.float64)
+        if 'volume_ma' in results.columns:
+            volume_ma = results['volume_ma'].to_numpy(dtype=np.float64)
+        else:
+            volume_ma = pd.Series(volume).rolling(TRADE_ANALYTICS_CONFIG['volume_window'],
+                                                  min_periods=10).mean().to_numpy()
+        entry_pos = trades['entry_pos'].to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            trades['volume_ratio'] = volume[entry_pos] / volume_ma[entry_pos]
+    return add_trade_features(trades.reset_index(drop=True))
+
+
+def add_trade_features(trades: pd.DataFrame) -> pd.DataFrame:
+    """
+    Añade las columnas de agrupación a una tabla con entry_time y exit_time
+
+    entry_hour, weekday y month salen de la hora de entrada; holding_bucket de la
+    duración en minutos y volume_ratio_bucket de volume_ratio (si existe).
+    """
+    entry_ns = timestamps_to_ns(trades['entry_time'])
+    exit_ns = timestamps_to_ns(trades['exit_time'])
+    entry = entry_ns.view('datetime64[ns]')
+    trades = trades.assign(
+        entry_hour=(entry_ns // 3_600_000_000_000) % 24,
+        weekday=pd.Categorical.from_codes((entry.astype('datetime64[D]').astype(np.int64) + 3) % 7,
+                                          categories=WEEKDAYS, ordered=True),
+        month=entry.astype('datetime64[M]').astype(np.int64) % 12 + 1,
+        holding_minutes=(exit_ns - entry_ns) / 60e9
+    )
+    trades['holding_bucket'] = bucketize(trades['holding_minutes'], TRADE_ANALYTICS_CONFIG['holding_buckets'], 'min')
+    if 'volume_ratio' in trades.columns:
+        trades['volume_ratio_bucket'] = bucketize(trades['volume_ratio'],
+                                                  TRADE_ANALYTICS_CONFIG['volume_ratio_buckets'], 'x')
+    return trades
+
+
+def _codes(trades: pd.DataFrame, by: list) -> tuple:
+    """
+    Código entero de grupo por trade (combinando varias claves) y las claves de cada grupo
+    """
+    codes, levels = [], []
+    for column in by:
+        code, uniques = pd.factorize(trades[column], sort=True)
+        codes.append(code)
+        levels.append(uniques)
+    if len(by) == 1:
+        return codes[0], levels
+    sizes = [len(level) for level in levels]
+    valid = np.all([code >= 0 for code in codes], axis=0)
+    combined = np.full(len(trades), -1, dtype=np.int64)
+    combined[valid] = np.ravel_multi_index([code[valid] for code in codes], sizes)
+    compact, groups = pd.factorize(combined, sort=True)
+    if groups[0:1].tolist() == [-1]:
+        compact, groups = compact - 1, groups[1:]
+    unravelled = np.unravel_index(np.asarray(groups, dtype=np.int64), sizes)
+    return compact, [level[index] for level, index in zip(levels, unravelled)]
+
+
+def group_stats(trades: pd.DataFrame, by, return_column: str = 'return', pnl_column: str = None) -> pd.DataFrame:
+    """
+    Estadísticas por grupo en una sola pasada vectorizada
+
+    Args:
+        trades: Tabla de trades
+        by: Columna (o lista de columnas) de agrupación
+        return_column: Retorno por trade
+        pnl_column: Resultado monetario por trade; si no se indica, la contribución se
+            calcula sobre la suma de retornos
+
+    Returns:
+        DataFrame indexado por grupo con trades, share, mean_return, median_return,
+        win_rate, total_return y contribution (fracción del P&L total)
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    codes, levels = _codes(trades, by)
+    keep = codes >= 0
+    codes = codes[keep]
+    returns = trades[return_column].to_numpy(dtype=np.float64)[keep]
+    pnl = returns if pnl_column is None else trades[pnl_column].to_numpy(dtype=np.float64)[keep]
+    n_groups = len(levels[0])
+
+    count = np.bincount(codes, minlength=n_groups)
+    total = np.bincount(codes, weights=returns, minlength=n_groups)
+    wins = np.bincount(codes, weights=returns > 0, minlength=n_groups)
+    group_pnl = np.bincount(codes, weights=pnl, minlength=n_groups)
+
+    # Medianas: retornos ordenados dentro de cada grupo (orden por retorno y después orden
+    # estable por grupo, que con códigos de 16 bits es un radix sort) y los dos centrales
+    by_return = np.argsort(returns)
+    group_codes = codes[by_return].astype(np.min_scalar_type(max(n_groups - 1, 0)))
+    ordered = returns[by_return][np.argsort(group_codes, kind='stable')]
+    start = np.concatenate(([0], np.cumsum(count)[:-1]))
+    median = np.full(n_groups, np.nan)
+    present = count > 0
+    lower = ordered[(start + (count - 1) // 2)[present]]
+    upper = ordered[(start + count // 2)[present]]
+    median[present] = (lower + upper) / 2
+
+    pnl_total = pnl.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table = pd.DataFrame({
+            'trades': count,
+            'share': count / max(len(codes), 1),
+            'mean_return': total / count,
+            'median_return': median,
+            'win_rate': wins / count,
+            'total_return': total,
+            'contribution': group_pnl / pnl_total if pnl_total != 0 else np.nan
+        })
+    table.index = pd.MultiIndex.from_arrays(levels, names=by) if len(by) > 1 else pd.Index(levels[0], name=by[0])
+    return table[table['trades'] > 0]
+
+
+def trade_breakdowns(trades: pd.DataFrame, breakdowns: dict = None, return_column: str = None,
+                     pnl_column: str = None) -> dict:
+    """
+    Todos los desgloses de BREAKDOWNS disponibles en la tabla
+
+    Por defecto usa net_return y pnl si la tabla trae costes, y el retorno bruto si no.
+
+    Returns:
+        dict: {nombre del desglose: DataFrame de group_stats}
+    """
+    breakdowns = breakdowns or BREAKDOWNS
+    return_column = return_column or ('net_return' if 'net_return' in trades.columns else 'return')
+    if pnl_column is None and 'pnl' in trades.columns:
+        pnl_column = 'pnl'
+    return {name: group_stats(trades, column, return_column, pnl_column)
+            for name, column in breakdowns.items() if column in trades.columns}
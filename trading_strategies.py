@@ -3,24 +3,21 @@ Estrategias de trading para análisis técnico
 """
 import pandas as pd
 import numpy as np
+from config import BACKTEST_CONFIG
+from session_calendar import SessionCalendar
+from resampling import ResamplingCache
+from bars import Bars, as_bars
 
 
-def aggregate_volume_15min(df: pd.DataFrame) -> pd.DataFrame:
+def aggregate_volume_15min(df, cache: ResamplingCache = None) -> pd.DataFrame:
     """
     Agrega el volumen de datos de 5 minutos a intervalos de 15 minutos
-    """
-    df = df.copy()
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df.set_index('timestamp', inplace=True)
-    
-    # Resample a 15 minutos sumando el volumen y tomando el último precio de cierre
-    df_15min = df.resample('15min').agg({
-        'close': 'last',
-        'volume': 'sum'
-    }).dropna()
     
-    df_15min.reset_index(inplace=True)
-    return df_15min
+    Acepta un DataFrame o un Bars (en cuyo caso se reutiliza su caché de remuestreos).
+    """
+    cache = cache or as_bars(df).resampling
+    df_15min = cache.get('15min').to_frame()
+    return df_15min[['timestamp', 'close', 'volume']]
 
 
 def detect_uptrend(prices: pd.Series, window: int = 3) -> bool:
@@ -43,176 +40,335 @@ def calculate_volume_threshold(volume_series: pd.Series, multiplier: float = 1.5
     return volume_mean * multiplier
 
 
-def _execute_volume_strategy(df: pd.DataFrame, buy_signals: pd.Series, 
+def uptrend_mask(close: np.ndarray, window: int = 3) -> np.ndarray:
+    """
+    Versión vectorizada de detect_uptrend aplicada en ventana móvil
+    
+    Una vela está en tendencia alcista si los últimos `window` precios no bajan
+    nunca y el último supera al primero.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    result = np.zeros(n, dtype=bool)
+    if window < 2 or n < window:
+        return result
+    
+    non_decreasing = np.concatenate(([0], np.cumsum(np.diff(close) >= 0)))
+    # Número de pasos no decrecientes dentro de la ventana que termina en cada vela
+    steps = non_decreasing[window - 1:] - non_decreasing[:n - window + 1]
+    result[window - 1:] = (steps == window - 1) & (close[window - 1:] > close[:n - window + 1])
+    return result
+
+
+# Códigos de razón de salida devueltos por el motor de trades
+EXIT_REASONS = np.array(['', 'stop_loss', 'take_profit', 'time_exit', 'end_of_day'])
+
+
+def _run_trade_engine(close: np.ndarray, entry_candidates: np.ndarray, end_of_day: np.ndarray,
+                      exit_periods: int, stop_loss: float, take_profit: float,
+                      high: np.ndarray = None, low: np.ndarray = None):
+    """
+    Motor de ejecución sobre arrays: salta de entrada en entrada y busca la salida
+    de cada posición en una única operación vectorizada sobre su ventana de tenencia
+    
+    Prioridad de salida en una misma vela: stop loss, take profit, tiempo y fin de día.
+    Tras una salida no se puede volver a entrar en la misma vela.
+    
+    Con high y low, el stop loss y el take profit se resuelven dentro de la vela: se
+    ejecutan al nivel de la orden si la vela lo cruza. Si la vela entera queda ya más allá
+    del nivel (hueco), a falta de precio de apertura se ejecutan al mínimo de la vela, el
+    peor precio posible para la venta. Si ambos niveles caen en la misma vela se asume el stop.
+    
+    Args:
+        close: Precios de cierre
+        entry_candidates: Máscara booleana de velas con señal de compra válida
+        end_of_day: Máscara booleana de velas de cierre obligatorio
+        exit_periods: Número máximo de velas en posición
+        stop_loss: Retorno a partir del cual se cierra con pérdida
+        take_profit: Retorno a partir del cual se cierra con ganancia
+        high, low: Máximos y mínimos de cada vela (opcionales)
+    
+    Returns:
+        tuple: (entradas, salidas, códigos de razón, precios de salida) como arrays;
+               una posición abierta al final de los datos tiene salida -1, código 0 y precio NaN
+    """
+    n = len(close)
+    candidates = np.flatnonzero(entry_candidates)
+    horizon = max(int(exit_periods), 1)
+    intrabar = high is not None and low is not None
+    entries, exits, reasons, exit_prices = [], [], [], []
+    
+    next_allowed = 0
+    while True:
+        k = np.searchsorted(candidates, next_allowed)
+        if k >= len(candidates):
+            break
+        entry = candidates[k]
+        entry_price = close[entry]
+        window_end = min(entry + 1 + horizon, n)
+        
+        window = slice(entry + 1, window_end)
+        worst, best = (low[window], high[window]) if intrabar else (close[window], close[window])
+        # Código de salida por vela según prioridad (0 = sin salida)
+        codes = np.where((worst - entry_price) / entry_price <= stop_loss, 1,
+                np.where((best - entry_price) / entry_price >= take_profit, 2,
+                np.where(np.arange(1, window_end - entry) >= exit_periods, 3,
+                np.where(end_of_day[window], 4, 0))))
+        hits = np.flatnonzero(codes)
+        
+        entries.append(entry)
+        if len(hits) == 0:
+            # Datos agotados con la posición abierta
+            exits.append(-1)
+            reasons.append(0)
+            exit_prices.append(np.nan)
+            break
+        exit_bar = entry + 1 + hits[0]
+        code = codes[hits[0]]
+        exit_price = close[exit_bar]
+        if intrabar and code == 1:
+            stop_price = entry_price * (1 + stop_loss)
+            exit_price = stop_price if high[exit_bar] >= stop_price else low[exit_bar]
+        elif intrabar and code == 2:
+            exit_price = max(entry_price * (1 + take_profit), low[exit_bar])
+        exits.append(exit_bar)
+        reasons.append(code)
+        exit_prices.append(exit_price)
+        next_allowed = exit_bar + 1
+    
+    return (np.asarray(entries, dtype=np.int64), np.asarray(exits, dtype=np.int64),
+            np.asarray(reasons, dtype=np.int8), np.asarray(exit_prices, dtype=np.float64))
+
+
+def _execute_volume_strategy(df, buy_signals: pd.Series, 
                            trend_window: int = 3, exit_periods: int = 12,
-                           stop_loss: float = -0.005, take_profit: float = 0.02) -> pd.DataFrame:
+                           stop_loss: float = -0.005, take_profit: float = 0.02,
+                           calendar: SessionCalendar = None, bars: Bars = None,
+                           extra_columns: dict = None, quality=None, exit_minutes: float = None) -> pd.DataFrame:
     """
     Función base común para ejecutar estrategias de volume breakout
     
     Args:
-        df: DataFrame con datos de 5 minutos (ya procesado)
+        df: DataFrame o Bars con datos de 5 minutos (ya procesado)
         buy_signals: Serie booleana con las señales de compra pre-calculadas
         trend_window: Ventana para detectar tendencia alcista
-        exit_periods: Número de períodos para mantener la posición
+        exit_periods: Número de períodos (velas) para mantener la posición
         stop_loss: Porcentaje de pérdida para salir
         take_profit: Porcentaje de ganancia para salir
+        calendar: Calendario de sesiones de df (se construye si no se pasa)
+        bars: Velas de df ya convertidas (evita volver a parsear los timestamps)
+        extra_columns: Columnas intermedias de la estrategia a incluir en el resultado
+        quality: Índice de calidad (data_quality.QualityIndex) de la partición; si se pasa,
+                 no se abren posiciones tras huecos intradía ni en velas con retorno atípico
+        exit_minutes: Tiempo máximo en posición en minutos; si se pasa, sustituye a exit_periods
+                      (independiente del tamaño de vela)
     
     Returns:
         DataFrame con señales de trading ejecutadas
     """
-    result_df = df.copy()
-    result_df['buy_signal'] = False
-    result_df['sell_signal'] = False
-    result_df['position'] = 0
-    result_df['entry_price'] = 0.0
-    result_df['exit_price'] = 0.0
-    result_df['exit_reason'] = ''
-    
-    position = 0
-    entry_timestamp = None
-    entry_price = 0
-    entry_index = None
-    
-    # Procesar señales
-    for i, row in result_df.iterrows():
-        current_time = row['timestamp']
-        current_price = row['close']
-        
-        # Verificar señal de compra
-        if buy_signals.loc[i] and position == 0:
-            # Verificar horario válido para trades diarios
-            if current_time.hour < 16 or (current_time.hour == 16 and current_time.minute < 55):
-                result_df.loc[i, 'buy_signal'] = True
-                result_df.loc[i, 'position'] = 1
-                result_df.loc[i, 'entry_price'] = current_price
-                position = 1
-                entry_timestamp = current_time
-                entry_price = current_price
-                entry_index = i
-                
-        elif position == 1:
-            # Calcular retorno actual
-            current_return = (current_price - entry_price) / entry_price
-            time_diff = (current_time - entry_timestamp).total_seconds() / 60
-            periods_passed = i - entry_index if entry_index is not None else 0
-            
-            # Verificar condiciones de salida
-            exit_triggered = False
-            exit_reason = ''
-            
-            # 1. Stop Loss
-            if current_return <= stop_loss:
-                exit_triggered = True
-                exit_reason = 'stop_loss'
-                
-            # 2. Take Profit
-            elif current_return >= take_profit:
-                exit_triggered = True
-                exit_reason = 'take_profit'
-                
-            # 3. Salida por tiempo
-            elif periods_passed >= exit_periods:
-                exit_triggered = True
-                exit_reason = 'time_exit'
-                
-            # 4. Salida obligatoria al final del día
-            elif current_time.hour >= 16 and current_time.minute >= 55:
-                exit_triggered = True
-                exit_reason = 'end_of_day'
-            
-            if exit_triggered:
-                result_df.loc[i, 'sell_signal'] = True
-                result_df.loc[i, 'position'] = 0
-                result_df.loc[i, 'entry_price'] = entry_price
-                result_df.loc[i, 'exit_price'] = current_price
-                result_df.loc[i, 'exit_reason'] = exit_reason
-                position = 0
-                entry_timestamp = None
-                entry_price = 0
-                entry_index = None
-            else:
-                result_df.loc[i, 'position'] = 1
-                result_df.loc[i, 'entry_price'] = entry_price
+    bars = bars or as_bars(df)
+    calendar = calendar or bars.calendar
+    if exit_minutes is not None:
+        exit_periods = bars.periods(exit_minutes)
+    # Stops contra máximos y mínimos solo si las velas los traen (p. ej. datos de 1 minuto)
+    intrabar = BACKTEST_CONFIG['intrabar_exits'] and bars.high is not None and bars.low is not None
+    
+    entry_candidates = np.asarray(buy_signals, dtype=bool) & calendar.can_enter
+    if quality is not None:
+        entry_candidates &= ~quality.mask_for(bars.timestamps, quality.entry_blocked)
+    entries, exits, reasons, exit_prices = _run_trade_engine(
+        bars.close, entry_candidates, calendar.end_of_day, exit_periods, stop_loss, take_profit,
+        bars.high if intrabar else None, bars.low if intrabar else None)
+    return build_signal_frame(df, entries, exits, reasons, extra_columns, bars.timestamps,
+                              exit_prices if intrabar else None)
+
+
+def build_signal_frame(df, entries: np.ndarray, exits: np.ndarray, reasons: np.ndarray,
+                       extra_columns: dict = None, timestamps: np.ndarray = None,
+                       exit_prices: np.ndarray = None) -> pd.DataFrame:
+    """
+    Construye el DataFrame de señales de la estrategia a partir de los trades ejecutados
+    
+    Args:
+        df: Velas sobre las que se ejecutó la estrategia (DataFrame o Bars)
+        entries: Posiciones de entrada
+        exits: Posiciones de salida (-1 si la posición sigue abierta)
+        reasons: Códigos de razón de salida (índices de EXIT_REASONS)
+        extra_columns: Columnas adicionales a añadir antes de las señales
+        timestamps: Timestamps de df ya parseados (int64 ns); si df es un DataFrame
+                    con timestamps en texto se sustituyen por estos
+        exit_prices: Precio de ejecución de cada salida (por defecto, el cierre de la vela)
+    
+    Returns:
+        DataFrame con buy_signal, sell_signal, position, entry_price, exit_price y exit_reason
+    """
+    if isinstance(df, Bars):
+        close = df.close
+        result_df = df.to_frame()
+    else:
+        close = df['close'].to_numpy(dtype=np.float64)
+        result_df = df.copy()
+        if timestamps is not None and not pd.api.types.is_datetime64_dtype(result_df['timestamp']):
+            result_df['timestamp'] = np.asarray(timestamps, dtype=np.int64).view('datetime64[ns]')
+    n = len(close)
+    entries = np.asarray(entries, dtype=np.int64)
+    exits = np.asarray(exits, dtype=np.int64)
+    reasons = np.asarray(reasons, dtype=np.int8)
+    closed = exits >= 0
+    
+    buy_signal = np.zeros(n, dtype=bool)
+    sell_signal = np.zeros(n, dtype=bool)
+    buy_signal[entries] = True
+    sell_signal[exits[closed]] = True
+    
+    # Posición abierta en [entrada, salida) y precio de entrada en [entrada, salida]
+    last = np.where(closed, exits, n - 1)
+    held = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(held, entries, 1)
+    np.add.at(held, last + 1, -1)
+    in_trade = np.cumsum(held[:n]) > 0
+    trade_id = np.cumsum(buy_signal) - 1
+    entry_price = np.where(in_trade, np.append(close[entries], 0.0)[trade_id], 0.0)
+    position = in_trade & ~sell_signal
+    
+    exit_price = np.zeros(n)
+    exit_price[exits[closed]] = close[exits[closed]] if exit_prices is None else \
+        np.asarray(exit_prices, dtype=np.float64)[closed]
+    exit_reason = np.full(n, '', dtype=object)
+    exit_reason[exits[closed]] = EXIT_REASONS[reasons[closed]]
+    
+    for name, values in (extra_columns or {}).items():
+        # Copia: los intermedios pueden ser arrays compartidos de solo lectura (Bars.cached)
+        result_df[name] = np.array(values)
+    result_df['buy_signal'] = buy_signal
+    result_df['sell_signal'] = sell_signal
+    result_df['position'] = position.astype(np.int64)
+    result_df['entry_price'] = entry_price
+    result_df['exit_price'] = exit_price
+    result_df['exit_reason'] = exit_reason
     
     return result_df
 
 
-def volume_breakout_15min_strategy(df: pd.DataFrame, volume_multiplier: float = 1.5, 
+def volume_breakout_15min_signals(bars: Bars, volume_multiplier: float = 1.5, trend_window: int = 3,
+                                  resampling_cache: ResamplingCache = None) -> np.ndarray:
+    """
+    Señales de compra de volume_breakout_15min_strategy sobre las velas originales
+    
+    Solo dependen de volume_multiplier y trend_window: los parámetros de salida no las cambian.
+    """
+    # Agregar volumen a 15 minutos para generar señales
+    bars_15min = (resampling_cache or bars.resampling).get('15min')
+    if resampling_cache is None:
+        # Media de volumen y tendencia memoizadas en bars: se comparten entre parametrizaciones
+        volume_threshold = bars.rolling_mean('volume', 20, min_periods=10, timeframe='15min') * volume_multiplier
+        uptrend = bars.cached(('uptrend', '15min', trend_window),
+                              lambda: uptrend_mask(bars_15min.close, trend_window))
+    else:
+        volume_threshold = calculate_volume_threshold(pd.Series(bars_15min.volume), volume_multiplier).to_numpy()
+        uptrend = uptrend_mask(bars_15min.close, trend_window)
+    high_volume = bars_15min.volume > volume_threshold
+    buy_condition = high_volume & uptrend
+    
+    # Mapear señales de 15 min a datos de 5 min con el índice hijo -> padre
+    return bars_15min.to_child(buy_condition)
+
+
+def volume_breakout_5min_signals(bars: Bars, volume_multiplier: float = 1.5, trend_window: int = 3,
+                                 volume_window: int = 20, volume_minutes: float = None,
+                                 trend_minutes: float = None) -> tuple:
+    """
+    Señales de compra de volume_breakout_5min_strategy
+    
+    volume_minutes y trend_minutes, si se pasan, sustituyen a volume_window y trend_window
+    (en velas) con la duración equivalente según el tamaño de vela de bars.
+    
+    Returns:
+        tuple: (señales de compra, columnas intermedias para el resultado de la estrategia)
+    """
+    if volume_minutes is not None:
+        volume_window = bars.periods(volume_minutes)
+    if trend_minutes is not None:
+        trend_window = bars.periods(trend_minutes)
+    volume_ma = bars.rolling_mean('volume', volume_window, min_periods=min(10, volume_window))
+    volume_threshold = volume_ma * volume_multiplier
+    high_volume = bars.volume > volume_threshold
+    uptrend = bars.cached(('uptrend', None, trend_window), lambda: uptrend_mask(bars.close, trend_window))
+    extra_columns = {'volume_ma': volume_ma, 'volume_threshold': volume_threshold,
+                     'high_volume': high_volume, 'uptrend': uptrend}
+    return high_volume & uptrend, extra_columns
+
+
+def volume_breakout_15min_strategy(df, volume_multiplier: float = 1.5, 
                            trend_window: int = 3, exit_periods: int = 12,
-                           stop_loss: float = -0.005, take_profit: float = 0.02) -> pd.DataFrame:
+                           stop_loss: float = -0.005, take_profit: float = 0.02,
+                           calendar: SessionCalendar = None,
+                           resampling_cache: ResamplingCache = None, quality=None,
+                           exit_minutes: float = None) -> pd.DataFrame:
     """
     Estrategia de trading basada en breakout de volumen y tendencia alcista (agregación 15 min)
     TRADES DIARIOS: Cierra automáticamente todas las posiciones activas a las 15:55
     
     Args:
-        df: DataFrame con datos de 5 minutos
+        df: DataFrame o Bars con datos de 5 minutos
         volume_multiplier: Multiplicador para determinar volumen alto (1.5 = 50% superior a la media)
-        trend_window: Ventana para detectar tendencia alcista
-        exit_periods: Número de períodos (de 5 min) para mantener la posición
+        trend_window: Ventana para detectar tendencia alcista (en bloques de 15 minutos, por lo que
+            no depende del tamaño de vela)
+        exit_periods: Número de velas (de 5 min por defecto) para mantener la posición
         stop_loss: Porcentaje de pérdida para salir (-0.005 = -0.5%)
         take_profit: Porcentaje de ganancia para salir (0.02 = +2%)
+        calendar: Calendario de sesiones de df (opcional, se construye si no se pasa)
+        resampling_cache: Caché de remuestreos de df (opcional, se construye si no se pasa)
+        quality: Índice de calidad de la partición (opcional, ver data_quality)
+        exit_minutes: Tiempo máximo en posición en minutos (opcional, sustituye a exit_periods)
     
     Returns:
         DataFrame con señales de trading
     """
-    # Preparar datos de 5 minutos
-    df = df.copy()
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Agregar volumen a 15 minutos para generar señales
-    df_15min = aggregate_volume_15min(df)
-    df_15min['volume_threshold'] = calculate_volume_threshold(df_15min['volume'], volume_multiplier)
-    df_15min['high_volume'] = df_15min['volume'] > df_15min['volume_threshold']
-    df_15min['uptrend'] = df_15min['close'].rolling(window=trend_window).apply(
-        lambda x: detect_uptrend(x, trend_window), raw=False
-    ).fillna(False).astype(bool)
-    df_15min['buy_condition'] = df_15min['high_volume'] & df_15min['uptrend']
-    
-    # Mapear señales de 15 min a datos de 5 min
-    buy_signals = pd.Series(False, index=df.index)
-    for i, row in df.iterrows():
-        time_15min = row['timestamp'].floor('15min')
-        signal_row = df_15min[df_15min['timestamp'] == time_15min]
-        if not signal_row.empty:
-            buy_signals.loc[i] = signal_row.iloc[0]['buy_condition']
+    # Preparar datos de 5 minutos (los timestamps se parsean una sola vez)
+    bars = as_bars(df)
+    buy_signals = volume_breakout_15min_signals(bars, volume_multiplier, trend_window, resampling_cache)
     
     # Ejecutar estrategia usando función base común
-    return _execute_volume_strategy(df, buy_signals, trend_window, exit_periods, stop_loss, take_profit)
+    return _execute_volume_strategy(df, buy_signals, trend_window, exit_periods, stop_loss, take_profit,
+                                    calendar, bars, quality=quality, exit_minutes=exit_minutes)
 
 
-def volume_breakout_5min_strategy(df: pd.DataFrame, volume_multiplier: float = 1.5, 
+def volume_breakout_5min_strategy(df, volume_multiplier: float = 1.5, 
                                  trend_window: int = 3, exit_periods: int = 12,
                                  stop_loss: float = -0.005, take_profit: float = 0.02,
-                                 volume_window: int = 20) -> pd.DataFrame:
+                                 volume_window: int = 20, calendar: SessionCalendar = None,
+                                 quality=None, exit_minutes: float = None, volume_minutes: float = None,
+                                 trend_minutes: float = None) -> pd.DataFrame:
     """
     Estrategia de trading basada en breakout de volumen y tendencia alcista
     trabajando directamente sobre velas de 5 minutos (sin agregaciones)
     TRADES DIARIOS: Cierra automáticamente todas las posiciones activas a las 16:55
     
     Args:
-        df: DataFrame con datos de 5 minutos
+        df: DataFrame o Bars con datos de 5 minutos
         volume_multiplier: Multiplicador para determinar volumen alto (1.5 = 50% superior a la media)
         trend_window: Ventana para detectar tendencia alcista
-        exit_periods: Número de períodos (de 5 min) para mantener la posición
+        exit_periods: Número de velas (de 5 min por defecto) para mantener la posición
         stop_loss: Porcentaje de pérdida para salir (-0.005 = -0.5%)
         take_profit: Porcentaje de ganancia para salir (0.02 = +2%)
         volume_window: Ventana para calcular la media móvil del volumen
+        calendar: Calendario de sesiones de df (opcional, se construye si no se pasa)
+        quality: Índice de calidad de la partición (opcional, ver data_quality)
+        exit_minutes: Tiempo máximo en posición en minutos (opcional, sustituye a exit_periods)
+        volume_minutes: Duración de la media de volumen en minutos (opcional, sustituye a volume_window)
+        trend_minutes: Duración de la ventana de tendencia en minutos (opcional, sustituye a trend_window)
     
     Returns:
         DataFrame con señales de trading
     """
-    # Preparar datos de 5 minutos
-    df = df.copy()
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    # Preparar datos de 5 minutos (los timestamps se parsean una sola vez)
+    bars = as_bars(df)
     
     # Calcular señales de compra directamente en datos de 5 minutos
-    df['volume_ma'] = df['volume'].rolling(window=volume_window, min_periods=10).mean()
-    df['volume_threshold'] = df['volume_ma'] * volume_multiplier
-    df['high_volume'] = df['volume'] > df['volume_threshold']
-    df['uptrend'] = df['close'].rolling(window=trend_window).apply(
-        lambda x: detect_uptrend(x, trend_window), raw=False
-    ).fillna(False).astype(bool)
-    buy_signals = df['high_volume'] & df['uptrend']
+    buy_signals, extra_columns = volume_breakout_5min_signals(bars, volume_multiplier, trend_window, volume_window,
+                                                              volume_minutes, trend_minutes)
     
     # Ejecutar estrategia usando función base común
-    return _execute_volume_strategy(df, buy_signals, trend_window, exit_periods, stop_loss, take_profit)
\ No newline at end of file
+    return _execute_volume_strategy(df, buy_signals, trend_window, exit_periods, stop_loss, take_profit,
+                                    calendar, bars, extra_columns, quality, exit_minutes)
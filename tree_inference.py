@@ -0,0 +1,342 @@
+"""
+Inferencia compilada de los modelos de árboles de ml_training
+
+Un modelo entrenado (DecisionTree, RandomForest o GradientBoosting) y su escalado
+(el ColumnTransformer de model_training) se exportan a arrays NumPy contiguos:
+    - escalado: una transformación afín por columna de salida,
+    - árboles: todos los nodos de todos los árboles en los mismos arrays (feature,
+      umbral, hijo izquierdo, hijo derecho y valor), con las hojas apuntando a sí mismas.
+
+La predicción recorre todos los árboles a la vez (una iteración por nivel de
+profundidad) sin pasar por sklearn, así que una sola vela se evalúa en decenas de
+microsegundos. Las operaciones replican las de sklearn (escalado en float64,
+comparación de los umbrales con las features en float32 y el mismo orden de suma),
+por lo que las predicciones son idénticas (las probabilidades del boosting binario
+pueden diferir en el último bit de la sigmoide).
+"""
+import json
+import os
+
+import numpy as np
+
+_FORMAT_VERSION = 1
+
+
+def _compile_scaler(scaler) -> dict:
+    """
+    Columnas de entrada y constantes afines ((x - sub) / div) * mul + add de cada columna de salida
+
+    Con las constantes neutras (0 y 1) cada paso es exacto, así que el resultado coincide
+    bit a bit con el transform de cada escalador.
+    """
+    from sklearn.preprocessing import MinMaxScaler, RobustScaler, StandardScaler
+
+    inputs = list(scaler.feature_names_in_)
+    columns, sub, div, mul, add = [], [], [], [], []
+    for name, transformer, transformer_columns in scaler.transformers_:
+        if transformer == 'drop' or len(transformer_columns) == 0:
+            continue
+        n = len(transformer_columns)
+        zeros, ones = np.zeros(n), np.ones(n)
+        if transformer == 'passthrough':
+            constants = (zeros, ones, ones, zeros)
+        elif isinstance(transformer, MinMaxScaler):
+            if transformer.clip:
+                raise ValueError(f"MinMaxScaler con clip=True no soportado ({name})")
+            constants = (zeros, ones, transformer.scale_, transformer.min_)
+        elif isinstance(transformer, StandardScaler):
+            constants = (transformer.mean_ if transformer.with_mean else zeros,
+                         transformer.scale_ if transformer.with_std else ones, ones, zeros)
+        elif isinstance(transformer, RobustScaler):
+            constants = (transformer.center_ if transformer.with_centering else zeros,
+                         transformer.scale_ if transformer.with_scaling else ones, ones, zeros)
+        else:
+            raise ValueError(f"Escalador no soportado en '{name}': {type(transformer).__name__}")
+        columns += [inputs[i] if isinstance(i, (int, np.integer)) else i for i in transformer_columns]
+        for values, constant in zip((sub, div, mul, add), constants):
+            values.append(np.asarray(constant, dtype=np.float64))
+    return {'inputs': inputs, 'columns': columns, 'sub': np.concatenate(sub), 'div': np.concatenate(div),
+            'mul': np.concatenate(mul), 'add': np.concatenate(add)}
+
+
+def _flatten_trees(trees, values, missing: bool) -> dict:
+    """
+    Nodos de varios árboles en arrays contiguos con índices globales
+
+    Args:
+        trees: Objetos tree_ de sklearn
+        values: Valor de cada nodo por árbol (array (nodos, salidas))
+        missing: Si se respeta missing_go_to_left (los NaN van a la derecha si no)
+    """
+    roots, feature, threshold, left, right, missing_left, value = [], [], [], [], [], [], []
+    offset, depth = 0, 0
+    for tree, tree_values in zip(trees, values):
+        nodes = np.arange(tree.node_count)
+        leaf = tree.children_left < 0
+        roots.append(offset)
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        left.append(np.where(leaf, nodes, tree.children_left) + offset)
+        right.append(np.where(leaf, nodes, tree.children_right) + offset)
+        tree_missing = getattr(tree, 'missing_go_to_left', None)
+        missing_left.append(tree_missing.astype(bool) if missing and tree_missing is not None
+                            else np.zeros(tree.node_count, dtype=bool))
+        value.append(tree_values)
+        offset += tree.node_count
+        depth = max(depth, tree.max_depth)
+    return {'roots': np.array(roots, dtype=np.int64), 'feature': np.concatenate(feature).astype(np.int64),
+            'threshold': np.concatenate(threshold), 'left': np.concatenate(left).astype(np.int64),
+            'right': np.concatenate(right).astype(np.int64), 'missing_left': np.concatenate(missing_left),
+            'value': np.ascontiguousarray(np.concatenate(value)), 'depth': depth}
+
+
+def _leaf_probabilities(tree) -> np.ndarray:
+    # Igual que DecisionTreeClassifier.predict_proba: valor del nodo normalizado a suma 1
+    value = tree.value[:, 0, :]
+    normalizer = value.sum(axis=1, keepdims=True)
+    normalizer[normalizer == 0.0] = 1.0
+    return value / normalizer
+
+
+class CompiledTreeModel:
+    """
+    Modelo de árboles (y escalado opcional) como arrays NumPy contiguos
+
+    Se construye con compile_model() o load_compiled(); predict y predict_proba
+    aceptan un DataFrame con las columnas originales, un array 2D (una fila por vela)
+    o una sola fila 1D.
+    """
+
+    def __init__(self, arrays: dict, meta: dict):
+        self.arrays = arrays
+        self.meta = meta
+        self.kind = meta['kind']
+        self.classes = arrays['classes']
+        self.inputs = meta['inputs']
+        self.depth = meta['depth']
+        for key in ('roots', 'feature', 'threshold', 'left', 'right', 'missing_left', 'value'):
+            setattr(self, key, arrays[key])
+        self.has_missing = bool(self.missing_left.any())
+        self.scaled = 'scale_sub' in arrays
+        if self.scaled:
+            self.source = arrays['scale_source']
+            self.sub, self.div = arrays['scale_sub'], arrays['scale_div']
+            self.mul, self.add = arrays['scale_mul'], arrays['scale_add']
+
+    def _features(self, X) -> np.ndarray:
+        """
+        Features (escaladas si hay escalado) en float32 como 2D
+        """
+        if hasattr(X, 'columns'):
+            X = X[self.inputs].to_numpy(dtype=np.float64)
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if self.scaled:
+            X = (X[:, self.source] - self.sub) / self.div * self.mul + self.add
+        return X.astype(np.float32)
+
+    def _leaves(self, X: np.ndarray) -> np.ndarray:
+        """
+        Hoja de cada árbol para cada fila: (filas, árboles)
+        """
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.depth):
+            x = X[rows, self.feature[node]]
+            go_left = x <= self.threshold[node]
+            if self.has_missing:
+                go_left |= np.isnan(x) & self.missing_left[node]
+            next_node = np.where(go_left, self.left[node], self.right[node])
+            # Todos los recorridos ya están en una hoja
+            if np.array_equal(next_node, node):
+                break
+            node = next_node
+        return node
+
+    def decision_function(self, X) -> np.ndarray:
+        """
+        Predicción en bruto: probabilidades medias (árboles de decisión y bosques) o la
+        suma de las etapas del boosting más la predicción inicial (filas, salidas)
+        """
+        values = self.value[self._leaves(self._features(X))]
+        if self.kind == 'forest':
+            # Suma secuencial árbol a árbol, como el acumulado de RandomForest
+            return np.cumsum(values, axis=1)[:, -1] / len(self.roots)
+        # Boosting: init + lr * valor de cada etapa, sumados en orden
+        n_outputs = self.arrays['init'].shape[0]
+        stages = values.reshape(len(values), -1, n_outputs) * self.meta['learning_rate']
+        init = np.broadcast_to(self.arrays['init'], (len(values), 1, n_outputs))
+        return np.cumsum(np.concatenate([init, stages], axis=1), axis=1)[:, -1]
+
+    def predict_proba(self, X) -> np.ndarray:
+        raw = self.decision_function(X)
+        if self.kind == 'forest':
+            return raw
+        if raw.shape[1] == 1:
+            proba = np.empty((len(raw), 2))
+            # Misma fórmula que scipy.special.expit (la exp de NumPy puede diferir en el último bit)
+            with np.errstate(over='ignore'):
+                proba[:, 1] = 1 / (1 + np.exp(-raw[:, 0]))
+            proba[:, 0] = 1 - proba[:, 1]
+            return proba
+        exp = np.exp(raw - raw.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, X) -> np.ndarray:
+        raw = self.decision_function(X)
+        if self.kind == 'boosting' and raw.shape[1] == 1:
+            return self.classes[(raw[:, 0] >= 0).astype(int)]
+        return self.classes[np.argmax(raw, axis=1)]
+
+    def save(self, path: str):
+        """
+        Guarda los arrays en un .npz sin comprimir (se cargan sin pickle)
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, __meta__=np.array(json.dumps(self.meta)), **self.arrays)
+        os.replace(tmp_path, path)
+
+
+def compile_model(model, scaler=None) -> CompiledTreeModel:
+    """
+    Exporta un clasificador de árboles entrenado (y su escalado) a arrays contiguos
+
+    Args:
+        model: DecisionTreeClassifier, RandomForestClassifier o GradientBoostingClassifier entrenado
+        scaler: ColumnTransformer ajustado de model_training (opcional); sin él, las
+            predicciones esperan las features ya escaladas
+
+    Returns:
+        CompiledTreeModel
+    """
+    # sklearn solo hace falta para compilar: la predicción del modelo compilado es solo NumPy
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+    from sklearn.tree import DecisionTreeClassifier
+
+    if isinstance(model, DecisionTreeClassifier):
+        kind, trees = 'forest', [model.tree_]
+        values = [_leaf_probabilities(model.tree_)]
+    elif isinstance(model, RandomForestClassifier):
+        kind, trees = 'forest', [estimator.tree_ for estimator in model.estimators_]
+        values = [_leaf_probabilities(tree) for tree in trees]
+    elif isinstance(model, GradientBoostingClassifier):
+        kind, trees = 'boosting', [estimator.tree_ for estimator in model.estimators_.ravel()]
+        values = [tree.value[:, 0, :] for tree in trees]
+    else:
+        raise ValueError(f"Modelo no soportado: {type(model).__name__}")
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise ValueError("Solo se soportan modelos de una salida")
+
+    # El boosting de sklearn usa el recorrido rápido, que no mira missing_go_to_left
+    arrays = _flatten_trees(trees, values, missing=kind == 'forest')
+    depth = arrays.pop('depth')
+    arrays['classes'] = np.asarray(model.classes_)
+    meta = {'version': _FORMAT_VERSION, 'kind': kind, 'model': type(model).__name__, 'depth': int(depth),
+            'n_features': int(model.n_features_in_), 'inputs': None}
+    if kind == 'boosting':
+        if model.init_ != 'zero' and type(model.init_).__name__ != 'DummyClassifier':
+            raise ValueError(f"Estimador inicial no soportado: {type(model.init_).__name__}")
+        # Con el init por defecto (o 'zero') la predicción inicial es la misma para cualquier fila
+        arrays['init'] = model._raw_predict_init(np.zeros((1, model.n_features_in_)))[0]
+        meta['learning_rate'] = float(model.learning_rate)
+
+    if scaler is not None:
+        compiled = _compile_scaler(scaler)
+        if len(compiled['columns']) != model.n_features_in_:
+            raise ValueError(f"El escalado produce {len(compiled['columns'])} columnas y el modelo "
+                             f"espera {model.n_features_in_}")
+        meta['inputs'] = compiled['inputs']
+        meta['columns'] = compiled['columns']
+        arrays['scale_source'] = np.array([compiled['inputs'].index(c) for c in compiled['columns']])
+        for key in ('sub', 'div', 'mul', 'add'):
+            arrays[f'scale_{key}'] = compiled[key]
+    return CompiledTreeModel(arrays, meta)
+
+
+def load_compiled(path: str) -> CompiledTreeModel:
+    with np.load(path) as data:
+        meta = json.loads(str(data['__meta__']))
+        if meta['version'] != _FORMAT_VERSION:
+            raise ValueError(f"Versión del modelo compilado no soportada en {path}")
+        arrays = {key: data[key] for key in data.files if key != '__meta__'}
+    return CompiledTreeModel(arrays, meta)
+
+
+def compiled_path(model_type: str) -> str:
+    return f'trained_models/{model_type}_compiled_2.npz'
+
+
+def export_model(model_type: str, path: str = None) -> str:
+    """
+    Compila el modelo y el escalado guardados por model_training (trained_models/<modelo>_*_2.pkl)
+
+    Returns:
+        str: Ruta del .npz
+    """
+    import joblib
+
+    model = joblib.load(f'trained_models/{model_type}_trained_2.pkl')
+    scaler = joblib.load(f'trained_models/{model_type}_scaler_2.pkl')
+    path = path or compiled_path(model_type)
+    compile_model(model, scaler).save(path)
+    return path
+
+
+def benchmark(model, scaler, features, repeats: int = 200) -> dict:
+    """
+    Compara predicciones y latencia por vela entre sklearn y el modelo compilado
+
+    Args:
+        model, scaler: Modelo y escalado de sklearn
+        features: DataFrame con las columnas de entrada del escalado
+
+    Returns:
+        dict: identical (predicciones iguales en todo el lote), max_proba_diff y latencias
+        medias en microsegundos (una vela y por vela en lote)
+    """
+    import time
+
+    compiled = compile_model(model, scaler)
+    expected = model.predict(scaler.transform(features))
+    predicted = compiled.predict(features)
+    proba_diff = np.abs(model.predict_proba(scaler.transform(features)) - compiled.predict_proba(features)).max()
+
+    rows = features.to_numpy(dtype=np.float64)
+    single = features.iloc[:1]
+    start = time.perf_counter()
+    for _ in range(max(repeats // 20, 1)):
+        model.predict(scaler.transform(single))
+    sklearn_row = (time.perf_counter() - start) / max(repeats // 20, 1)
+    start = time.perf_counter()
+    for i in range(repeats):
+        compiled.predict(rows[i % len(rows)])
+    compiled_row = (time.perf_counter() - start) / repeats
+    start = time.perf_counter()
+    model.predict(scaler.transform(features))
+    sklearn_batch = (time.perf_counter() - start) / len(features)
+    start = time.perf_counter()
+    compiled.predict(rows)
+    compiled_batch = (time.perf_counter() - start) / len(features)
+    return {'identical': bool(np.array_equal(expected, predicted)), 'max_proba_diff': float(proba_diff),
+            'sklearn_row_us': sklearn_row * 1e6, 'compiled_row_us': compiled_row * 1e6,
+            'sklearn_batch_us': sklearn_batch * 1e6, 'compiled_batch_us': compiled_batch * 1e6}
+
+
+if __name__ == '__main__':
+    import sys
+
+    import joblib
+    import pandas as pd
+
+    from partition_store import partition_path
+
+    model_type = sys.argv[1] if len(sys.argv) > 1 else 'RandomForest'
+    path = export_model(model_type)
+    print(f"🌲 {model_type} compilado en {path}")
+    model = joblib.load(f'trained_models/{model_type}_trained_2.pkl')
+    scaler = joblib.load(f'trained_models/{model_type}_scaler_2.pkl')
+    features = pd.read_csv(partition_path(2022, 'labelled'), nrows=20000)[scaler.feature_names_in_].dropna()
+    for key, value in benchmark(model, scaler, features).items():
+        print(f"   • {key}: {value:.2f}" if isinstance(value, float) else f"   • {key}: {value}")
@@ -1,15 +1,26 @@
 import pandas as pd
+from session_calendar import SessionCalendar
+from data_quality import gap_mask
+from bars import Bars
+from feature_matrix import rsi_signal, sign_signals
 
 
-def clean_noisy_data(df: pd.DataFrame) -> pd.DataFrame:
-    # Clean noisy data for early and late hours
+def clean_noisy_data(df: pd.DataFrame, calendar: SessionCalendar = None) -> pd.DataFrame:
+    # Clean noisy data for early and late hours (SESSION_CONFIG['trading_hours'])
+    if isinstance(df, Bars):
+        # Timestamps ya validados: filtrado directo con el calendario del contenedor
+        return df.session('trading')
     df['timestamp'] = pd.to_datetime(df['timestamp'])
-    # df = df[(df['timestamp'].dt.hour >= 10) & (df['timestamp'].dt.hour < 16)]
-    df = df[(df['timestamp'].dt.hour >= 10) & (df['timestamp'].dt.hour < 17)]
+    calendar = calendar or SessionCalendar.from_frame(df)
+    df = df[calendar.trading_mask]
     return df
 
 
-def slprofit_strategy(df, profit, stop_loss, range) -> [str, int]:
+def slprofit_strategy(df, profit, stop_loss, range, gap_before=None) -> [str, int]:
+    # gap_before: máscara de huecos alineada con df (QualityIndex.mask_for); si no se pasa
+    # se calcula una sola vez sobre la ventana en lugar de parsear timestamps en el bucle
+    if gap_before is None:
+        gap_before = gap_mask(df['timestamp'])
     current_value = df['close'].iloc[0]  # El precio actual
     future_values = df['close'].iloc[1:range] if len(df['close'].iloc[1:]) >= range else df['close'].iloc[1:]
     i = range if len(df['close'].iloc[1:]) >= range else len(df['close'].iloc[:])
@@ -19,7 +30,7 @@ def slprofit_strategy(df, profit, stop_loss, range) -> [str, int]:
         percentage_change = (value - current_value) / current_value
 
         if percentage_change >= profit:
-            if (pd.to_datetime(df.iloc[i+1]['timestamp']) - pd.to_datetime(df.iloc[i]['timestamp'])).total_seconds()/60 > 5:
+            if gap_before[i+1]:
                 break
                 # return ['Gap-Buy', i]
             else:
@@ -45,25 +56,14 @@ def simple_strategy(df) -> [str, int]:
 
 
 def transform_rsi_optimized(rsi_series):
-    rsi_transformed = pd.Series(index=rsi_series.index, dtype=int)
-
-    # Condiciones
-    rsi_transformed[rsi_series > 70] = -1  # RSI > 70 -> -1
-    rsi_transformed[rsi_series < 30] = 1  # RSI < 30 -> +1
-
-    # Entre 30 y 70
-    between_30_70 = (rsi_series >= 30) & (rsi_series <= 70)
-    rsi_transformed[between_30_70] = (rsi_series.diff()[between_30_70] > 0).apply(lambda x: 1 if x else -1)
-
-    return rsi_transformed
+    # RSI > 70 -> -1, RSI < 30 -> +1 y entre ambos el signo de su variación (vectorizado en feature_matrix)
+    return pd.Series(rsi_signal(rsi_series), index=rsi_series.index)
 
 
 def discretize_features(df: pd.DataFrame) -> pd.DataFrame:
-    df['MACD'] = df['MACD'].diff().apply(lambda x: 1 if x > 0 else -1)
-    df['SMA'] = (df['close'] > df['SMA']).apply(lambda x: 1 if x else -1)
-    df['EMA'] = (df['close'] > df['EMA']).apply(lambda x: 1 if x else -1)
-    df['MOM'] = df['MOM'].apply(lambda x: 1 if x > 0 else -1)
-    df['RSI'] = transform_rsi_optimized(df['RSI'])
+    # Señales +1 / -1 en int8 (feature_matrix.sign_signals); para la matriz empaquetada ver build_feature_matrix
+    for column, signal in sign_signals(df).items():
+        df[column] = signal
     return df
 
 
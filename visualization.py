@@ -1,9 +1,211 @@
 """
 Herramientas de visualización para backtesting y análisis de trading
 """
-import matplotlib.pyplot as plt
+import os
 import pandas as pd
 import numpy as np
+from config import VISUALIZATION_CONFIG, OUTPUT_CONFIG
+from backtesting import extract_trades
+
+
+def _pyplot():
+    """
+    Importa matplotlib solo al dibujar; las salidas de texto no lo necesitan
+    """
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _timestamps_to_ns(timestamps) -> np.ndarray:
+    """
+    Convierte una serie de timestamps a un array int64 de nanosegundos
+    """
+    return pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Selecciona los índices a conservar con Largest-Triangle-Three-Buckets (LTTB)
+    
+    Mantiene la forma visual de la serie (picos, valles y tendencias) usando
+    solo n_out puntos. El primer y el último punto siempre se conservan.
+    
+    Args:
+        x: Eje X numérico (por ejemplo, timestamps en ns)
+        y: Valores de la serie
+        n_out: Número de puntos a conservar
+    
+    Returns:
+        np.ndarray: Índices ordenados de los puntos seleccionados
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    # Límites de los cubos interiores (el primer y último punto van aparte)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Media de cada cubo, calculada de una vez con sumas acumuladas
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    counts = np.maximum(edges[1:] - edges[:-1], 1)
+    avg_x = (cum_x[edges[1:]] - cum_x[edges[:-1]]) / counts
+    avg_y = (cum_y[edges[1:]] - cum_y[edges[:-1]]) / counts
+    avg_x = np.append(avg_x, x[-1])
+    avg_y = np.append(avg_y, y[-1])
+    
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for b in range(n_out - 2):
+        start, end = edges[b], max(edges[b + 1], edges[b] + 1)
+        # Área del triángulo (punto previo, candidato, media del cubo siguiente)
+        area = np.abs((x[prev] - avg_x[b + 1]) * (y[start:end] - y[prev])
+                      - (x[prev] - x[start:end]) * (avg_y[b + 1] - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[b + 1] = prev
+    
+    return selected
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Selecciona los índices del mínimo y máximo de cada cubo (min/max bucketing)
+    
+    Garantiza que ningún extremo local de la serie desaparezca del gráfico,
+    lo que lo hace adecuado para drawdowns y precios con picos.
+    
+    Args:
+        y: Valores de la serie
+        n_out: Número aproximado de puntos a conservar
+    
+    Returns:
+        np.ndarray: Índices ordenados de los puntos seleccionados
+    """
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    
+    y = np.asarray(y, dtype=np.float64)
+    n_buckets = (n_out - 2) // 2
+    interior = y[1:-1]
+    bucket_size = int(np.ceil(len(interior) / n_buckets))
+    
+    # Rellenar con el último valor para poder trabajar con una matriz (cubos x tamaño)
+    padded = np.pad(interior, (0, n_buckets * bucket_size - len(interior)), mode='edge')
+    matrix = padded.reshape(n_buckets, bucket_size)
+    offsets = np.arange(n_buckets) * bucket_size
+    mins = np.minimum(offsets + np.argmin(matrix, axis=1), len(interior) - 1) + 1
+    maxs = np.minimum(offsets + np.argmax(matrix, axis=1), len(interior) - 1) + 1
+    
+    return np.unique(np.concatenate(([0, n - 1], mins, maxs)))
+
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, max_points: int = None,
+                       method: str = None) -> np.ndarray:
+    """
+    Calcula los índices a dibujar respetando el presupuesto de puntos configurado
+    
+    Args:
+        x: Eje X numérico
+        y: Valores de la serie
+        max_points: Presupuesto de puntos (por defecto VISUALIZATION_CONFIG['max_plot_points'])
+        method: 'lttb' o 'minmax' (por defecto VISUALIZATION_CONFIG['downsample_method'])
+    
+    Returns:
+        np.ndarray: Índices de los puntos a dibujar
+    """
+    max_points = max_points or VISUALIZATION_CONFIG['max_plot_points']
+    method = method or VISUALIZATION_CONFIG['downsample_method']
+    if method == 'minmax':
+        return minmax_indices(y, max_points)
+    if method == 'lttb':
+        return lttb_indices(x, y, max_points)
+    raise ValueError(f"Método de reducción desconocido: {method}")
+
+
+def downsample_series(timestamps, values, max_points: int = None, method: str = None):
+    """
+    Reduce una serie temporal a un número acotado de puntos preservando su forma
+    
+    Returns:
+        tuple: (timestamps como datetime64[ns], valores)
+    """
+    x = _timestamps_to_ns(timestamps)
+    y = np.asarray(values, dtype=np.float64)
+    idx = downsample_indices(x, y, max_points, method)
+    return x[idx].view('datetime64[ns]'), y[idx]
+
+
+def _bucket_max(timestamps, values, max_points: int = None):
+    """
+    Agrega una serie en cubos tomando el máximo (útil para el volumen)
+    """
+    max_points = max_points or VISUALIZATION_CONFIG['max_plot_points']
+    x = _timestamps_to_ns(timestamps)
+    y = np.asarray(values, dtype=np.float64)
+    if len(y) <= max_points:
+        return x.view('datetime64[ns]'), y
+    starts = np.linspace(0, len(y), max_points, endpoint=False).astype(np.int64)
+    return x[starts].view('datetime64[ns]'), np.maximum.reduceat(y, starts)
+
+
+def _drawdown(equity: np.ndarray) -> np.ndarray:
+    """
+    Drawdown relativo respecto al máximo acumulado
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    rolling_max = np.maximum.accumulate(equity)
+    return (equity - rolling_max) / rolling_max
+
+
+def _signal_markers(trades_df: pd.DataFrame):
+    """
+    Extrae de una vez las posiciones de compra y venta para dibujarlas con scatter
+    """
+    timestamps = _timestamps_to_ns(trades_df['timestamp']).view('datetime64[ns]')
+    close = trades_df['close'].to_numpy(dtype=np.float64)
+    buy_mask = trades_df['buy_signal'].to_numpy(dtype=bool)
+    sell_mask = trades_df['sell_signal'].to_numpy(dtype=bool)
+    return (timestamps[buy_mask], close[buy_mask]), (timestamps[sell_mask], close[sell_mask])
+
+
+def _paired_trade_returns(trades_df: pd.DataFrame) -> np.ndarray:
+    """
+    Retorno bruto de cada trade cerrado
+    """
+    returns = extract_trades(trades_df)['gross_return'].to_numpy()
+    return returns[~np.isnan(returns)]
+
+
+def _finish_figure(fig, name, save_path=None):
+    """
+    Guarda y/o muestra una figura según la configuración de salida
+    
+    - Si se indica save_path, la figura se guarda allí y se cierra sin mostrarse.
+    - Si OUTPUT_CONFIG['save_plots'] está activo, se guarda en OUTPUT_CONFIG['plots_path'].
+    - Solo se llama a plt.show() con un backend interactivo.
+    
+    Returns:
+        str: Ruta del archivo guardado (o None)
+    """
+    plt = _pyplot()
+    explicit_path = save_path is not None
+    if not explicit_path and OUTPUT_CONFIG['save_plots']:
+        os.makedirs(OUTPUT_CONFIG['plots_path'], exist_ok=True)
+        save_path = os.path.join(OUTPUT_CONFIG['plots_path'], f"{name}.png")
+    
+    if save_path:
+        fig.savefig(save_path, dpi=VISUALIZATION_CONFIG['dpi'], bbox_inches='tight')
+    
+    if explicit_path or plt.get_backend().lower() == 'agg':
+        plt.close(fig)
+    else:
+        plt.show()
+    return save_path
 
 
 def display_backtest_results(metrics, params, initial_capital):
@@ -81,34 +283,58 @@ def display_backtest_results(metrics, params, initial_capital):
         print("   ⚠️  Tasa de Éxito BAJA (<50%) - Revisar parámetros")
 
 
-def display_trade_analysis(trade_details, exit_stats):
+def display_trade_analysis(trades, breakdowns):
     """
     Muestra análisis detallado de los trades
+
+    Args:
+        trades: Tabla de trades (trade_analytics.trade_table)
+        breakdowns: Desgloses de trade_analytics.trade_breakdowns
     """
-    if not trade_details:
+    if len(trades) == 0:
         print("No hay trades completados para analizar.")
         return
-    
-    returns = [trade['return'] for trade in trade_details]
-    
+
+    reason_names = {
+        'stop_loss': 'Stop Loss',
+        'take_profit': 'Take Profit',
+        'time_exit': 'Salida por Tiempo',
+        'end_of_day': 'Salida al Final del Día'
+    }
     print("\n=== ANÁLISIS POR RAZÓN DE SALIDA ===")
-    for reason, stats in exit_stats.items():
-        reason_name = {
-            'stop_loss': 'Stop Loss',
-            'take_profit': 'Take Profit', 
-            'time_exit': 'Salida por Tiempo',
-            'end_of_day': 'Salida al Final del Día'
-        }[reason]
-        print(f"{reason_name}:")
-        print(f"  - Trades: {stats['count']} ({stats['count']/len(returns)*100:.1f}%)")
-        print(f"  - Retorno promedio: {stats['avg_return']:.3%}")
+    for reason, stats in breakdowns.get('exit_reason', pd.DataFrame()).iterrows():
+        print(f"{reason_names.get(reason, reason)}:")
+        print(f"  - Trades: {stats['trades']:.0f} ({stats['share']:.1%})")
+        print(f"  - Retorno promedio: {stats['mean_return']:.3%} (mediana {stats['median_return']:.3%})")
         print(f"  - Tasa de éxito: {stats['win_rate']:.1%}")
+        print(f"  - Contribución al P&L: {stats['contribution']:.1%}")
 
+    titles = {
+        'entry_hour': 'HORA DE ENTRADA',
+        'weekday': 'DÍA DE LA SEMANA',
+        'month': 'MES',
+        'holding': 'DURACIÓN DEL TRADE',
+        'volume_ratio': 'VOLUMEN RELATIVO EN LA ENTRADA'
+    }
+    for name, table in breakdowns.items():
+        if name not in titles:
+            continue
+        print(f"\n=== ANÁLISIS POR {titles[name]} ===")
+        print(table[['trades', 'mean_return', 'median_return', 'win_rate', 'contribution']].to_string(
+            formatters={'mean_return': '{:.3%}'.format, 'median_return': '{:.3%}'.format,
+                        'win_rate': '{:.1%}'.format, 'contribution': '{:.1%}'.format}))
 
-def plot_backtest_results(equity_df, trades_df, start_date=None, end_date=None):
+
+def plot_backtest_results(equity_df, trades_df, start_date=None, end_date=None, max_points=None,
+                          save_path=None):
     """
     Grafica los resultados del backtesting
+    
+    Las series largas (equity, precio, drawdown y volumen) se reducen a
+    max_points puntos preservando su forma para que el renderizado no dependa
+    del número de velas.
     """
+    plt = _pyplot()
     if start_date:
         equity_df = equity_df[equity_df['timestamp'] >= start_date]
         trades_df = trades_df[trades_df['timestamp'] >= start_date]
@@ -119,21 +345,20 @@ def plot_backtest_results(equity_df, trades_df, start_date=None, end_date=None):
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 12))
     
     # 1. Curva de Equity
-    ax1.plot(equity_df['timestamp'], equity_df['equity'], linewidth=2, color='blue')
+    ax1.plot(*downsample_series(equity_df['timestamp'], equity_df['equity'], max_points),
+             linewidth=2, color='blue')
     ax1.set_title('Curva de Equity', fontsize=14, fontweight='bold')
     ax1.set_ylabel('Capital ($)')
     ax1.grid(True, alpha=0.3)
     ax1.tick_params(axis='x', rotation=45)
     
     # 2. Precio con señales
-    ax2.plot(trades_df['timestamp'], trades_df['close'], alpha=0.7, color='black', linewidth=1)
-    buy_signals = trades_df[trades_df['buy_signal'] == True]
-    sell_signals = trades_df[trades_df['sell_signal'] == True]
+    ax2.plot(*downsample_series(trades_df['timestamp'], trades_df['close'], max_points),
+             alpha=0.7, color='black', linewidth=1)
+    (buy_x, buy_y), (sell_x, sell_y) = _signal_markers(trades_df)
     
-    ax2.scatter(buy_signals['timestamp'], buy_signals['close'], 
-               color='green', marker='^', s=50, label='Compra', zorder=5)
-    ax2.scatter(sell_signals['timestamp'], sell_signals['close'], 
-               color='red', marker='v', s=50, label='Venta', zorder=5)
+    ax2.scatter(buy_x, buy_y, color='green', marker='^', s=50, label='Compra', zorder=5)
+    ax2.scatter(sell_x, sell_y, color='red', marker='v', s=50, label='Venta', zorder=5)
     
     ax2.set_title('Señales de Trading', fontsize=14, fontweight='bold')
     ax2.set_ylabel('Precio ($)')
@@ -141,20 +366,20 @@ def plot_backtest_results(equity_df, trades_df, start_date=None, end_date=None):
     ax2.grid(True, alpha=0.3)
     ax2.tick_params(axis='x', rotation=45)
     
-    # 3. Drawdown
-    equity_series = equity_df['equity']
-    rolling_max = equity_series.expanding().max()
-    drawdown = (equity_series - rolling_max) / rolling_max
+    # 3. Drawdown (min/max para no perder los valles)
+    dd_x, drawdown = downsample_series(equity_df['timestamp'], _drawdown(equity_df['equity']),
+                                       max_points, method='minmax')
     
-    ax3.fill_between(equity_df['timestamp'], drawdown, 0, alpha=0.3, color='red')
-    ax3.plot(equity_df['timestamp'], drawdown, color='red', linewidth=1)
+    ax3.fill_between(dd_x, drawdown, 0, alpha=0.3, color='red')
+    ax3.plot(dd_x, drawdown, color='red', linewidth=1)
     ax3.set_title('Drawdown', fontsize=14, fontweight='bold')
     ax3.set_ylabel('Drawdown (%)')
     ax3.grid(True, alpha=0.3)
     ax3.tick_params(axis='x', rotation=45)
     
-    # 4. Volumen
-    ax4.bar(trades_df['timestamp'], trades_df['volume'], alpha=0.6, width=0.001)
+    # 4. Volumen (máximo por cubo para conservar los picos)
+    vol_x, vol_y = _bucket_max(trades_df['timestamp'], trades_df['volume'], max_points)
+    ax4.vlines(vol_x, 0, vol_y, alpha=0.6, linewidth=1)
     ax4.set_title('Volumen', fontsize=14, fontweight='bold')
     ax4.set_ylabel('Volumen')
     ax4.set_xlabel('Fecha')
@@ -162,17 +387,21 @@ def plot_backtest_results(equity_df, trades_df, start_date=None, end_date=None):
     ax4.tick_params(axis='x', rotation=45)
     
     plt.tight_layout()
-    plt.show()
+    return _finish_figure(fig, 'backtest_results', save_path)
 
 
-def plot_strategy_performance_comparison(results_dict, start_date=None, end_date=None):
+def plot_strategy_performance_comparison(results_dict, start_date=None, end_date=None, max_points=None,
+                                         save_path=None):
     """
     Compara múltiples estrategias en un solo gráfico
     
     Args:
         results_dict: Dict con formato {'strategy_name': (equity_df, trades_df, metrics)}
+        max_points: Presupuesto de puntos por curva de equity
+        save_path: Ruta donde guardar la figura en lugar de mostrarla
     """
-    plt.figure(figsize=(15, 10))
+    plt = _pyplot()
+    fig = plt.figure(figsize=(15, 10))
     
     # Subplot 1: Comparación de curvas de equity
     plt.subplot(2, 1, 1)
@@ -182,7 +411,7 @@ def plot_strategy_performance_comparison(results_dict, start_date=None, end_date
         if end_date:
             equity_df = equity_df[equity_df['timestamp'] <= end_date]
         
-        plt.plot(equity_df['timestamp'], equity_df['equity'], 
+        plt.plot(*downsample_series(equity_df['timestamp'], equity_df['equity'], max_points),
                 linewidth=2, label=f"{strategy_name} (Ret: {metrics['total_return']:.1%})")
     
     plt.title('Comparación de Estrategias - Curvas de Equity', fontsize=14, fontweight='bold')
@@ -210,13 +439,14 @@ def plot_strategy_performance_comparison(results_dict, start_date=None, end_date
     plt.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    plt.show()
+    return _finish_figure(fig, 'strategy_comparison', save_path)
 
 
-def plot_commission_impact(metrics):
+def plot_commission_impact(metrics, save_path=None):
     """
     Crea un gráfico específico mostrando el impacto de las comisiones
     """
+    plt = _pyplot()
     if 'total_commissions' not in metrics or metrics['total_commissions'] == 0:
         print("No hay datos de comisiones para mostrar.")
         return
@@ -278,13 +508,21 @@ def plot_commission_impact(metrics):
         ax2.set_title('Análisis de Costos', fontsize=14, fontweight='bold')
     
     plt.tight_layout()
-    plt.show()
+    return _finish_figure(fig, 'commission_impact', save_path)
 
 
-def create_performance_dashboard(equity_df, trades_df, metrics):
+def create_performance_dashboard(equity_df, trades_df, metrics, max_points=None, save_path=None):
     """
     Crea un dashboard completo de rendimiento
+    
+    Args:
+        equity_df: Curva de equity
+        trades_df: DataFrame con señales de la estrategia
+        metrics: Métricas del backtesting
+        max_points: Presupuesto de puntos por serie (por defecto VISUALIZATION_CONFIG)
+        save_path: Ruta donde guardar la figura en lugar de mostrarla
     """
+    plt = _pyplot()
     fig = plt.figure(figsize=(20, 12))
     
     # Layout del dashboard
@@ -292,21 +530,20 @@ def create_performance_dashboard(equity_df, trades_df, metrics):
     
     # 1. Curva de Equity (grande)
     ax1 = fig.add_subplot(gs[0, :2])
-    ax1.plot(equity_df['timestamp'], equity_df['equity'], linewidth=3, color='blue')
+    ax1.plot(*downsample_series(equity_df['timestamp'], equity_df['equity'], max_points),
+             linewidth=3, color='blue')
     ax1.set_title('Curva de Equity', fontsize=16, fontweight='bold')
     ax1.set_ylabel('Capital ($)')
     ax1.grid(True, alpha=0.3)
     
     # 2. Precio con señales (grande)
     ax2 = fig.add_subplot(gs[0, 2:])
-    ax2.plot(trades_df['timestamp'], trades_df['close'], alpha=0.7, color='black', linewidth=1)
-    buy_signals = trades_df[trades_df['buy_signal'] == True]
-    sell_signals = trades_df[trades_df['sell_signal'] == True]
+    ax2.plot(*downsample_series(trades_df['timestamp'], trades_df['close'], max_points),
+             alpha=0.7, color='black', linewidth=1)
+    (buy_x, buy_y), (sell_x, sell_y) = _signal_markers(trades_df)
     
-    ax2.scatter(buy_signals['timestamp'], buy_signals['close'], 
-               color='green', marker='^', s=30, label='Compra', zorder=5)
-    ax2.scatter(sell_signals['timestamp'], sell_signals['close'], 
-               color='red', marker='v', s=30, label='Venta', zorder=5)
+    ax2.scatter(buy_x, buy_y, color='green', marker='^', s=30, label='Compra', zorder=5)
+    ax2.scatter(sell_x, sell_y, color='red', marker='v', s=30, label='Venta', zorder=5)
     
     ax2.set_title('Señales de Trading', fontsize=16, fontweight='bold')
     ax2.set_ylabel('Precio ($)')
@@ -315,30 +552,20 @@ def create_performance_dashboard(equity_df, trades_df, metrics):
     
     # 3. Drawdown
     ax3 = fig.add_subplot(gs[1, :2])
-    equity_series = equity_df['equity']
-    rolling_max = equity_series.expanding().max()
-    drawdown = (equity_series - rolling_max) / rolling_max
+    dd_x, drawdown = downsample_series(equity_df['timestamp'], _drawdown(equity_df['equity']),
+                                       max_points, method='minmax')
     
-    ax3.fill_between(equity_df['timestamp'], drawdown * 100, 0, alpha=0.3, color='red')
-    ax3.plot(equity_df['timestamp'], drawdown * 100, color='red', linewidth=2)
+    ax3.fill_between(dd_x, drawdown * 100, 0, alpha=0.3, color='red')
+    ax3.plot(dd_x, drawdown * 100, color='red', linewidth=2)
     ax3.set_title('Drawdown', fontsize=16, fontweight='bold')
     ax3.set_ylabel('Drawdown (%)')
     ax3.grid(True, alpha=0.3)
     
     # 4. Distribución de retornos
     ax4 = fig.add_subplot(gs[1, 2:])
-    buy_signals = trades_df[trades_df['buy_signal'] == True]
-    sell_signals = trades_df[trades_df['sell_signal'] == True]
-    
-    trade_returns = []
-    for i, buy_row in buy_signals.iterrows():
-        matching_sell = sell_signals[sell_signals.index > i].head(1)
-        if not matching_sell.empty:
-            sell_row = matching_sell.iloc[0]
-            trade_return = (sell_row['close'] - buy_row['close']) / buy_row['close'] * 100
-            trade_returns.append(trade_return)
-    
-    if trade_returns:
+    trade_returns = _paired_trade_returns(trades_df) * 100
+    
+    if len(trade_returns) > 0:
         ax4.hist(trade_returns, bins=30, alpha=0.7, color='skyblue', edgecolor='black')
         ax4.axvline(x=0, color='red', linestyle='--', linewidth=2)
         ax4.set_title('Distribución de Retornos por Trade', fontsize=16, fontweight='bold')
@@ -372,4 +599,4 @@ def create_performance_dashboard(equity_df, trades_df, metrics):
     
     plt.suptitle('Dashboard de Rendimiento - Estrategia de Volumen', 
                 fontsize=20, fontweight='bold', y=0.95)
-    plt.show()
+    return _finish_figure(fig, 'performance_dashboard', save_path)